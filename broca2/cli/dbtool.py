@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""Database maintenance and diagnostics tool."""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Dict, List
+
+from database.connection import (
+    DatabaseManager,
+    STORAGE_PROFILES,
+    get_database,
+    get_storage_pragmas,
+)
+from database.maintenance import (
+    analyze_database,
+    backup_database,
+    backup_path,
+    enable_incremental_vacuum,
+    get_free_pages,
+    get_maintenance_runs,
+    incremental_vacuum,
+    prune_messages,
+)
+from database.migrations import LATEST_VERSION, get_schema_version, run_migrations
+
+async def show_pragmas(args) -> None:
+    """Show the storage PRAGMAs in effect on the configured database."""
+    database = get_database()
+    current = {}
+    async with database.reader() as db:
+        for name in ("journal_mode", *database.pragmas):
+            async with db.execute(f"PRAGMA {name}") as cursor:
+                row = await cursor.fetchone()
+                current[name] = row[0] if row else None
+
+    if args.json:
+        print(json.dumps(current, indent=2))
+    else:
+        print(f"Database: {os.path.abspath(database.db_path)}")
+        for name, value in current.items():
+            print(f"  {name}: {value}")
+
+async def migrate(args) -> None:
+    """Apply pending schema migrations."""
+    async with get_database().reader() as db:
+        before = await get_schema_version(db)
+    if args.check:
+        print(f"Schema version {before}, latest {LATEST_VERSION}")
+        if before < LATEST_VERSION:
+            sys.exit(1)
+        return
+    after = await run_migrations()
+    print(f"Schema version {before} -> {after}")
+
+async def backup(args) -> None:
+    """Back up the database while the application keeps running."""
+    destination = args.to
+    if destination is None or os.path.isdir(destination):
+        destination = backup_path(destination or ".")
+    size = await backup_database(destination, pages_per_step=args.pages)
+    print(f"Backed up to {destination} ({size} bytes)")
+
+async def prune(args) -> None:
+    """Delete old messages that are no longer queued."""
+    if not args.max_age_days and not args.per_user:
+        print("Give --max-age-days and/or --per-user", file=sys.stderr)
+        sys.exit(1)
+    deleted = await prune_messages(
+        max_age_seconds=(args.max_age_days or 0) * 86400,
+        max_per_user=args.per_user or 0
+    )
+    print(f"Deleted {deleted} message(s)")
+
+async def vacuum(args) -> None:
+    """Return free pages to the file system."""
+    if args.enable_incremental:
+        await enable_incremental_vacuum()
+        print("Database rebuilt with auto_vacuum = INCREMENTAL")
+        return
+    free_pages = await get_free_pages()
+    freed = await incremental_vacuum(pages_per_step=args.pages)
+    if free_pages and not freed:
+        print(f"{free_pages} free page(s), but auto_vacuum is not INCREMENTAL; run with --enable-incremental while the bot is stopped")
+    else:
+        print(f"Freed {freed} page(s)")
+
+async def analyze(args) -> None:
+    """Refresh query planner statistics."""
+    await analyze_database()
+    print("Statistics refreshed")
+
+async def maintenance(args) -> None:
+    """Show or run scheduled maintenance jobs."""
+    # Imported here so the other commands do not load the runtime package
+    from runtime.core.maintenance import get_maintenance_scheduler
+    if args.run:
+        scheduler = get_maintenance_scheduler()
+        if args.run not in scheduler.jobs:
+            print(f"Unknown job '{args.run}', expected one of: {', '.join(scheduler.jobs)}", file=sys.stderr)
+            sys.exit(1)
+        print(await scheduler.run_job(args.run))
+        return
+
+    runs = await get_maintenance_runs()
+    if args.json:
+        print(json.dumps(runs, indent=2))
+        return
+    if not runs:
+        print("No maintenance jobs have run yet")
+        return
+    print("\nMaintenance Jobs:")
+    print("-" * 80)
+    for run in runs:
+        last_run = datetime.fromtimestamp(run['last_run_ms'] / 1000).isoformat(timespec='seconds') if run['last_run_ms'] else None
+        print(f"{run['job']:<10} {last_run}  {run['status']:<6} {run['detail']}")
+    print("-" * 80)
+
+async def bench_profile(profile: str, commits: int, concurrency: int) -> Dict[str, Any]:
+    """Measure single-row commits per second on a scratch database."""
+    with tempfile.TemporaryDirectory() as tmp:
+        database = DatabaseManager(
+            os.path.join(tmp, "bench.db"),
+            readers=1,
+            pragmas=get_storage_pragmas(profile)
+        )
+        await database.open()
+        try:
+            await database.execute("""
+                CREATE TABLE bench (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    payload TEXT NOT NULL,
+                    timestamp TEXT NOT NULL
+                )
+            """)
+
+            async def _commit_many(count: int) -> None:
+                for i in range(count):
+                    await database.execute(
+                        "INSERT INTO bench (payload, timestamp) VALUES (?, ?)",
+                        (f"message {i}", str(time.time()))
+                    )
+
+            per_producer = [commits // concurrency] * concurrency
+            per_producer[0] += commits - sum(per_producer)
+
+            started = time.perf_counter()
+            await asyncio.gather(*(_commit_many(count) for count in per_producer))
+            elapsed = time.perf_counter() - started
+        finally:
+            await database.close()
+
+    return {
+        "profile": profile,
+        "commits": commits,
+        "seconds": round(elapsed, 3),
+        "commits_per_second": round(commits / elapsed, 1) if elapsed else None
+    }
+
+async def bench(args) -> None:
+    """Benchmark commit throughput of the storage profiles."""
+    profiles = [args.profile] if args.profile else list(STORAGE_PROFILES)
+    results = []
+    for profile in profiles:
+        results.append(await bench_profile(profile, args.commits, args.concurrency))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print_bench_results(results)
+
+def print_bench_results(results: List[Dict[str, Any]]) -> None:
+    """Print benchmark results in a human-readable format."""
+    print("\nStorage Profile Benchmark (one commit per insert):")
+    print("-" * 80)
+    for result in results:
+        print(
+            f"{result['profile']:<12} {result['commits']:>7} commits "
+            f"in {result['seconds']:>8.3f}s  {result['commits_per_second']:>10.1f} commits/s"
+        )
+    print("-" * 80)
+
+def main():
+    parser = argparse.ArgumentParser(description='Broca2 Database Tool')
+    parser.add_argument('--json', action='store_true', help='Output in JSON format')
+    subparsers = parser.add_subparsers(dest='command', help='Available commands')
+
+    # Show pragmas command
+    subparsers.add_parser('pragmas', help='Show storage settings in effect on the database')
+
+    # Migrate command
+    migrate_parser = subparsers.add_parser('migrate', help='Apply pending schema migrations')
+    migrate_parser.add_argument('--check', action='store_true', help='Only report the schema version; exit 1 if migrations are pending')
+
+    # Benchmark command
+    bench_parser = subparsers.add_parser('bench', help='Benchmark commits per second for each storage profile')
+    bench_parser.add_argument('--profile', choices=list(STORAGE_PROFILES), help='Only benchmark this profile')
+    bench_parser.add_argument('--commits', type=int, default=2000, help='Number of commits per profile')
+    bench_parser.add_argument('--concurrency', type=int, default=1, help='Number of concurrent writers')
+
+    # Backup command
+    backup_parser = subparsers.add_parser('backup', help='Back up the database online, without stopping the bot')
+    backup_parser.add_argument('--to', help='Backup file or directory (default: a timestamped file in the current directory)')
+    backup_parser.add_argument('--pages', type=int, default=256, help='Pages copied per step')
+
+    # Prune command
+    prune_parser = subparsers.add_parser('prune', help='Delete old messages that are no longer queued')
+    prune_parser.add_argument('--max-age-days', type=float, help='Delete messages older than this many days')
+    prune_parser.add_argument('--per-user', type=int, help="Keep only this many of each user's newest messages")
+
+    # Vacuum command
+    vacuum_parser = subparsers.add_parser('vacuum', help='Return free pages to the file system')
+    vacuum_parser.add_argument('--pages', type=int, default=1000, help='Pages freed per transaction')
+    vacuum_parser.add_argument('--enable-incremental', action='store_true', help='Rebuild the database with incremental vacuum enabled (blocks writes; stop the bot first)')
+
+    # Analyze command
+    subparsers.add_parser('analyze', help='Refresh query planner statistics')
+
+    # Maintenance command
+    maintenance_parser = subparsers.add_parser('maintenance', help='Show the last run of each scheduled maintenance job')
+    maintenance_parser.add_argument('--run', metavar='JOB', help='Run a job now (archive, backup, prune, vacuum or analyze)')
+
+    args = parser.parse_args()
+
+    if args.command == 'pragmas':
+        asyncio.run(show_pragmas(args))
+    elif args.command == 'migrate':
+        asyncio.run(migrate(args))
+    elif args.command == 'backup':
+        asyncio.run(backup(args))
+    elif args.command == 'prune':
+        asyncio.run(prune(args))
+    elif args.command == 'vacuum':
+        asyncio.run(vacuum(args))
+    elif args.command == 'analyze':
+        asyncio.run(analyze(args))
+    elif args.command == 'maintenance':
+        asyncio.run(maintenance(args))
+    elif args.command == 'bench':
+        if args.commits < 1 or args.concurrency < 1:
+            print("--commits and --concurrency must be positive", file=sys.stderr)
+            sys.exit(1)
+        args.concurrency = min(args.concurrency, args.commits)
+        asyncio.run(bench(args))
+    else:
+        parser.print_help()
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,19 @@
 import argparse
 import sys
 import asyncio
+from datetime import datetime
 from typing import List, Dict, Any
-from database.operations import get_all_queue_items, flush_all_queue_items, delete_queue_item
+from database.operations import (
+    get_all_queue_items,
+    flush_all_queue_items,
+    delete_queue_item,
+    get_dead_letters,
+    replay_dead_letters
+)
 
 async def list_queue(args) -> None:
     """List all queue items."""
-    items = await get_all_queue_items()
+    items = await get_all_queue_items(include_archived=args.archived, limit=args.limit)
     if args.json:
         print_json(items)
     else:
@@ -50,6 +57,22 @@ async def delete_queue(args) -> None:
             print(f"Failed to delete queue item {args.id}", file=sys.stderr)
             sys.exit(1)
 
+async def list_dead_letters(args) -> None:
+    """List dead-lettered queue items."""
+    items = await get_dead_letters(error_class=args.error_class, limit=args.limit)
+    if args.json:
+        print_json(items)
+    else:
+        print_dead_letters(items)
+
+async def replay_dead(args) -> None:
+    """Queue dead-lettered messages again."""
+    replayed = await replay_dead_letters(
+        dead_letter_ids=None if args.all else args.id,
+        error_class=args.error_class
+    )
+    print(f"Replayed {replayed} dead-lettered message(s)")
+
 def print_json(data: List[Dict[str, Any]]) -> None:
     """Print data in JSON format."""
     import json
@@ -67,18 +90,38 @@ def print_queue_items(items: List[Dict[str, Any]]) -> None:
         print(f"ID: {item['id']}")
         print(f"User: {item['display_name']} (@{item['username']})")
         print(f"Message: {item['message']}")
-        print(f"Status: {item['status']}")
+        print(f"Status: {item['status']}{' (archived)' if item.get('archived') else ''}")
         print(f"Attempts: {item['attempts']}")
         print(f"Timestamp: {item['timestamp']}")
         print("-" * 80)
 
+def print_dead_letters(items: List[Dict[str, Any]]) -> None:
+    """Print dead letters in a human-readable format."""
+    if not items:
+        print("No dead letters")
+        return
+    
+    print("\nDead Letters:")
+    print("-" * 80)
+    for item in items:
+        failed_at = datetime.fromtimestamp(item['failed_at_ms'] / 1000).isoformat() if item['failed_at_ms'] else None
+        print(f"ID: {item['id']} (queue item {item['queue_id']})")
+        print(f"User: {item['display_name']} (@{item['username']})")
+        print(f"Message: {item['message']}")
+        print(f"Error: {item['error_class']}: {item['last_error']}")
+        print(f"Attempts: {item['attempts']}")
+        print(f"Failed at: {failed_at}")
+        print("-" * 80)
+
 def main():
     parser = argparse.ArgumentParser(description='Broca2 Queue Management Tool')
     parser.add_argument('--json', action='store_true', help='Output in JSON format')
     subparsers = parser.add_subparsers(dest='command', help='Available commands')
 
     # List queue command
-    subparsers.add_parser('list', help='List all queue items')
+    list_parser = subparsers.add_parser('list', help='List all queue items')
+    list_parser.add_argument('--archived', action='store_true', help='List every item, including finished ones and those moved to the archive')
+    list_parser.add_argument('--limit', type=int, help='Maximum number of items to list')
 
     # Flush queue commands
     flush_parser = subparsers.add_parser('flush', help='Flush queue items')
@@ -92,6 +135,18 @@ def main():
     delete_group.add_argument('--all', action='store_true', help='Delete all items')
     delete_group.add_argument('--id', type=int, help='Delete specific item by ID')
 
+    # Dead letter commands
+    dead_parser = subparsers.add_parser('dead', help='Inspect and replay dead-lettered items')
+    dead_subparsers = dead_parser.add_subparsers(dest='dead_command')
+    dead_list_parser = dead_subparsers.add_parser('list', help='List dead letters')
+    dead_list_parser.add_argument('--class', dest='error_class', choices=['transient', 'permanent', 'expired'], help='Only list this error class')
+    dead_list_parser.add_argument('--limit', type=int, help='Maximum number of dead letters to list')
+    dead_replay_parser = dead_subparsers.add_parser('replay', help='Queue dead-lettered messages again')
+    dead_replay_group = dead_replay_parser.add_mutually_exclusive_group(required=True)
+    dead_replay_group.add_argument('--all', action='store_true', help='Replay all dead letters')
+    dead_replay_group.add_argument('--id', type=int, nargs='+', help='Replay specific dead letters by ID')
+    dead_replay_parser.add_argument('--class', dest='error_class', choices=['transient', 'permanent', 'expired'], help='Only replay this error class')
+
     args = parser.parse_args()
 
     if args.command == 'list':
@@ -100,6 +155,10 @@ def main():
         asyncio.run(flush_queue(args))
     elif args.command == 'delete':
         asyncio.run(delete_queue(args))
+    elif args.command == 'dead' and args.dead_command == 'list':
+        asyncio.run(list_dead_letters(args))
+    elif args.command == 'dead' and args.dead_command == 'replay':
+        asyncio.run(replay_dead(args))
     else:
         parser.print_help()
 
@@ -3,6 +3,7 @@ import argparse
 import sys
 import asyncio
 from typing import List, Dict, Any
+from database.activity import get_activity_tracker
 from database.operations import get_all_users, get_user_details, update_letta_user
 
 async def list_users(args) -> None:
@@ -35,6 +36,7 @@ async def get_user(args) -> None:
 async def update_user_status(args) -> None:
     """Update a user's status."""
     user = await update_letta_user(args.id, {"is_active": args.status == "active"})
+    await get_activity_tracker().settle()
     if not user:
         print(f"User with ID {args.id} not found", file=sys.stderr)
         sys.exit(1)
@@ -2,7 +2,7 @@
 
 import os
 import json
-from typing import Any, Callable, Optional
+from typing import Any, Callable, Dict, Optional
 
 _SETTINGS_CACHE = None
 
@@ -146,4 +146,27 @@ def validate_settings(settings: dict) -> None:
     if settings['queue_refresh'] < 1:
         raise ValueError("queue_refresh must be at least 1")
     if settings['max_retries'] < 0:
-        raise ValueError("max_retries must be non-negative") 
\ No newline at end of file
+        raise ValueError("max_retries must be non-negative")
+
+def get_settings_section(name: str, defaults: Dict[str, Any]) -> Dict[str, Any]:
+    """Get a settings section merged over its defaults.
+    
+    Missing or unreadable settings files fall back to the defaults so that
+    components can be constructed outside of the main application (CLI tools,
+    tests).
+    
+    Args:
+        name: Top-level key of the section in settings.json
+        defaults: Default values for every key in the section
+        
+    Returns:
+        Dictionary containing the merged section.
+    """
+    try:
+        section = get_settings().get(name) or {}
+    except (FileNotFoundError, ValueError):
+        section = {}
+    
+    merged = dict(defaults)
+    merged.update(section)
+    return merged
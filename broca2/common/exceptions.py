@@ -2,4 +2,24 @@
 
 class PluginError(Exception):
     """Exception raised for plugin-related errors."""
-    pass 
\ No newline at end of file
+    pass
+
+class LettaUnavailableError(Exception):
+    """Exception raised when the Letta endpoint is down or not responding."""
+    pass
+
+class CircuitOpenError(LettaUnavailableError):
+    """Exception raised when a call is refused because the circuit breaker is open."""
+    pass
+
+class DeadlineExceededError(Exception):
+    """Exception raised when a request's deadline has passed before it could be made."""
+    pass
+
+class DeliveryUncertainError(Exception):
+    """Exception raised when sending a message failed after the agent may already have acted on it."""
+    pass
+
+class MaintenanceJobSkipped(Exception):
+    """Exception raised when a maintenance job cannot run because the database is not set up for it."""
+    pass
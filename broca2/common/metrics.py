@@ -0,0 +1,124 @@
+"""In-process metrics with Prometheus text export.
+
+Components record counters and gauges on the shared registry returned by
+`get_metrics()`. When `metrics.export_path` is set in settings.json the
+application writes the registry to that file every `export_interval`
+seconds in the Prometheus text format, for node_exporter's textfile
+collector or any other scraper that reads files.
+"""
+import asyncio
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+# Defaults for the "metrics" section of settings.json
+DEFAULT_METRICS_SETTINGS = {
+    "export_path": "",
+    "export_interval": 15
+}
+
+logger = logging.getLogger(__name__)
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+def _label_set(labels: Dict[str, object]) -> LabelSet:
+    """Normalize labels into a hashable, sorted tuple."""
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _escape(value: str) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_sample(name: str, labels: LabelSet, value: float) -> str:
+    """Format one sample in the Prometheus text format."""
+    if labels:
+        rendered = ",".join(f'{key}="{_escape(value_text)}"' for key, value_text in labels)
+        return f"{name}{{{rendered}}} {value:g}"
+    return f"{name} {value:g}"
+
+class MetricsRegistry:
+    """Thread-safe store of counters and gauges."""
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelSet, float]] = {}
+        self._gauges: Dict[str, Dict[LabelSet, float]] = {}
+        self._help: Dict[str, str] = {}
+
+    def describe(self, name: str, help_text: str) -> None:
+        """Set the help text exported for a metric."""
+        self._help[name] = help_text
+
+    def increment(self, name: str, value: float = 1, **labels) -> None:
+        """Add to a counter."""
+        key = _label_set(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        """Set a gauge to a value."""
+        key = _label_set(labels)
+        with self._lock:
+            self._gauges.setdefault(name, {})[key] = value
+
+    def get(self, name: str, **labels) -> float:
+        """Get the current value of a counter or gauge, 0 if never recorded."""
+        key = _label_set(labels)
+        with self._lock:
+            for store in (self._counters, self._gauges):
+                if name in store and key in store[name]:
+                    return store[name][key]
+        return 0
+
+    def snapshot(self) -> Dict[str, float]:
+        """Get every sample, keyed by its Prometheus sample name."""
+        with self._lock:
+            return {
+                _format_sample(name, labels, value).rsplit(" ", 1)[0]: value
+                for store in (self._counters, self._gauges)
+                for name, series in store.items()
+                for labels, value in series.items()
+            }
+
+    def render(self) -> str:
+        """Render the registry in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for metric_type, store in (("counter", self._counters), ("gauge", self._gauges)):
+                for name in sorted(store):
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {metric_type}")
+                    for labels, value in sorted(store[name].items()):
+                        lines.append(_format_sample(name, labels, value))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str) -> None:
+        """Atomically write the rendered registry to a file."""
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w") as f:
+            f.write(self.render())
+        os.replace(temp_path, path)
+
+# Create a singleton instance
+_metrics: Optional[MetricsRegistry] = None
+
+def get_metrics() -> MetricsRegistry:
+    """Get the metrics registry singleton instance."""
+    global _metrics
+    if _metrics is None:
+        _metrics = MetricsRegistry()
+    return _metrics
+
+async def export_metrics(path: str, interval: float) -> None:
+    """Write the metrics registry to a file periodically until cancelled."""
+    registry = get_metrics()
+    while True:
+        try:
+            registry.write(path)
+        except OSError as e:
+            logger.error(f"Failed to write metrics to {path}: {str(e)}")
+        await asyncio.sleep(interval)
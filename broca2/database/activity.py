@@ -0,0 +1,150 @@
+"""Write-behind recording of when users were last active.
+
+`last_active` on platform profiles and Letta users is only read by the admin
+tools, so it is not worth a write transaction on every inbound message.
+Callers record activity in memory instead; the tracker keeps the latest time
+per profile and user, and writes them all every `flush_interval` seconds in
+one transaction with `executemany`. Pending times are written on shutdown
+when `flush_on_shutdown` is set; otherwise up to one interval of activity is
+lost on exit.
+"""
+import asyncio
+import logging
+from typing import Dict, Optional
+
+import aiosqlite
+
+from common.config import get_settings_section
+from common.metrics import get_metrics
+from .connection import get_database
+
+# Defaults for the "activity" section of settings.json
+DEFAULT_ACTIVITY_SETTINGS = {
+    "flush_interval": 30,
+    "flush_on_shutdown": True
+}
+
+logger = logging.getLogger(__name__)
+
+class ActivityTracker:
+    """Buffers last_active times and writes them in batches."""
+
+    def __init__(self, flush_interval: float = 30, flush_on_shutdown: bool = True):
+        """Initialize the tracker.
+
+        Args:
+            flush_interval: Seconds between writes of the buffered times
+            flush_on_shutdown: Write the buffered times when stopped
+        """
+        self.flush_interval = flush_interval
+        self.flush_on_shutdown = flush_on_shutdown
+        self._profiles: Dict[int, str] = {}
+        self._letta_users: Dict[int, str] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        """Whether buffered times are written in the background."""
+        return self._task is not None and not self._task.done()
+
+    @property
+    def pending(self) -> int:
+        """Number of buffered times not yet written."""
+        return len(self._profiles) + len(self._letta_users)
+
+    def touch_profile(self, profile_id: int, at: str) -> None:
+        """Record that a platform profile was active at an ISO timestamp."""
+        if at > self._profiles.get(profile_id, ""):
+            self._profiles[profile_id] = at
+
+    def touch_letta_user(self, letta_user_id: int, at: str) -> None:
+        """Record that a Letta user was active at an ISO timestamp."""
+        if at > self._letta_users.get(letta_user_id, ""):
+            self._letta_users[letta_user_id] = at
+
+    async def flush(self) -> int:
+        """Write every buffered time in one transaction.
+
+        Times are only written forward, never over a later one. If the write
+        fails the times stay buffered for the next flush.
+
+        Returns:
+            int: Number of times written
+        """
+        profiles, self._profiles = self._profiles, {}
+        letta_users, self._letta_users = self._letta_users, {}
+        if not profiles and not letta_users:
+            return 0
+
+        async def _flush(db: aiosqlite.Connection) -> None:
+            await db.executemany("""
+                UPDATE platform_profiles SET last_active = ?
+                WHERE id = ? AND (last_active IS NULL OR last_active < ?)
+            """, [(at, profile_id, at) for profile_id, at in profiles.items()])
+            await db.executemany("""
+                UPDATE letta_users SET last_active = ?
+                WHERE id = ? AND (last_active IS NULL OR last_active < ?)
+            """, [(at, letta_user_id, at) for letta_user_id, at in letta_users.items()])
+
+        try:
+            await get_database().write(_flush)
+        except BaseException:
+            for profile_id, at in profiles.items():
+                self.touch_profile(profile_id, at)
+            for letta_user_id, at in letta_users.items():
+                self.touch_letta_user(letta_user_id, at)
+            raise
+
+        written = len(profiles) + len(letta_users)
+        get_metrics().increment("activity_updates_written_total", written)
+        return written
+
+    async def settle(self) -> None:
+        """Write buffered times now unless the background flush is running.
+
+        For processes that do not run the tracker, such as the CLI tools.
+        """
+        if not self.running:
+            await self.flush()
+
+    async def _run(self) -> None:
+        """Flush every flush interval until cancelled."""
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to write last_active times: {str(e)}")
+
+    def start(self) -> None:
+        """Start writing buffered times in the background."""
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the background flush, writing what is buffered if configured."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self.flush_on_shutdown:
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Failed to write last_active times on shutdown: {str(e)}")
+        elif self.pending:
+            logger.info(f"Discarding {self.pending} unwritten last_active times")
+
+# Create a singleton instance
+_activity_tracker: Optional[ActivityTracker] = None
+
+def get_activity_tracker() -> ActivityTracker:
+    """Get the activity tracker singleton, configured from settings.json."""
+    global _activity_tracker
+    if _activity_tracker is None:
+        settings = get_settings_section("activity", DEFAULT_ACTIVITY_SETTINGS)
+        _activity_tracker = ActivityTracker(
+            flush_interval=float(settings["flush_interval"]),
+            flush_on_shutdown=bool(settings["flush_on_shutdown"])
+        )
+    return _activity_tracker
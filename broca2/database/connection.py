@@ -0,0 +1,337 @@
+"""Shared SQLite connections for all database operations.
+
+A single long-lived writer connection is owned by a writer task: every
+mutation is submitted to it and executed in its own transaction, in
+submission order. Queries are served by a small pool of long-lived reader
+connections. The manager is opened and closed by the application; CLI tools
+and other callers that never open it explicitly get it opened lazily on first
+use.
+"""
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, TypeVar
+
+import aiosqlite
+
+from common.config import get_settings_section
+
+# Database file path
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "sanctum.db")
+
+# Storage profiles: PRAGMAs applied to every connection. Both use WAL so
+# readers (including the CLI tools) never block the writer. "throughput"
+# syncs only at WAL checkpoints, so a power loss can drop the last few
+# commits but never corrupts the database; "durable" syncs every commit.
+STORAGE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "throughput": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "mmap_size": 268435456,
+        "cache_size": -65536,
+        "temp_store": "MEMORY"
+    },
+    "durable": {
+        "busy_timeout": 5000,
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "mmap_size": 0,
+        "cache_size": -16384,
+        "temp_store": "DEFAULT"
+    }
+}
+
+# PRAGMAs that may be set from settings, in the order they are applied
+STORAGE_PRAGMAS = ("busy_timeout", "journal_mode", "synchronous", "mmap_size", "cache_size", "temp_store")
+
+# Defaults for the "database" section of settings.json
+DEFAULT_DATABASE_SETTINGS = {
+    "readers": 4,
+    "profile": "throughput",
+    "pragmas": {},
+    "profile_cache_size": 10000,
+    "profile_cache_ttl": 300
+}
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+WriteFunction = Callable[[aiosqlite.Connection], Awaitable[T]]
+
+def get_storage_pragmas(profile: str, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Resolve a storage profile and per-key overrides into PRAGMA values.
+
+    Args:
+        profile: Name of a preset in STORAGE_PROFILES
+        overrides: PRAGMA values replacing the preset's
+
+    Returns:
+        Dict[str, Any]: PRAGMA values in the order they should be applied
+
+    Raises:
+        ValueError: If the profile, a PRAGMA name or a value is not valid
+    """
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f"Unknown storage profile '{profile}', expected one of: {', '.join(STORAGE_PROFILES)}")
+
+    values = dict(STORAGE_PROFILES[profile])
+    for name, value in (overrides or {}).items():
+        if name not in STORAGE_PRAGMAS:
+            raise ValueError(f"Unsupported storage pragma '{name}', expected one of: {', '.join(STORAGE_PRAGMAS)}")
+        # Values are interpolated into PRAGMA statements, so only plain
+        # integers and keywords are accepted
+        if isinstance(value, bool) or not (isinstance(value, int) or (isinstance(value, str) and value.isalpha())):
+            raise ValueError(f"Invalid value for storage pragma '{name}': {value!r}")
+        values[name] = value
+
+    return {name: values[name] for name in STORAGE_PRAGMAS if name in values}
+
+class DatabaseManager:
+    """Owns the writer connection, the writer task and the reader pool."""
+
+    def __init__(self, db_path: str, readers: int = 4, pragmas: Optional[Dict[str, Any]] = None):
+        """Initialize the manager.
+
+        Args:
+            db_path: Path to the SQLite database file
+            readers: Number of reader connections to keep open
+            pragmas: Storage PRAGMAs applied to every connection, as returned
+                by `get_storage_pragmas()`
+        """
+        self.db_path = db_path
+        self.reader_count = max(1, readers)
+        self.pragmas = dict(pragmas or {})
+        self._writer: Optional[aiosqlite.Connection] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._write_queue: Optional[asyncio.Queue] = None
+        self._readers: Optional[asyncio.Queue] = None
+        self._reader_connections: List[aiosqlite.Connection] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._open_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def is_open(self) -> bool:
+        """Whether the manager is open in the running event loop."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return False
+        return self._writer is not None and self._loop is loop
+
+    async def _connect(self, writer: bool = False) -> aiosqlite.Connection:
+        """Open a connection in autocommit mode; transactions are explicit.
+
+        Args:
+            writer: Whether this is the writer connection. The journal mode
+                is stored in the database file, so only the writer sets it.
+        """
+        connection = aiosqlite.connect(self.db_path, isolation_level=None)
+        # Callers that never close the manager (one-shot CLI tools) must not
+        # keep the interpreter alive; SQLite rolls back anything unfinished.
+        getattr(connection, "_thread", connection).daemon = True
+        connection = await connection
+        try:
+            await connection.execute("PRAGMA foreign_keys = ON")
+            if writer:
+                # Lets maintenance return free pages to the file system; only
+                # takes effect on databases that do not have any tables yet
+                await connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            for name, value in self.pragmas.items():
+                if name == "journal_mode":
+                    if writer:
+                        await self._set_journal_mode(connection, value)
+                    continue
+                await connection.execute(f"PRAGMA {name} = {value}")
+        except Exception:
+            await connection.close()
+            raise
+        return connection
+
+    async def _set_journal_mode(self, connection: aiosqlite.Connection, mode: str) -> None:
+        """Switch the journal mode, warning if SQLite kept another one."""
+        async with connection.execute(f"PRAGMA journal_mode = {mode}") as cursor:
+            row = await cursor.fetchone()
+        if row and str(row[0]).lower() != str(mode).lower():
+            logger.warning(f"Database journal mode is {row[0]}, could not switch to {mode}")
+
+    async def open(self) -> None:
+        """Open the writer connection, start the writer task and fill the reader pool."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Connections and queues from a finished event loop cannot be reused
+            self._abandon()
+            self._loop = loop
+            self._open_lock = asyncio.Lock()
+
+        async with self._open_lock:
+            if self._writer is not None:
+                return
+
+            writer = await self._connect(writer=True)
+            readers: asyncio.Queue = asyncio.Queue()
+            reader_connections = []
+            try:
+                for _ in range(self.reader_count):
+                    connection = await self._connect()
+                    reader_connections.append(connection)
+                    readers.put_nowait(connection)
+            except Exception:
+                await writer.close()
+                for connection in reader_connections:
+                    await connection.close()
+                raise
+
+            self._writer = writer
+            self._readers = readers
+            self._reader_connections = reader_connections
+            self._write_queue = asyncio.Queue()
+            self._writer_task = asyncio.create_task(self._run_writer())
+            logger.info(
+                f"Database opened with 1 writer and {self.reader_count} reader connections "
+                f"(journal_mode={self.pragmas.get('journal_mode', 'default')}, "
+                f"synchronous={self.pragmas.get('synchronous', 'default')})"
+            )
+
+    async def close(self) -> None:
+        """Finish queued writes, stop the writer task and close every connection."""
+        if self._writer is None or self._loop is not asyncio.get_running_loop():
+            self._abandon()
+            return
+
+        # Let the writer drain everything submitted before close
+        await self._write_queue.join()
+        self._writer_task.cancel()
+        try:
+            await self._writer_task
+        except asyncio.CancelledError:
+            pass
+
+        await self._writer.close()
+        for connection in self._reader_connections:
+            await connection.close()
+
+        self._writer = None
+        self._writer_task = None
+        self._write_queue = None
+        self._readers = None
+        self._reader_connections = []
+        logger.info("Database closed")
+
+    def _abandon(self) -> None:
+        """Drop state that belongs to an event loop that is no longer running."""
+        for connection in [self._writer, *self._reader_connections]:
+            if connection is not None and hasattr(connection, "stop"):
+                connection.stop()
+        self._writer = None
+        self._writer_task = None
+        self._write_queue = None
+        self._readers = None
+        self._reader_connections = []
+
+    async def _ensure_open(self) -> None:
+        """Open the manager on first use."""
+        if not self.is_open:
+            await self.open()
+
+    async def _run_writer(self) -> None:
+        """Writer task: run submitted write functions one transaction at a time."""
+        while True:
+            function, future = await self._write_queue.get()
+            try:
+                if future.cancelled():
+                    continue
+                try:
+                    await self._writer.execute("BEGIN IMMEDIATE")
+                    result = await function(self._writer)
+                    await self._writer.execute("COMMIT")
+                except BaseException as e:
+                    try:
+                        await self._writer.execute("ROLLBACK")
+                    except Exception as rollback_error:
+                        logger.error(f"Rollback failed: {str(rollback_error)}")
+                    if isinstance(e, asyncio.CancelledError):
+                        raise
+                    if not future.cancelled():
+                        future.set_exception(e)
+                else:
+                    if not future.cancelled():
+                        future.set_result(result)
+            finally:
+                self._write_queue.task_done()
+
+    async def write(self, function: WriteFunction) -> T:
+        """Run a function against the writer connection inside one transaction.
+
+        The function receives the writer connection and must not commit or
+        roll back itself. It should only touch the database: any slow work
+        inside it holds up every other write.
+
+        Args:
+            function: Coroutine function taking the writer connection
+
+        Returns:
+            Whatever the function returns, after the transaction committed
+        """
+        await self._ensure_open()
+        future = self._loop.create_future()
+        await self._write_queue.put((function, future))
+        return await future
+
+    async def execute(self, sql: str, parameters: Sequence[Any] = ()) -> aiosqlite.Cursor:
+        """Execute a single write statement in its own transaction.
+
+        Returns:
+            The cursor, for reading `lastrowid` and `rowcount`
+        """
+        async def _execute(db: aiosqlite.Connection) -> aiosqlite.Cursor:
+            return await db.execute(sql, parameters)
+        return await self.write(_execute)
+
+    async def executemany(self, sql: str, parameters: Iterable[Sequence[Any]]) -> int:
+        """Execute a write statement for every parameter set in one transaction.
+
+        Returns:
+            int: Total number of rows changed
+        """
+        async def _executemany(db: aiosqlite.Connection) -> int:
+            cursor = await db.executemany(sql, parameters)
+            return cursor.rowcount
+        return await self.write(_executemany)
+
+    @asynccontextmanager
+    async def reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        """Borrow a reader connection from the pool."""
+        await self._ensure_open()
+        readers = self._readers
+        connection = await readers.get()
+        try:
+            yield connection
+        finally:
+            readers.put_nowait(connection)
+
+    async def fetchone(self, sql: str, parameters: Sequence[Any] = ()) -> Optional[tuple]:
+        """Run a query on a reader connection and return its first row."""
+        async with self.reader() as db:
+            async with db.execute(sql, parameters) as cursor:
+                return await cursor.fetchone()
+
+    async def fetchall(self, sql: str, parameters: Sequence[Any] = ()) -> List[tuple]:
+        """Run a query on a reader connection and return all rows."""
+        async with self.reader() as db:
+            async with db.execute(sql, parameters) as cursor:
+                return await cursor.fetchall()
+
+# Create a singleton instance
+_database: Optional[DatabaseManager] = None
+
+def get_database() -> DatabaseManager:
+    """Get the database manager singleton instance."""
+    global _database
+    if _database is None:
+        settings = get_settings_section("database", DEFAULT_DATABASE_SETTINGS)
+        pragmas = get_storage_pragmas(settings["profile"], settings["pragmas"])
+        _database = DatabaseManager(DB_PATH, readers=int(settings["readers"]), pragmas=pragmas)
+    return _database
@@ -0,0 +1,55 @@
+"""In-process count of unfinished queue items.
+
+Admission control reads the queue depth for every inbound message, so it is
+kept in memory instead of being counted in the database each time. Queue
+operations adjust it as items are added and finished; `sync` counts it from
+the database on startup, before any message is admitted, and recounts it
+periodically to correct drift, e.g. from items added or finished by other
+processes.
+"""
+import logging
+from typing import Optional
+
+from .connection import get_database
+
+logger = logging.getLogger(__name__)
+
+class QueueDepth:
+    """Approximate number of pending and processing queue items."""
+
+    def __init__(self):
+        """Initialize an empty counter."""
+        self.value = 0
+        self.synced = False
+
+    def add(self, count: int = 1) -> None:
+        """Record items added to the queue."""
+        self.value += count
+
+    def remove(self, count: int = 1) -> None:
+        """Record items that left the queue or finished."""
+        self.value = max(0, self.value - count)
+
+    async def sync(self) -> int:
+        """Recount the unfinished items in the database.
+
+        Returns:
+            int: The queue depth
+        """
+        row = await get_database().fetchone("""
+            SELECT COUNT(*) FROM queue INDEXED BY idx_queue_unfinished_user
+            WHERE status IN ('pending', 'processing')
+        """)
+        self.value = row[0] if row else 0
+        self.synced = True
+        return self.value
+
+# Create a singleton instance
+_queue_depth: Optional[QueueDepth] = None
+
+def get_queue_depth() -> QueueDepth:
+    """Get the queue depth singleton instance."""
+    global _queue_depth
+    if _queue_depth is None:
+        _queue_depth = QueueDepth()
+    return _queue_depth
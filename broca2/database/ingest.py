@@ -0,0 +1,213 @@
+"""Group-commit writer for inbound messages.
+
+Platform handlers submit each inbound message here instead of calling
+`insert_message` and `add_to_queue` separately. Submissions are buffered for
+a few milliseconds (or until a batch fills up), then every buffered message
+row and its queue row are written in one transaction with `executemany`.
+Each caller gets back the id of its own message row once the batch commits.
+"""
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Set
+
+import aiosqlite
+
+from common.config import get_settings_section
+from .connection import get_database
+from .depth import get_queue_depth
+from .notify import get_queue_notifier
+from .timestamps import now_ms, to_epoch_ms
+
+# Defaults for the "ingest" section of settings.json
+DEFAULT_INGEST_SETTINGS = {
+    "batch_size": 64,
+    "flush_ms": 5
+}
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class _PendingMessage:
+    """A submitted message waiting for its batch to commit."""
+    letta_user_id: int
+    platform_profile_id: int
+    role: str
+    message: str
+    timestamp: str
+    timestamp_ms: int
+    future: asyncio.Future
+
+class IngestWriter:
+    """Buffers inbound messages and commits them, with their queue rows, in batches."""
+
+    def __init__(self, batch_size: int = 64, flush_ms: float = 5):
+        """Initialize the writer.
+
+        Args:
+            batch_size: Flush as soon as this many messages are buffered
+            flush_ms: Longest time a message waits in the buffer, in milliseconds
+        """
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = max(0.0, flush_ms / 1000)
+        self._pending: List[_PendingMessage] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        """Reset state left behind by an event loop that is no longer running."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._pending = []
+            self._flush_handle = None
+            self._flush_tasks = set()
+            self._flush_lock = asyncio.Lock()
+            self._loop = loop
+        return loop
+
+    async def submit(
+        self,
+        letta_user_id: int,
+        platform_profile_id: int,
+        message: str,
+        role: str = "user",
+        timestamp: Optional[str] = None
+    ) -> int:
+        """Store a message and queue it for processing.
+
+        Args:
+            letta_user_id: The Letta user the message belongs to
+            platform_profile_id: The sender's platform profile
+            message: Message text
+            role: Message role
+            timestamp: Message timestamp, defaults to now
+
+        Returns:
+            int: The id of the inserted message row
+        """
+        loop = self._bind_loop()
+        future = loop.create_future()
+        timestamp = timestamp or datetime.utcnow().isoformat()
+        self._pending.append(_PendingMessage(
+            letta_user_id=letta_user_id,
+            platform_profile_id=platform_profile_id,
+            role=role,
+            message=message,
+            timestamp=timestamp,
+            timestamp_ms=to_epoch_ms(timestamp) or now_ms(),
+            future=future
+        ))
+
+        if len(self._pending) >= self.batch_size:
+            self._start_flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.flush_seconds, self._start_flush)
+
+        # Shield the write from the caller's cancellation: the row may
+        # already be committed as part of someone else's batch
+        return await asyncio.shield(future)
+
+    def _start_flush(self) -> None:
+        """Schedule a flush of everything buffered so far."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        task = asyncio.create_task(self._flush())
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def _flush(self) -> None:
+        """Write one batch. Batches are written one at a time, in order."""
+        async with self._flush_lock:
+            batch = self._pending[:self.batch_size]
+            del self._pending[:len(batch)]
+            if not batch:
+                return
+            if self._pending and self._flush_handle is None:
+                # More than one batch was buffered; keep draining
+                self._start_flush()
+
+            try:
+                message_ids = await get_database().write(
+                    lambda db: self._write_batch(db, batch)
+                )
+            except Exception as e:
+                logger.error(f"Error writing batch of {len(batch)} inbound messages: {str(e)}")
+                for item in batch:
+                    if not item.future.done():
+                        item.future.set_exception(e)
+                return
+
+            get_queue_depth().add(len(batch))
+            for item, message_id in zip(batch, message_ids):
+                if not item.future.done():
+                    item.future.set_result(message_id)
+
+        # Wake queue consumers once for the whole batch
+        get_queue_notifier().notify()
+
+    @staticmethod
+    async def _write_batch(db: aiosqlite.Connection, batch: List[_PendingMessage]) -> List[int]:
+        """Insert message rows and their queue rows in the writer's transaction."""
+        await db.executemany("""
+            INSERT INTO messages (
+                letta_user_id,
+                platform_profile_id,
+                role,
+                message,
+                timestamp,
+                timestamp_ms
+            ) VALUES (?, ?, ?, ?, ?, ?)
+        """, [
+            (item.letta_user_id, item.platform_profile_id, item.role, item.message, item.timestamp, item.timestamp_ms)
+            for item in batch
+        ])
+
+        # The writer holds the write lock, so the batch's rows received
+        # consecutive ids ending at the last inserted one
+        async with db.execute("SELECT last_insert_rowid()") as cursor:
+            last_id = (await cursor.fetchone())[0]
+        message_ids = list(range(last_id - len(batch) + 1, last_id + 1))
+
+        now = datetime.utcnow().isoformat()
+        queued_at = now_ms()
+        await db.executemany("""
+            INSERT INTO queue (
+                letta_user_id,
+                message_id,
+                status,
+                timestamp,
+                timestamp_ms,
+                attempts
+            ) VALUES (?, ?, 'pending', ?, ?, 0)
+        """, [
+            (item.letta_user_id, message_id, now, queued_at)
+            for item, message_id in zip(batch, message_ids)
+        ])
+        return message_ids
+
+    async def flush(self) -> None:
+        """Write everything buffered so far and wait for it to commit."""
+        if self._loop is not asyncio.get_running_loop():
+            return
+        while self._pending or self._flush_tasks:
+            if self._pending:
+                self._start_flush()
+            await asyncio.gather(*list(self._flush_tasks), return_exceptions=True)
+
+# Create a singleton instance
+_ingest_writer: Optional[IngestWriter] = None
+
+def get_ingest_writer() -> IngestWriter:
+    """Get the ingest writer singleton instance."""
+    global _ingest_writer
+    if _ingest_writer is None:
+        settings = get_settings_section("ingest", DEFAULT_INGEST_SETTINGS)
+        _ingest_writer = IngestWriter(
+            batch_size=int(settings["batch_size"]),
+            flush_ms=float(settings["flush_ms"])
+        )
+    return _ingest_writer
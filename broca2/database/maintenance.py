@@ -0,0 +1,269 @@
+"""Online maintenance of the database file: backups, pruning and upkeep.
+
+Everything here runs while the application serves traffic:
+
+- Backups use SQLite's online backup API from a dedicated connection,
+  copying a few pages per step and pausing between steps. No transaction is
+  held across steps, so the writer and WAL checkpoints are only held up for
+  one step at a time. A commit by another connection makes the backup start
+  over; after a few restarts the rest is copied in a single step.
+- Message pruning and incremental vacuuming run in small write
+  transactions, so other writes are only held up briefly.
+"""
+import glob
+import logging
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import aiosqlite
+
+from .connection import get_database
+from .timestamps import now_ms
+
+logger = logging.getLogger(__name__)
+
+# Name of backup files; sorting them by name sorts them by age
+BACKUP_NAME_FORMAT = "sanctum-%Y%m%d-%H%M%S.db"
+BACKUP_GLOB = "sanctum-*.db"
+
+class _BackupRestartedTooOften(Exception):
+    """Raised from the backup progress callback to stop a stepped backup."""
+
+async def backup_database(
+    destination: str,
+    pages_per_step: int = 256,
+    step_sleep: float = 0.01,
+    max_restarts: int = 3
+) -> int:
+    """Copy the live database to a file.
+
+    The copy is written next to the destination first and moved into place
+    once complete, so the destination is never a partial backup.
+
+    Args:
+        destination: Path of the backup file
+        pages_per_step: Pages copied per backup step
+        step_sleep: Seconds to pause between steps
+        max_restarts: Times the stepped backup may start over because of
+            concurrent commits before the rest is copied in one step
+
+    Returns:
+        int: Size of the backup in bytes
+    """
+    temp_path = f"{destination}.tmp"
+    if os.path.exists(temp_path):
+        os.remove(temp_path)
+
+    restarts = 0
+    last_remaining: Optional[int] = None
+
+    def _progress(status: int, remaining: int, total: int) -> None:
+        # Runs on the connection's own thread, after a step has released its read lock
+        nonlocal restarts, last_remaining
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _BackupRestartedTooOften()
+        last_remaining = remaining
+        time.sleep(step_sleep)
+
+    source = await aiosqlite.connect(get_database().db_path, isolation_level=None)
+    try:
+        target = await aiosqlite.connect(temp_path)
+        try:
+            try:
+                await source.backup(target, pages=max(1, pages_per_step), progress=_progress)
+            except _BackupRestartedTooOften:
+                logger.info(f"Backup restarted {restarts} times by concurrent writes; copying the rest in one step")
+                await source.backup(target)
+        finally:
+            await target.close()
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    finally:
+        await source.close()
+
+    os.replace(temp_path, destination)
+    return os.path.getsize(destination)
+
+def backup_path(directory: str, at: Optional[datetime] = None) -> str:
+    """Get the path of a new backup file in a directory."""
+    return os.path.join(directory, (at or datetime.now()).strftime(BACKUP_NAME_FORMAT))
+
+def list_backups(directory: str) -> List[str]:
+    """Get the backup files in a directory, oldest first."""
+    return sorted(glob.glob(os.path.join(directory, BACKUP_GLOB)))
+
+def remove_old_backups(directory: str, keep: int) -> List[str]:
+    """Delete all but the newest `keep` backups in a directory.
+
+    Returns:
+        List[str]: Paths of the deleted backups
+    """
+    backups = list_backups(directory)
+    removed = backups[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+# Messages that may be pruned: not referenced by a queue item or dead letter
+_PRUNABLE_SQL = """
+    NOT EXISTS (SELECT 1 FROM queue q WHERE q.message_id = m.id)
+    AND NOT EXISTS (SELECT 1 FROM dead_letters d WHERE d.message_id = m.id)
+"""
+
+async def _delete_messages_batch(condition: str, parameters: tuple, batch_size: int) -> int:
+    """Delete one batch of prunable messages matching a condition."""
+    cursor = await get_database().execute(f"""
+        DELETE FROM messages WHERE id IN (
+            SELECT m.id FROM messages m
+            WHERE {condition} AND {_PRUNABLE_SQL}
+            LIMIT ?
+        )
+    """, (*parameters, batch_size))
+    return cursor.rowcount
+
+async def prune_messages(
+    max_age_seconds: float = 0,
+    max_per_user: int = 0,
+    batch_size: int = 500
+) -> int:
+    """Delete old messages, keeping the ones still in use.
+
+    Messages still referenced by the queue or by a dead letter are never
+    pruned; finished queue items release theirs once they are archived.
+
+    Args:
+        max_age_seconds: Delete messages older than this; 0 keeps them regardless of age
+        max_per_user: Keep at most this many of each user's newest messages; 0 for no limit
+        batch_size: Messages deleted per transaction
+
+    Returns:
+        int: Number of messages deleted
+    """
+    batch_size = max(1, batch_size)
+    deleted = 0
+
+    if max_age_seconds > 0:
+        cutoff = now_ms() - int(max_age_seconds * 1000)
+        while True:
+            count = await _delete_messages_batch("m.timestamp_ms < ?", (cutoff,), batch_size)
+            deleted += count
+            if count < batch_size:
+                break
+
+    if max_per_user > 0:
+        rows = await get_database().fetchall(
+            "SELECT letta_user_id FROM messages GROUP BY letta_user_id HAVING COUNT(*) > ?",
+            (max_per_user,)
+        )
+        for (letta_user_id,) in rows:
+            # The oldest message the user keeps
+            oldest_kept = await get_database().fetchone("""
+                SELECT IFNULL(timestamp_ms, 0), id FROM messages
+                WHERE letta_user_id IS ?
+                ORDER BY IFNULL(timestamp_ms, 0) DESC, id DESC
+                LIMIT 1 OFFSET ?
+            """, (letta_user_id, max_per_user - 1))
+            if not oldest_kept:
+                continue
+            while True:
+                count = await _delete_messages_batch(
+                    "m.letta_user_id IS ? AND (IFNULL(m.timestamp_ms, 0), m.id) < (?, ?)",
+                    (letta_user_id, *oldest_kept),
+                    batch_size
+                )
+                deleted += count
+                if count < batch_size:
+                    break
+
+    return deleted
+
+async def get_free_pages() -> int:
+    """Get the number of unused pages in the database file."""
+    row = await get_database().fetchone("PRAGMA freelist_count")
+    return row[0] if row else 0
+
+async def is_incremental_vacuum_enabled() -> bool:
+    """Check whether the database has `auto_vacuum = INCREMENTAL`."""
+    auto_vacuum = await get_database().fetchone("PRAGMA auto_vacuum")
+    return bool(auto_vacuum) and auto_vacuum[0] == 2
+
+async def incremental_vacuum(pages_per_step: int = 1000) -> int:
+    """Return unused pages to the file system, a few at a time.
+
+    Only has an effect on databases with `auto_vacuum = INCREMENTAL`; see
+    `dbtool vacuum --enable-incremental` for converting older databases.
+
+    Args:
+        pages_per_step: Pages freed per transaction
+
+    Returns:
+        int: Number of pages freed
+    """
+    if not await is_incremental_vacuum_enabled():
+        logger.debug("Skipping incremental vacuum: auto_vacuum is not INCREMENTAL")
+        return 0
+
+    async def _vacuum(db: aiosqlite.Connection) -> int:
+        async with db.execute("PRAGMA freelist_count") as cursor:
+            before = (await cursor.fetchone())[0]
+        # The sqlite3 module steps a statement without result rows only
+        # once, which frees a single page, so run it once per page
+        await db.executemany("PRAGMA incremental_vacuum(1)", [()] * min(before, max(1, pages_per_step)))
+        async with db.execute("PRAGMA freelist_count") as cursor:
+            return before - (await cursor.fetchone())[0]
+
+    freed = 0
+    while True:
+        step = await get_database().write(_vacuum)
+        freed += step
+        if step <= 0:
+            return freed
+
+async def analyze_database(analysis_limit: int = 1000) -> None:
+    """Refresh the statistics the query planner uses to choose indexes.
+
+    Args:
+        analysis_limit: Rows sampled per index, bounding the cost on large tables
+    """
+    async def _analyze(db: aiosqlite.Connection) -> None:
+        await db.execute(f"PRAGMA analysis_limit = {int(analysis_limit)}")
+        await db.execute("ANALYZE")
+    await get_database().write(_analyze)
+
+async def enable_incremental_vacuum() -> None:
+    """Switch an existing database to `auto_vacuum = INCREMENTAL`.
+
+    Rebuilds the whole file with VACUUM, which blocks every write until it
+    finishes; run it while the application is stopped.
+    """
+    # VACUUM cannot run inside a transaction, so it gets its own connection
+    connection = await aiosqlite.connect(get_database().db_path, isolation_level=None)
+    try:
+        await connection.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        await connection.execute("VACUUM")
+    finally:
+        await connection.close()
+
+async def get_maintenance_runs() -> List[Dict[str, object]]:
+    """Get the last run of every maintenance job."""
+    rows = await get_database().fetchall(
+        "SELECT job, last_run_ms, status, detail FROM maintenance_runs ORDER BY job"
+    )
+    return [
+        {"job": row[0], "last_run_ms": row[1], "status": row[2], "detail": row[3]}
+        for row in rows
+    ]
+
+async def record_maintenance_run(job: str, status: str, detail: Optional[str] = None) -> None:
+    """Record the outcome of a maintenance job run."""
+    await get_database().execute("""
+        INSERT INTO maintenance_runs (job, last_run_ms, status, detail) VALUES (?, ?, ?, ?)
+        ON CONFLICT(job) DO UPDATE SET
+            last_run_ms = excluded.last_run_ms, status = excluded.status, detail = excluded.detail
+    """, (job, now_ms(), status, detail))
@@ -0,0 +1,187 @@
+"""Versioned schema migrations.
+
+The schema version is stored in SQLite's `user_version` header field. Each
+migration runs in its own write transaction together with the version bump,
+so a failed migration leaves the database at the previous version. New
+databases get their tables from `SCHEMA` and then run every migration, so
+migrations must be safe to apply to a table that already has their changes.
+
+To change the schema, update `SCHEMA` for new databases and append a
+migration with the next version number here. Never edit or reorder a
+migration that has been released.
+"""
+import logging
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List
+
+import aiosqlite
+
+from .connection import get_database
+from .models import SCHEMA
+from .timestamps import to_epoch_ms
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Migration:
+    """A single schema change."""
+    version: int
+    description: str
+    apply: Callable[[aiosqlite.Connection], Awaitable[None]]
+
+async def get_schema_version(db: aiosqlite.Connection) -> int:
+    """Read the schema version recorded in the database."""
+    async with db.execute("PRAGMA user_version") as cursor:
+        row = await cursor.fetchone()
+    return row[0] if row else 0
+
+async def _add_column_if_missing(db: aiosqlite.Connection, table: str, column: str, column_type: str) -> None:
+    """Add a column unless the table already has it."""
+    async with db.execute(f"PRAGMA table_info({table})") as cursor:
+        existing = {row[1] for row in await cursor.fetchall()}
+    if column not in existing:
+        logger.info(f"Adding column {table}.{column}")
+        await db.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+def _run_statements(*statements: str) -> Callable[[aiosqlite.Connection], Awaitable[None]]:
+    """Build a migration step that runs DDL statements in order."""
+    async def _apply(db: aiosqlite.Connection) -> None:
+        for statement in statements:
+            await db.execute(statement)
+    return _apply
+
+async def _baseline(db: aiosqlite.Connection) -> None:
+    """Bring databases created before versioning up to the original schema."""
+    for create_sql in SCHEMA.values():
+        await db.execute(create_sql)
+    await _add_column_if_missing(db, "queue", "lease_owner", "TEXT")
+    await _add_column_if_missing(db, "queue", "lease_expires_at", "INTEGER")
+
+# Rows converted per statement when backfilling a column
+BACKFILL_BATCH_SIZE = 5000
+
+async def _backfill_timestamp_ms(db: aiosqlite.Connection, table: str) -> None:
+    """Fill a table's timestamp_ms column from its text timestamp column."""
+    last_id = 0
+    converted = unparsed = 0
+    while True:
+        async with db.execute(
+            f"SELECT id, timestamp FROM {table} WHERE id > ? AND timestamp_ms IS NULL ORDER BY id LIMIT ?",
+            (last_id, BACKFILL_BATCH_SIZE)
+        ) as cursor:
+            rows = await cursor.fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+
+        updates = []
+        for row_id, text in rows:
+            timestamp_ms = to_epoch_ms(text)
+            if timestamp_ms is None:
+                unparsed += 1
+                continue
+            updates.append((timestamp_ms, row_id))
+        await db.executemany(f"UPDATE {table} SET timestamp_ms = ? WHERE id = ?", updates)
+        converted += len(updates)
+
+    logger.info(f"Backfilled {table}.timestamp_ms for {converted} rows ({unparsed} unparseable left empty)")
+
+async def _add_timestamp_ms(db: aiosqlite.Connection) -> None:
+    """Add epoch-millisecond timestamps next to the mixed-format text ones."""
+    for table in ("messages", "queue"):
+        await _add_column_if_missing(db, table, "timestamp_ms", "INTEGER")
+        await _backfill_timestamp_ms(db, table)
+
+async def _add_retry_columns(db: aiosqlite.Connection) -> None:
+    """Add retry scheduling columns to the queue and the dead letter table."""
+    await _add_column_if_missing(db, "queue", "next_attempt_at", "INTEGER")
+    await _add_column_if_missing(db, "queue", "last_error", "TEXT")
+    await db.execute(SCHEMA["dead_letters"])
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "baseline tables and queue lease columns", _baseline),
+    Migration(2, "indexes for queue claiming and queue/history lookups", _run_statements(
+        # Pending/processing scans ordered by age, status counts and filters
+        "CREATE INDEX IF NOT EXISTS idx_queue_status_timestamp ON queue (status, timestamp, id)",
+        # Head-of-user check when claiming: earlier unfinished items of a user
+        "CREATE INDEX IF NOT EXISTS idx_queue_user_status ON queue (letta_user_id, status, id)",
+        # Message history: is a message still queued?
+        "CREATE INDEX IF NOT EXISTS idx_queue_message_status ON queue (message_id, status)"
+    )),
+    Migration(3, "indexes for profile and message lookups", _run_statements(
+        # Profile lookups and joins by Letta user
+        "CREATE INDEX IF NOT EXISTS idx_platform_profiles_letta_user ON platform_profiles (letta_user_id)",
+        # Recent messages of a user on a platform profile
+        "CREATE INDEX IF NOT EXISTS idx_messages_user_profile_timestamp "
+        "ON messages (letta_user_id, platform_profile_id, timestamp)",
+        # Processed message history ordered by time
+        "CREATE INDEX IF NOT EXISTS idx_messages_processed_timestamp ON messages (processed, timestamp)"
+    )),
+    Migration(4, "epoch millisecond timestamp columns", _add_timestamp_ms),
+    Migration(5, "order queue and message indexes by timestamp_ms", _run_statements(
+        "DROP INDEX IF EXISTS idx_queue_status_timestamp",
+        "CREATE INDEX IF NOT EXISTS idx_queue_status_timestamp_ms ON queue (status, timestamp_ms, id)",
+        "DROP INDEX IF EXISTS idx_messages_user_profile_timestamp",
+        "CREATE INDEX IF NOT EXISTS idx_messages_user_profile_timestamp_ms "
+        "ON messages (letta_user_id, platform_profile_id, timestamp_ms, id)",
+        "DROP INDEX IF EXISTS idx_messages_processed_timestamp",
+        "CREATE INDEX IF NOT EXISTS idx_messages_processed_timestamp_ms ON messages (processed, timestamp_ms, id)"
+    )),
+    Migration(6, "pool of spare Letta identities and core blocks", _run_statements(
+        SCHEMA["letta_spares"]
+    )),
+    Migration(7, "queue retry scheduling and dead letters", _add_retry_columns),
+    Migration(8, "index of unfinished queue items by user", _run_statements(
+        # Head of every user with work, for fair scheduling; only covers the backlog
+        "CREATE INDEX IF NOT EXISTS idx_queue_unfinished_user ON queue (letta_user_id, id) "
+        "WHERE status IN ('pending', 'processing')"
+    )),
+    Migration(9, "archive of finished queue items", _run_statements(
+        SCHEMA["queue_archive"],
+        # Listing archived items newest first
+        "CREATE INDEX IF NOT EXISTS idx_queue_archive_timestamp_ms ON queue_archive (timestamp_ms, id)"
+    )),
+    Migration(10, "maintenance job runs and message pruning indexes", _run_statements(
+        SCHEMA["maintenance_runs"],
+        # Pruning skips messages a dead letter still refers to
+        "CREATE INDEX IF NOT EXISTS idx_dead_letters_message ON dead_letters (message_id)",
+        # Age-based pruning
+        "CREATE INDEX IF NOT EXISTS idx_messages_timestamp_ms ON messages (timestamp_ms)"
+    ))
+]
+
+# Schema version of a fully migrated database
+LATEST_VERSION = MIGRATIONS[-1].version
+
+async def run_migrations() -> int:
+    """Apply every migration newer than the database's schema version.
+
+    Returns:
+        int: The schema version after migrating
+    """
+    database = get_database()
+    async with database.reader() as db:
+        version = await get_schema_version(db)
+
+    if version > LATEST_VERSION:
+        logger.warning(
+            f"Database schema version {version} is newer than the latest known version {LATEST_VERSION}"
+        )
+
+    for migration in MIGRATIONS:
+        if migration.version <= version:
+            continue
+
+        async def _apply(db: aiosqlite.Connection, migration: Migration = migration) -> bool:
+            # Another process may have migrated since the version was read
+            if await get_schema_version(db) >= migration.version:
+                return False
+            await migration.apply(db)
+            await db.execute(f"PRAGMA user_version = {int(migration.version)}")
+            return True
+
+        if await database.write(_apply):
+            logger.info(f"Applied migration {migration.version}: {migration.description}")
+        version = migration.version
+
+    return version
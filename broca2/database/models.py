@@ -1,7 +1,7 @@
 """Database models and schemas for the application."""
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
 @dataclass
 class LettaUser:
@@ -15,6 +15,14 @@ class LettaUser:
     custom_instructions: Optional[str] = None
     is_active: bool = True
 
+@dataclass
+class LettaSpare:
+    """Unassigned Letta identity and core block, ready to be given to a new user."""
+    id: Optional[int]
+    letta_identity_id: str
+    letta_block_id: str
+    created_at: Optional[str] = None
+
 @dataclass
 class PlatformProfile:
     """Platform-specific profile for a user."""
@@ -39,6 +47,7 @@ class Message:
     timestamp: str
     processed: bool = False
     agent_response: Optional[str] = None
+    timestamp_ms: Optional[int] = None  # Epoch milliseconds, used for ordering
 
 @dataclass
 class QueueItem:
@@ -46,9 +55,75 @@ class QueueItem:
     id: Optional[int]
     letta_user_id: int
     message_id: int
-    status: str  # 'pending', 'processing', 'done', 'failed'
+    status: str  # 'pending', 'processing', 'completed', 'failed', 'expired'
     attempts: int = 0
     timestamp: Optional[str] = None
+    lease_owner: Optional[str] = None  # Consumer currently holding the item
+    lease_expires_at: Optional[int] = None  # Epoch milliseconds
+    timestamp_ms: Optional[int] = None  # Epoch milliseconds, used for ordering
+    next_attempt_at: Optional[int] = None  # Epoch milliseconds before which a retry is not claimed
+    last_error: Optional[str] = None  # Error of the last failed attempt
+
+@dataclass
+class QueueHead:
+    """A user's oldest unfinished queue item, the only one of theirs that can be claimed."""
+    id: int  # Queue item ID
+    letta_user_id: int
+    platform: Optional[str]
+    timestamp_ms: Optional[int]
+    claimable: bool  # False while it is in flight or waiting for a retry
+
+@dataclass
+class DeadLetter:
+    """Queue item that failed permanently or ran out of retries."""
+    id: Optional[int]
+    queue_id: int
+    letta_user_id: int
+    message_id: int
+    attempts: int
+    error_class: str  # 'transient', 'permanent' or 'expired'
+    last_error: Optional[str] = None
+    queued_at_ms: Optional[int] = None  # When the item was queued, epoch milliseconds
+    failed_at_ms: Optional[int] = None  # When it was dead-lettered, epoch milliseconds
+
+@dataclass
+class WorkItem:
+    """A claimed queue item hydrated with everything needed to process it."""
+    id: int  # Queue item ID
+    letta_user_id: int
+    message_id: int
+    attempts: int
+    timestamp: Optional[str]
+    role: Optional[str]
+    message: Optional[str]
+    platform_profile_id: Optional[int]
+    platform: Optional[str]
+    platform_user_id: Optional[str]
+    username: Optional[str]
+    display_name: Optional[str]
+    letta_block_id: Optional[str]
+    lease_owner: Optional[str] = None
+    lease_expires_at: Optional[int] = None
+    timestamp_ms: Optional[int] = None  # When the item was queued, epoch milliseconds
+    claimed_at_ms: Optional[int] = None  # When this attempt claimed the item, epoch milliseconds
+    coalesced: List["WorkItem"] = field(default_factory=list)  # Later items of the user answered together with this one
+
+    @property
+    def batch(self) -> List["WorkItem"]:
+        """This item followed by the items coalesced into it."""
+        return [self, *self.coalesced]
+
+    @property
+    def profile(self) -> PlatformProfile:
+        """The platform profile the message was received on."""
+        return PlatformProfile(
+            id=self.platform_profile_id,
+            letta_user_id=self.letta_user_id,
+            platform=self.platform,
+            platform_user_id=self.platform_user_id,
+            username=self.username,
+            display_name=self.display_name
+        )
 
 @dataclass
 class QueueItemDisplay:
@@ -103,6 +178,7 @@ SCHEMA = {
             timestamp TEXT,
             processed INTEGER DEFAULT 0,
             agent_response TEXT,
+            timestamp_ms INTEGER,
             FOREIGN KEY (letta_user_id) REFERENCES letta_users(id),
             FOREIGN KEY (platform_profile_id) REFERENCES platform_profiles(id)
         )
@@ -115,8 +191,57 @@ SCHEMA = {
             status TEXT,
             attempts INTEGER DEFAULT 0,
             timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+            lease_owner TEXT,
+            lease_expires_at INTEGER,
+            timestamp_ms INTEGER,
+            next_attempt_at INTEGER,
+            last_error TEXT,
+            FOREIGN KEY (letta_user_id) REFERENCES letta_users(id),
+            FOREIGN KEY (message_id) REFERENCES messages(id)
+        )
+    """,
+    'queue_archive': """
+        CREATE TABLE IF NOT EXISTS queue_archive (
+            id INTEGER PRIMARY KEY,
+            letta_user_id INTEGER,
+            message_id INTEGER,
+            status TEXT,
+            attempts INTEGER,
+            timestamp TEXT,
+            timestamp_ms INTEGER,
+            last_error TEXT,
+            archived_at_ms INTEGER
+        )
+    """,
+    'dead_letters': """
+        CREATE TABLE IF NOT EXISTS dead_letters (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            queue_id INTEGER,
+            letta_user_id INTEGER,
+            message_id INTEGER,
+            attempts INTEGER,
+            error_class TEXT,
+            last_error TEXT,
+            queued_at_ms INTEGER,
+            failed_at_ms INTEGER,
             FOREIGN KEY (letta_user_id) REFERENCES letta_users(id),
             FOREIGN KEY (message_id) REFERENCES messages(id)
         )
+    """,
+    'maintenance_runs': """
+        CREATE TABLE IF NOT EXISTS maintenance_runs (
+            job TEXT PRIMARY KEY,
+            last_run_ms INTEGER,
+            status TEXT,
+            detail TEXT
+        )
+    """,
+    'letta_spares': """
+        CREATE TABLE IF NOT EXISTS letta_spares (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            letta_identity_id TEXT NOT NULL,
+            letta_block_id TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
     """
-} 
\ No newline at end of file
+}
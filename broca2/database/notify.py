@@ -0,0 +1,218 @@
+"""Queue wakeup notifications for consumers in this and other processes.
+
+Producers call `notify()` after committing new queue rows. Consumers waiting
+in the same process are woken directly; consumers in other processes sharing
+the same database are woken through Unix datagram sockets kept in a channel
+directory next to the database file. Platforms without Unix sockets fall back
+to the consumer's polling interval.
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Optional, Set
+
+# Database file path
+DB_PATH = os.path.join(os.path.dirname(__file__), "..", "sanctum.db")
+
+# How long the list of peer sockets is reused before re-reading the directory
+PEER_CACHE_SECONDS = 1.0
+
+logger = logging.getLogger(__name__)
+
+class QueueNotifier:
+    """Wakes queue consumers when new work is committed."""
+
+    def __init__(self, channel_dir: str):
+        """Initialize the notifier.
+
+        Args:
+            channel_dir: Directory holding one socket per listening process
+        """
+        self.channel_dir = channel_dir
+        self.sequence = 0  # Bumped on every wakeup
+        self._waiters: Set[asyncio.Future] = set()
+        self._listen_socket: Optional[socket.socket] = None
+        self._listen_path: Optional[str] = None
+        self._listen_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._listeners = 0  # Consumers sharing the listening socket
+        self._send_socket: Optional[socket.socket] = None
+        self._peers: list = []
+        self._peers_read_at = 0.0
+
+    @property
+    def supported(self) -> bool:
+        """Whether cross-process notifications are available on this platform."""
+        return hasattr(socket, "AF_UNIX")
+
+    def notify_local(self) -> None:
+        """Wake consumers waiting in this process."""
+        self.sequence += 1
+        for waiter in list(self._waiters):
+            if waiter.done():
+                continue
+            loop = waiter.get_loop()
+            try:
+                if loop.is_closed():
+                    continue
+                loop.call_soon_threadsafe(self._resolve, waiter)
+            except RuntimeError:
+                # Loop shut down between the check and the call
+                continue
+
+    def notify(self) -> None:
+        """Wake consumers in this process and in every listening peer process."""
+        self.notify_local()
+        if not self.supported:
+            return
+
+        for peer in self._get_peers():
+            try:
+                self._get_send_socket().sendto(b"1", peer)
+            except BlockingIOError:
+                # The peer's buffer is full, so it already has wakeups pending
+                continue
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Stale socket left behind by a process that died
+                self._remove_stale_peer(peer)
+            except OSError as e:
+                logger.debug(f"Could not notify queue consumer {peer}: {str(e)}")
+
+    async def wait(self, timeout: float, since: Optional[int] = None) -> bool:
+        """Wait for a wakeup.
+
+        Args:
+            timeout: Maximum time to wait in seconds
+            since: Sequence number read before the caller last checked for
+                work; returns immediately if a wakeup happened since then
+
+        Returns:
+            bool: True if woken by a notification, False on timeout
+        """
+        if since is not None and since != self.sequence:
+            return True
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout=timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._waiters.discard(waiter)
+
+    def listen(self) -> None:
+        """Start receiving wakeups sent by other processes.
+
+        Must be called from inside the event loop that will wait for work.
+        Every call should be paired with a call to `close()`.
+        """
+        self._listeners += 1
+        if not self.supported or self._listen_socket is not None:
+            return
+
+        try:
+            os.makedirs(self.channel_dir, exist_ok=True)
+            path = os.path.join(self.channel_dir, f"{os.getpid()}-{uuid.uuid4().hex[:8]}.sock")
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            sock.setblocking(False)
+            sock.bind(path)
+        except OSError as e:
+            logger.warning(f"Cross-process queue notifications unavailable, falling back to polling: {str(e)}")
+            return
+
+        self._listen_loop = asyncio.get_running_loop()
+        self._listen_loop.add_reader(sock.fileno(), self._on_readable)
+        self._listen_socket = sock
+        self._listen_path = path
+        self._peers_read_at = 0.0
+        logger.info(f"Listening for queue notifications on {path}")
+
+    def close(self) -> None:
+        """Stop listening and remove this process's socket once the last consumer closes."""
+        self._listeners = max(0, self._listeners - 1)
+        if self._listeners:
+            return
+        if self._listen_socket is not None:
+            try:
+                self._listen_loop.remove_reader(self._listen_socket.fileno())
+            except (RuntimeError, ValueError):
+                pass
+            self._listen_socket.close()
+            self._listen_socket = None
+            self._listen_loop = None
+        if self._listen_path is not None:
+            try:
+                os.unlink(self._listen_path)
+            except FileNotFoundError:
+                pass
+            self._listen_path = None
+        if self._send_socket is not None:
+            self._send_socket.close()
+            self._send_socket = None
+
+    @staticmethod
+    def _resolve(waiter: asyncio.Future) -> None:
+        """Complete a waiter if nobody else has."""
+        if not waiter.done():
+            waiter.set_result(True)
+
+    def _on_readable(self) -> None:
+        """Drain pending datagrams and wake local consumers once."""
+        received = False
+        while True:
+            try:
+                self._listen_socket.recv(64)
+                received = True
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError:
+                break
+        if received:
+            self.notify_local()
+
+    def _get_send_socket(self) -> socket.socket:
+        """Get the unbound socket used to send wakeups."""
+        if self._send_socket is None:
+            self._send_socket = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            self._send_socket.setblocking(False)
+        return self._send_socket
+
+    def _get_peers(self) -> list:
+        """Get the sockets of other listening processes."""
+        now = time.monotonic()
+        if now - self._peers_read_at >= PEER_CACHE_SECONDS:
+            try:
+                names = os.listdir(self.channel_dir)
+            except FileNotFoundError:
+                names = []
+            self._peers = [
+                os.path.join(self.channel_dir, name)
+                for name in names
+                if name.endswith(".sock")
+                and os.path.join(self.channel_dir, name) != self._listen_path
+            ]
+            self._peers_read_at = now
+        return self._peers
+
+    def _remove_stale_peer(self, peer: str) -> None:
+        """Forget and delete the socket of a process that is gone."""
+        if peer in self._peers:
+            self._peers.remove(peer)
+        try:
+            os.unlink(peer)
+        except OSError:
+            pass
+
+# Create a singleton instance
+_queue_notifier: Optional[QueueNotifier] = None
+
+def get_queue_notifier() -> QueueNotifier:
+    """Get the queue notifier singleton instance."""
+    global _queue_notifier
+    if _queue_notifier is None:
+        _queue_notifier = QueueNotifier(f"{os.path.abspath(DB_PATH)}.notify")
+    return _queue_notifier
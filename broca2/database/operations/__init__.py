@@ -8,6 +8,8 @@ users.py:
     - User preferences (update_letta_user)
     - User lookups (get_user_details, get_all_users)
     - Platform profile management (get_platform_profile_id, upsert_user)
+    - Core block lookups (get_letta_user_block_id, get_user_block_ids)
+    - Letta provisioning (get_unprovisioned_users, set_letta_resources, spare pool)
 
 messages.py:
     - Message operations (insert_message, get_message_text)
@@ -15,8 +17,12 @@ messages.py:
     - Message history (get_message_history)
 
 queue.py:
-    - Queue management (add_to_queue, get_pending_queue_item)
-    - Queue status (update_queue_status)
+    - Queue management (add_to_queue, enqueue_message, get_pending_queue_item)
+    - Queue claiming (claim_queue_items, claim_work_items, renew_queue_leases)
+    - Queue status (update_queue_status, release_queue_item, schedule_queue_retry)
+    - Recovery (release_queue_leases, recover_orphaned_queue_items)
+    - Dead letters (dead_letter_queue_item, get_dead_letters, replay_dead_letters)
+    - Expiry and archival (expire_queue_items, archive_queue_items)
     - Queue monitoring (get_all_queue_items, flush_all_queue_items)
 
 shared.py:
@@ -35,6 +41,12 @@ from .users import (
     get_all_users,
     get_platform_profile_id,
     get_letta_user_block_id,
+    get_user_block_ids,
+    get_unprovisioned_users,
+    set_letta_resources,
+    add_spare_letta_resources,
+    take_spare_letta_resources,
+    count_spare_letta_resources,
     upsert_user
 )
 
@@ -47,8 +59,21 @@ from .messages import (
 
 from .queue import (
     add_to_queue,
+    enqueue_message,
     get_pending_queue_item,
+    claim_queue_items,
+    claim_work_items,
+    renew_queue_leases,
     update_queue_status,
+    release_queue_item,
+    release_queue_leases,
+    recover_orphaned_queue_items,
+    schedule_queue_retry,
+    dead_letter_queue_item,
+    get_dead_letters,
+    replay_dead_letters,
+    expire_queue_items,
+    archive_queue_items,
     get_all_queue_items,
     flush_all_queue_items,
     delete_queue_item
@@ -70,6 +95,12 @@ __all__ = [
     'get_all_users',
     'get_platform_profile_id',
     'get_letta_user_block_id',
+    'get_user_block_ids',
+    'get_unprovisioned_users',
+    'set_letta_resources',
+    'add_spare_letta_resources',
+    'take_spare_letta_resources',
+    'count_spare_letta_resources',
     'upsert_user',
     
     # Messages
@@ -80,8 +111,21 @@ __all__ = [
     
     # Queue
     'add_to_queue',
+    'enqueue_message',
     'get_pending_queue_item',
+    'claim_queue_items',
+    'claim_work_items',
+    'renew_queue_leases',
     'update_queue_status',
+    'release_queue_item',
+    'release_queue_leases',
+    'recover_orphaned_queue_items',
+    'schedule_queue_retry',
+    'dead_letter_queue_item',
+    'get_dead_letters',
+    'replay_dead_letters',
+    'expire_queue_items',
+    'archive_queue_items',
     'get_all_queue_items',
     'flush_all_queue_items',
     'delete_queue_item',
@@ -1,13 +1,10 @@
 """Message-related database operations (insert, update, history, etc)."""
-import os
 import json
 from datetime import datetime
 from typing import Optional, List, Tuple, Dict, Any
-import aiosqlite
+from ..connection import get_database
 from ..models import Message, PlatformProfile
-
-# Database file path
-DB_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "sanctum.db")
+from ..timestamps import now_ms, to_epoch_ms
 
 async def insert_message(
     letta_user_id: int,
@@ -18,42 +15,38 @@ async def insert_message(
 ) -> int:
     """Insert a new message into the database."""
     now = timestamp or datetime.utcnow().isoformat()
+    timestamp_ms = to_epoch_ms(now) or now_ms()
     
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("""
-            INSERT INTO messages (
-                letta_user_id,
-                platform_profile_id,
-                role,
-                message,
-                timestamp
-            ) VALUES (?, ?, ?, ?, ?)
-        """, (letta_user_id, platform_profile_id, role, message, now))
-        await db.commit()
-        return cursor.lastrowid
+    cursor = await get_database().execute("""
+        INSERT INTO messages (
+            letta_user_id,
+            platform_profile_id,
+            role,
+            message,
+            timestamp,
+            timestamp_ms
+        ) VALUES (?, ?, ?, ?, ?, ?)
+    """, (letta_user_id, platform_profile_id, role, message, now, timestamp_ms))
+    return cursor.lastrowid
 
 async def get_message_text(message_id: int) -> Optional[Tuple[str, str]]:
     """Get the message text and role for a message ID."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("""
-            SELECT role, message 
-            FROM messages 
-            WHERE id = ?
-        """, (message_id,)) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                return row[0], row[1]
-            return None
+    row = await get_database().fetchone("""
+        SELECT role, message 
+        FROM messages 
+        WHERE id = ?
+    """, (message_id,))
+    if row:
+        return row[0], row[1]
+    return None
 
 async def update_message_with_response(message_id: int, agent_response: str) -> None:
     """Update a message with the agent's response."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-            UPDATE messages 
-            SET agent_response = ? 
-            WHERE id = ?
-        """, (agent_response, message_id))
-        await db.commit()
+    await get_database().execute("""
+        UPDATE messages 
+        SET agent_response = ? 
+        WHERE id = ?
+    """, (agent_response, message_id))
 
 async def get_message_history() -> List[dict]:
     """
@@ -62,41 +55,39 @@ async def get_message_history() -> List[dict]:
     Returns:
         List[dict]: List of message records with associated user and status information.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("""
-            SELECT 
-                m.id, m.letta_user_id, m.platform_profile_id, m.role,
-                m.message, m.agent_response, m.timestamp,
-                pp.username, pp.display_name,
-                'done' as status
-            FROM messages m
-            INNER JOIN platform_profiles pp ON m.platform_profile_id = pp.id
-            WHERE m.processed = 1 
-            AND m.agent_response IS NOT NULL
-            AND NOT EXISTS (
-                SELECT 1 FROM queue q 
-                WHERE q.message_id = m.id 
-                AND q.status IN ('pending', 'processing', 'failed')
-            )
-            ORDER BY m.timestamp DESC
-            LIMIT 100
-        """) as cursor:
-            rows = await cursor.fetchall()
-            return [
-                {
-                    "id": row[0],
-                    "letta_user_id": row[1],
-                    "platform_profile_id": row[2],
-                    "role": row[3],
-                    "message": row[4],
-                    "agent_response": row[5],
-                    "timestamp": row[6],
-                    "username": row[7],
-                    "display_name": row[8],
-                    "status": row[9]
-                }
-                for row in rows
-            ]
+    rows = await get_database().fetchall("""
+        SELECT 
+            m.id, m.letta_user_id, m.platform_profile_id, m.role,
+            m.message, m.agent_response, m.timestamp,
+            pp.username, pp.display_name,
+            'done' as status
+        FROM messages m
+        INNER JOIN platform_profiles pp ON m.platform_profile_id = pp.id
+        WHERE m.processed = 1 
+        AND m.agent_response IS NOT NULL
+        AND NOT EXISTS (
+            SELECT 1 FROM queue q 
+            WHERE q.message_id = m.id 
+            AND q.status IN ('pending', 'processing', 'failed')
+        )
+        ORDER BY m.timestamp_ms DESC, m.id DESC
+        LIMIT 100
+    """)
+    return [
+        {
+            "id": row[0],
+            "letta_user_id": row[1],
+            "platform_profile_id": row[2],
+            "role": row[3],
+            "message": row[4],
+            "agent_response": row[5],
+            "timestamp": row[6],
+            "username": row[7],
+            "display_name": row[8],
+            "status": row[9]
+        }
+        for row in rows
+    ]
 
 async def get_messages(
     letta_user_id: int,
@@ -104,19 +95,17 @@ async def get_messages(
     limit: int = 10
 ) -> List[Dict[str, Any]]:
     """Get recent messages for a user and platform profile."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute("""
-            SELECT 
-                m.id, m.letta_user_id, m.platform_profile_id, 
-                m.role, m.message, m.agent_response, m.timestamp
-            FROM messages m
-            WHERE m.letta_user_id = ? AND m.platform_profile_id = ?
-            ORDER BY m.timestamp DESC
-            LIMIT ?
-        """, (letta_user_id, platform_profile_id, limit))
-        
-        rows = await cursor.fetchall()
-        return [{
+    rows = await get_database().fetchall("""
+        SELECT 
+            m.id, m.letta_user_id, m.platform_profile_id, 
+            m.role, m.message, m.agent_response, m.timestamp
+        FROM messages m
+        WHERE m.letta_user_id = ? AND m.platform_profile_id = ?
+        ORDER BY m.timestamp_ms DESC, m.id DESC
+        LIMIT ?
+    """, (letta_user_id, platform_profile_id, limit))
+    
+    return [{
             "id": row[0],
             "letta_user_id": row[1],
             "platform_profile_id": row[2],
@@ -135,29 +124,27 @@ async def get_message_platform_profile(message_id: int) -> Optional[PlatformProf
     Returns:
         Optional[PlatformProfile]: The platform profile or None if not found
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("""
-            SELECT 
-                pp.id, pp.letta_user_id, pp.platform, pp.platform_user_id,
-                pp.username, pp.display_name, pp.metadata, pp.created_at, pp.last_active
-            FROM messages m
-            INNER JOIN platform_profiles pp ON m.platform_profile_id = pp.id
-            WHERE m.id = ?
-        """, (message_id,)) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                return PlatformProfile(
-                    id=row[0],
-                    letta_user_id=row[1],
-                    platform=row[2],
-                    platform_user_id=row[3],
-                    username=row[4],
-                    display_name=row[5],
-                    metadata=row[6],
-                    created_at=row[7],
-                    last_active=row[8]
-                )
-            return None
+    row = await get_database().fetchone("""
+        SELECT 
+            pp.id, pp.letta_user_id, pp.platform, pp.platform_user_id,
+            pp.username, pp.display_name, pp.metadata, pp.created_at, pp.last_active
+        FROM messages m
+        INNER JOIN platform_profiles pp ON m.platform_profile_id = pp.id
+        WHERE m.id = ?
+    """, (message_id,))
+    if row:
+        return PlatformProfile(
+            id=row[0],
+            letta_user_id=row[1],
+            platform=row[2],
+            platform_user_id=row[3],
+            username=row[4],
+            display_name=row[5],
+            metadata=row[6],
+            created_at=row[7],
+            last_active=row[8]
+        )
+    return None
 
 async def update_message_status(
     message_id: int,
@@ -173,11 +160,9 @@ async def update_message_status(
     """
     processed = 1 if status == 'success' else 0
     
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-            UPDATE messages 
-            SET processed = ?,
-                agent_response = COALESCE(?, agent_response)
-            WHERE id = ?
-        """, (processed, response, message_id))
-        await db.commit() 
\ No newline at end of file
+    await get_database().execute("""
+        UPDATE messages 
+        SET processed = ?,
+            agent_response = COALESCE(?, agent_response)
+        WHERE id = ?
+    """, (processed, response, message_id))
@@ -1,142 +1,852 @@
 """Queue-related database operations (add, get, update, flush, etc)."""
-import os
 import json
 import logging
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 import aiosqlite
-from ..models import QueueItem
-
-# Database file path
-DB_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "sanctum.db")
+from ..connection import get_database
+from ..depth import get_queue_depth
+from ..ingest import get_ingest_writer
+from ..models import DeadLetter, QueueHead, QueueItem, WorkItem
+from ..notify import get_queue_notifier
+from ..timestamps import now_ms
 
 # Set up logger
 logger = logging.getLogger(__name__)
 
+# Statuses a queue item never leaves, eventually moved to the archive
+FINISHED_QUEUE_STATUSES = ('completed', 'failed', 'flushed', 'expired')
+
+# Statuses of items counted in the queue depth
+UNFINISHED_QUEUE_STATUSES = ('pending', 'processing')
+
+QUEUE_ITEM_COLUMNS = "id, letta_user_id, message_id, status, attempts, timestamp, lease_owner, lease_expires_at, timestamp_ms, next_attempt_at, last_error"
+
+def _queue_item_from_row(row) -> QueueItem:
+    """Build a QueueItem from a row selected with QUEUE_ITEM_COLUMNS."""
+    return QueueItem(
+        id=row[0],
+        letta_user_id=row[1],
+        message_id=row[2],
+        status=row[3],
+        attempts=row[4],
+        timestamp=row[5],
+        lease_owner=row[6],
+        lease_expires_at=row[7],
+        timestamp_ms=row[8],
+        next_attempt_at=row[9],
+        last_error=row[10]
+    )
+
+DEAD_LETTER_COLUMNS = "id, queue_id, letta_user_id, message_id, attempts, error_class, last_error, queued_at_ms, failed_at_ms"
+
+def _dead_letter_from_row(row) -> DeadLetter:
+    """Build a DeadLetter from a row selected with DEAD_LETTER_COLUMNS."""
+    return DeadLetter(
+        id=row[0],
+        queue_id=row[1],
+        letta_user_id=row[2],
+        message_id=row[3],
+        attempts=row[4],
+        error_class=row[5],
+        last_error=row[6],
+        queued_at_ms=row[7],
+        failed_at_ms=row[8]
+    )
+
 async def add_to_queue(letta_user_id: int, message_id: int) -> None:
-    """Add a message to the processing queue."""
+    """Add a message to the processing queue and wake waiting consumers."""
     now = datetime.utcnow().isoformat()
     
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-            INSERT INTO queue (
-                letta_user_id,
-                message_id,
-                status,
-                timestamp,
-                attempts
-            ) VALUES (?, ?, 'pending', ?, 0)
-        """, (letta_user_id, message_id, now))
-        await db.commit()
+    await get_database().execute("""
+        INSERT INTO queue (
+            letta_user_id,
+            message_id,
+            status,
+            timestamp,
+            timestamp_ms,
+            attempts
+        ) VALUES (?, ?, 'pending', ?, ?, 0)
+    """, (letta_user_id, message_id, now, now_ms()))
+    get_queue_depth().add()
+    
+    # Wake consumers waiting for work
+    get_queue_notifier().notify()
+
+async def enqueue_message(
+    letta_user_id: int,
+    platform_profile_id: int,
+    message: str,
+    role: str = "user",
+    timestamp: Optional[str] = None
+) -> int:
+    """Insert an inbound message and add it to the processing queue.
+
+    Equivalent to `insert_message` followed by `add_to_queue`, but goes
+    through the ingest writer so bursts of messages share one commit.
+
+    Returns:
+        int: The id of the inserted message
+    """
+    return await get_ingest_writer().submit(
+        letta_user_id=letta_user_id,
+        platform_profile_id=platform_profile_id,
+        message=message,
+        role=role,
+        timestamp=timestamp
+    )
 
 async def get_pending_queue_item() -> Optional[QueueItem]:
     """Get the next pending item from the queue."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("""
-            SELECT * FROM queue 
-            WHERE status = 'pending' 
-            ORDER BY timestamp ASC 
-            LIMIT 1
-        """) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                return QueueItem(
-                    id=row[0],
-                    letta_user_id=row[1],
-                    message_id=row[2],
-                    status=row[3],
-                    attempts=row[4],
-                    timestamp=row[5]
-                )
-            return None
+    row = await get_database().fetchone(f"""
+        SELECT {QUEUE_ITEM_COLUMNS} FROM queue 
+        WHERE status = 'pending' 
+        ORDER BY timestamp_ms ASC, id ASC 
+        LIMIT 1
+    """)
+    if row:
+        return _queue_item_from_row(row)
+    return None
+
+async def _claim_rows(db: aiosqlite.Connection, lease_owner: str, lease_seconds: float, limit: int) -> list:
+    """Claim queue rows inside the writer's transaction."""
+    now = now_ms()
+    expires_at = now + int(lease_seconds * 1000)
+
+    async with db.execute(f"""
+        UPDATE queue
+        SET status = 'processing',
+            lease_owner = ?,
+            lease_expires_at = ?,
+            attempts = attempts + 1
+        WHERE id IN (
+            SELECT q.id FROM queue q
+            WHERE (
+                (q.status = 'pending' AND IFNULL(q.next_attempt_at, 0) <= ?)
+                OR (q.status = 'processing' AND IFNULL(q.lease_expires_at, 0) < ?)
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM queue e
+                WHERE e.letta_user_id = q.letta_user_id
+                AND e.status IN ('pending', 'processing')
+                AND e.id < q.id
+            )
+            ORDER BY q.timestamp_ms ASC, q.id ASC
+            LIMIT ?
+        )
+        RETURNING {QUEUE_ITEM_COLUMNS}
+    """, (lease_owner, expires_at, now, now, limit)) as cursor:
+        return await cursor.fetchall()
+
+async def _fetch_queue_heads(db: aiosqlite.Connection) -> List[QueueHead]:
+    """Get the head item of every user with unfinished queue items."""
+    now = now_ms()
+    # The partial index holds only unfinished items, so this scans the
+    # backlog rather than the whole queue history
+    async with db.execute("""
+        SELECT
+            q.id, q.letta_user_id, pp.platform, q.timestamp_ms,
+            (q.status = 'pending' AND IFNULL(q.next_attempt_at, 0) <= ?)
+            OR (q.status = 'processing' AND IFNULL(q.lease_expires_at, 0) < ?)
+        FROM (
+            SELECT MIN(id) AS id
+            FROM queue INDEXED BY idx_queue_unfinished_user
+            WHERE status IN ('pending', 'processing')
+            GROUP BY letta_user_id
+        ) heads
+        JOIN queue q ON q.id = heads.id
+        LEFT JOIN messages m ON m.id = q.message_id
+        LEFT JOIN platform_profiles pp ON pp.id = m.platform_profile_id
+    """, (now, now)) as cursor:
+        rows = await cursor.fetchall()
+    return [
+        QueueHead(id=row[0], letta_user_id=row[1], platform=row[2], timestamp_ms=row[3], claimable=bool(row[4]))
+        for row in rows
+    ]
+
+async def _claim_heads(db: aiosqlite.Connection, heads: List[QueueHead], lease_owner: str, lease_seconds: float) -> list:
+    """Claim chosen head items inside the writer's transaction."""
+    if not heads:
+        return []
+    now = now_ms()
+    placeholders = ", ".join("?" for _ in heads)
+    async with db.execute(f"""
+        UPDATE queue
+        SET status = 'processing',
+            lease_owner = ?,
+            lease_expires_at = ?,
+            attempts = attempts + 1
+        WHERE id IN ({placeholders})
+        RETURNING {QUEUE_ITEM_COLUMNS}
+    """, (lease_owner, now + int(lease_seconds * 1000), *(head.id for head in heads))) as cursor:
+        return await cursor.fetchall()
+
+async def claim_queue_items(lease_owner: str, lease_seconds: float, limit: int) -> List[QueueItem]:
+    """Atomically claim pending queue items for a consumer.
+
+    Claimed items move to 'processing' with a lease held by `lease_owner`
+    until `lease_seconds` from now. Items whose lease has expired (their
+    consumer died or stalled) are reclaimed the same way. Only the oldest
+    unfinished item of each user can be claimed, so a user's messages are
+    processed in order even across several consumer processes. Items
+    waiting for a scheduled retry are not claimed before their
+    `next_attempt_at`, and hold back the user's later items until then.
+
+    Args:
+        lease_owner: Unique identifier of the claiming consumer
+        lease_seconds: Lease duration in seconds
+        limit: Maximum number of items to claim
+
+    Returns:
+        List[QueueItem]: The claimed items ordered by timestamp
+    """
+    # The writer runs every transaction with BEGIN IMMEDIATE, so the candidate
+    # scan and the update see the same snapshot as every other consumer.
+    async def _claim(db: aiosqlite.Connection) -> list:
+        return await _claim_rows(db, lease_owner, lease_seconds, limit)
+
+    rows = await get_database().write(_claim)
+    items = [_queue_item_from_row(row) for row in rows]
+    items.sort(key=lambda item: (item.timestamp_ms or 0, item.id))
+    return items
+
+async def _claim_followers(
+    db: aiosqlite.Connection,
+    head: tuple,
+    lease_owner: str,
+    lease_seconds: float,
+    window_ms: int,
+    max_messages: int
+) -> List[int]:
+    """Claim the pending items queued right behind a claimed item of the same user.
+
+    Followers must be due, come from the same platform profile and be
+    queued within `window_ms` of the claimed item. They are taken in queue
+    order and the run stops at the first item that does not qualify, so the
+    user's messages stay in order.
+    """
+    head_id, letta_user_id, head_timestamp_ms = head[0], head[1], head[8] or 0
+    now = now_ms()
+    async with db.execute("""
+        SELECT q.id, q.status, IFNULL(q.next_attempt_at, 0), IFNULL(q.timestamp_ms, 0),
+            m.platform_profile_id,
+            (SELECT platform_profile_id FROM messages WHERE id = ?)
+        FROM queue q
+        LEFT JOIN messages m ON m.id = q.message_id
+        WHERE q.letta_user_id = ?
+        AND q.id > ?
+        AND q.status IN ('pending', 'processing')
+        ORDER BY q.id ASC
+        LIMIT ?
+    """, (head[2], letta_user_id, head_id, max_messages - 1)) as cursor:
+        candidates = await cursor.fetchall()
+
+    follower_ids = []
+    for queue_id, status, next_attempt_at, timestamp_ms, platform_profile_id, head_profile_id in candidates:
+        if (
+            status != 'pending'
+            or next_attempt_at > now
+            or timestamp_ms > head_timestamp_ms + window_ms
+            or platform_profile_id is None
+            or platform_profile_id != head_profile_id
+        ):
+            break
+        follower_ids.append(queue_id)
+
+    if follower_ids:
+        placeholders = ", ".join("?" for _ in follower_ids)
+        await db.execute(f"""
+            UPDATE queue
+            SET status = 'processing',
+                lease_owner = ?,
+                lease_expires_at = ?,
+                attempts = attempts + 1
+            WHERE id IN ({placeholders})
+        """, (lease_owner, now + int(lease_seconds * 1000), *follower_ids))
+    return follower_ids
+
+async def claim_work_items(
+    lease_owner: str,
+    lease_seconds: float,
+    limit: int,
+    coalesce_window_seconds: float = 0,
+    coalesce_max_messages: int = 1,
+    select_heads: Optional[Callable[[List[QueueHead], int], List[QueueHead]]] = None
+) -> List[WorkItem]:
+    """Claim queue items and load everything needed to process them.
+
+    Claims exactly like `claim_queue_items`, then hydrates the claimed items
+    with their message, platform profile and core block in one joined query
+    on the same connection and transaction.
+
+    With coalescing, each claimed item also takes the user's pending items
+    queued right behind it within `coalesce_window_seconds`, up to
+    `coalesce_max_messages` in all, so a burst of messages can be answered
+    in a single agent call. They are claimed under the same lease and
+    returned in the claimed item's `coalesced` list.
+
+    With `select_heads`, the items to claim are not simply the oldest ones:
+    it is given the head item of every user with unfinished items and the
+    limit, and returns the claimable heads to claim, e.g. to share the
+    workers fairly between users. It runs inside the claiming transaction.
+
+    Args:
+        lease_owner: Unique identifier of the claiming consumer
+        lease_seconds: Lease duration in seconds
+        limit: Maximum number of items to claim, not counting coalesced ones
+        coalesce_window_seconds: How long after a claimed item a message may
+            have been queued and still be coalesced into it
+        coalesce_max_messages: Most messages in one coalesced item; 1 disables coalescing
+        select_heads: Optional chooser of the user head items to claim
+
+    Returns:
+        List[WorkItem]: The claimed items ordered by timestamp. Message and
+        profile fields are None when the referenced rows no longer exist.
+    """
+    async def _claim_and_hydrate(db: aiosqlite.Connection) -> list:
+        if select_heads:
+            heads = [head for head in select_heads(await _fetch_queue_heads(db), limit) if head.claimable]
+            claimed = await _claim_heads(db, heads[:limit], lease_owner, lease_seconds)
+        else:
+            claimed = await _claim_rows(db, lease_owner, lease_seconds, limit)
+        if not claimed:
+            return []
+
+        claimed_ids = [row[0] for row in claimed]
+        if coalesce_max_messages > 1 and coalesce_window_seconds > 0:
+            for head in claimed:
+                claimed_ids.extend(await _claim_followers(
+                    db, head, lease_owner, lease_seconds,
+                    int(coalesce_window_seconds * 1000), coalesce_max_messages
+                ))
+
+        placeholders = ", ".join("?" for _ in claimed_ids)
+        async with db.execute(f"""
+            SELECT
+                q.id, q.letta_user_id, q.message_id, q.attempts, q.timestamp,
+                m.role, m.message, m.platform_profile_id,
+                pp.platform, pp.platform_user_id, pp.username, pp.display_name,
+                lu.letta_block_id,
+                q.lease_owner, q.lease_expires_at, q.timestamp_ms
+            FROM queue q
+            LEFT JOIN messages m ON m.id = q.message_id
+            LEFT JOIN platform_profiles pp ON pp.id = m.platform_profile_id
+            LEFT JOIN letta_users lu ON lu.id = q.letta_user_id
+            WHERE q.id IN ({placeholders})
+            ORDER BY q.timestamp_ms ASC, q.id ASC
+        """, claimed_ids) as cursor:
+            return await cursor.fetchall()
+
+    claimed_at_ms = now_ms()
+    rows = await get_database().write(_claim_and_hydrate)
+    items = [
+        WorkItem(
+            id=row[0],
+            letta_user_id=row[1],
+            message_id=row[2],
+            attempts=row[3],
+            timestamp=row[4],
+            role=row[5],
+            message=row[6],
+            platform_profile_id=row[7],
+            platform=row[8],
+            platform_user_id=row[9],
+            username=row[10],
+            display_name=row[11],
+            letta_block_id=row[12],
+            lease_owner=row[13],
+            lease_expires_at=row[14],
+            timestamp_ms=row[15],
+            claimed_at_ms=claimed_at_ms
+        )
+        for row in rows
+    ]
+
+    # Only the oldest unfinished item of a user is claimed, so every other
+    # item of that user was coalesced into it
+    heads: Dict[int, WorkItem] = {}
+    for item in sorted(items, key=lambda item: item.id):
+        if item.letta_user_id in heads:
+            heads[item.letta_user_id].coalesced.append(item)
+        else:
+            heads[item.letta_user_id] = item
+    return [item for item in items if heads[item.letta_user_id] is item]
+
+async def renew_queue_leases(lease_owner: str, queue_ids: List[int], lease_seconds: float) -> int:
+    """Extend the leases a consumer holds on its in-flight items.
+
+    Args:
+        lease_owner: Identifier of the consumer holding the leases
+        queue_ids: IDs of the queue items to renew
+        lease_seconds: New lease duration in seconds from now
+
+    Returns:
+        int: Number of leases renewed
+    """
+    if not queue_ids:
+        return 0
+
+    expires_at = now_ms() + int(lease_seconds * 1000)
+    placeholders = ", ".join("?" for _ in queue_ids)
+
+    cursor = await get_database().execute(f"""
+        UPDATE queue
+        SET lease_expires_at = ?
+        WHERE lease_owner = ?
+        AND status = 'processing'
+        AND id IN ({placeholders})
+    """, (expires_at, lease_owner, *queue_ids))
+    return cursor.rowcount
 
 async def update_queue_status(queue_id: int, status: str, increment_attempt: bool = False) -> QueueItem:
-    """Update the status of a queue item."""
+    """Update the status of a queue item, releasing any lease held on it.
+
+    The time of the change is recorded in `timestamp`; `timestamp_ms` stays
+    the time the item was queued, which queue order, TTLs and archiving go by.
+    """
     now = datetime.utcnow().isoformat()
     
-    async with aiosqlite.connect(DB_PATH) as db:
-        if increment_attempt:
-            await db.execute("""
-                UPDATE queue 
-                SET status = ?, timestamp = ?, attempts = attempts + 1
-                WHERE id = ?
-            """, (status, now, queue_id))
-        else:
-            await db.execute("""
-                UPDATE queue 
-                SET status = ?, timestamp = ?
-                WHERE id = ?
-            """, (status, now, queue_id))
-        
-        await db.commit()
-        
-        async with db.execute("SELECT * FROM queue WHERE id = ?", (queue_id,)) as cursor:
+    attempts_sql = ", attempts = attempts + 1" if increment_attempt else ""
+    previous_status: Optional[str] = None
+    
+    async def _update(db: aiosqlite.Connection) -> Optional[tuple]:
+        nonlocal previous_status
+        async with db.execute("SELECT status FROM queue WHERE id = ?", (queue_id,)) as cursor:
+            previous = await cursor.fetchone()
+        previous_status = previous[0] if previous else None
+        async with db.execute(f"""
+            UPDATE queue 
+            SET status = ?, timestamp = ?{attempts_sql},
+                lease_owner = NULL, lease_expires_at = NULL
+            WHERE id = ?
+            RETURNING {QUEUE_ITEM_COLUMNS}
+        """, (status, now, queue_id)) as cursor:
+            return await cursor.fetchone()
+    
+    row = await get_database().write(_update)
+    if row:
+        # Only a move between unfinished and finished changes the depth
+        was_unfinished = previous_status in UNFINISHED_QUEUE_STATUSES
+        is_unfinished = status in UNFINISHED_QUEUE_STATUSES
+        if was_unfinished and not is_unfinished:
+            get_queue_depth().remove()
+        elif is_unfinished and not was_unfinished:
+            get_queue_depth().add()
+        return _queue_item_from_row(row)
+    raise ValueError(f"Queue item with ID {queue_id} not found")
+
+async def release_queue_item(queue_id: int, refund_attempt: bool = False) -> None:
+    """Put a claimed queue item back to 'pending' so it is processed again.
+
+    The item keeps its place in the queue. Use `refund_attempt` when the
+    item was never actually attempted (e.g. the endpoint was known to be
+    down), so the claim does not count against its retry budget.
+    """
+    attempts_sql = ", attempts = MAX(attempts - 1, 0)" if refund_attempt else ""
+    await get_database().execute(f"""
+        UPDATE queue
+        SET status = 'pending', lease_owner = NULL, lease_expires_at = NULL{attempts_sql}
+        WHERE id = ? AND status = 'processing'
+    """, (queue_id,))
+
+async def release_queue_leases(
+    lease_owner: str,
+    error: Optional[str] = None,
+    queue_ids: Optional[List[int]] = None
+) -> int:
+    """Put items a consumer still holds back to 'pending'.
+
+    Used when a consumer shuts down before its in-flight items finished.
+    The items keep their place in the queue and the interrupted attempt is
+    refunded, so another consumer picks them up right away. Only release
+    items that were never sent to the agent, or they may be answered twice.
+
+    Args:
+        lease_owner: Identifier of the consumer holding the leases
+        error: Why the items were released, recorded as their last error
+        queue_ids: IDs of the queue items to release (defaults to all of them)
+
+    Returns:
+        int: Number of items released
+    """
+    if queue_ids is not None and not queue_ids:
+        return 0
+
+    id_filter = ""
+    if queue_ids is not None:
+        id_filter = f"AND id IN ({', '.join('?' for _ in queue_ids)})"
+
+    cursor = await get_database().execute(f"""
+        UPDATE queue
+        SET status = 'pending', lease_owner = NULL, lease_expires_at = NULL,
+            attempts = MAX(attempts - 1, 0), last_error = IFNULL(?, last_error)
+        WHERE lease_owner = ? AND status = 'processing' {id_filter}
+    """, (error, lease_owner, *(queue_ids or [])))
+    return cursor.rowcount
+
+async def recover_orphaned_queue_items(is_orphaned: Callable[[str], bool]) -> int:
+    """Put items left in flight by consumers that are gone back to 'pending'.
+
+    An item is orphaned when its lease has expired, it has no lease, or
+    `is_orphaned` says its lease owner no longer exists. All of them are
+    released in a single transaction. The interrupted attempt still counts
+    against the item's retry budget, so an item that crashes its consumer
+    cannot do so forever.
+
+    Args:
+        is_orphaned: Tells whether a lease owner is known to be gone
+
+    Returns:
+        int: Number of items recovered
+    """
+    async def _recover(db: aiosqlite.Connection) -> int:
+        async with db.execute(
+            "SELECT DISTINCT lease_owner FROM queue WHERE status = 'processing' AND lease_owner IS NOT NULL"
+        ) as cursor:
+            owners = [row[0] for row in await cursor.fetchall()]
+        orphaned = [owner for owner in owners if is_orphaned(owner)]
+        placeholders = ", ".join("?" for _ in orphaned) or "NULL"
+
+        cursor = await db.execute(f"""
+            UPDATE queue
+            SET status = 'pending', lease_owner = NULL, lease_expires_at = NULL
+            WHERE status = 'processing'
+            AND (
+                lease_owner IS NULL
+                OR IFNULL(lease_expires_at, 0) < ?
+                OR lease_owner IN ({placeholders})
+            )
+        """, (now_ms(), *orphaned))
+        return cursor.rowcount
+
+    recovered = await get_database().write(_recover)
+    if recovered:
+        get_queue_notifier().notify()
+    return recovered
+
+async def schedule_queue_retry(queue_id: int, delay_seconds: float, error: Optional[str] = None) -> None:
+    """Put a claimed queue item back to 'pending' to be retried after a delay.
+
+    The item keeps its place in the queue and its attempt count; it is not
+    claimed again until the delay has passed.
+
+    Args:
+        queue_id: ID of the queue item
+        delay_seconds: Seconds until the item may be claimed again
+        error: Description of the error the attempt failed with
+    """
+    await get_database().execute("""
+        UPDATE queue
+        SET status = 'pending', lease_owner = NULL, lease_expires_at = NULL,
+            next_attempt_at = ?, last_error = ?
+        WHERE id = ? AND status = 'processing'
+    """, (now_ms() + int(delay_seconds * 1000), error, queue_id))
+
+async def dead_letter_queue_item(queue_id: int, error_class: str, error: Optional[str] = None) -> Optional[DeadLetter]:
+    """Move a queue item to the dead letter table.
+
+    The item leaves the queue, so the user's later messages are no longer
+    held back by it. Its message is kept and can be queued again with
+    `replay_dead_letters`.
+
+    Args:
+        queue_id: ID of the queue item
+        error_class: Class of the error that ended the item's attempts
+        error: Description of that error
+
+    Returns:
+        Optional[DeadLetter]: The dead letter, or None if the item does not exist
+    """
+    async def _move(db: aiosqlite.Connection) -> Tuple[Optional[tuple], bool]:
+        async with db.execute(f"""
+            INSERT INTO dead_letters (
+                queue_id, letta_user_id, message_id, attempts,
+                error_class, last_error, queued_at_ms, failed_at_ms
+            )
+            SELECT id, letta_user_id, message_id, attempts, ?, ?, timestamp_ms, ?
+            FROM queue WHERE id = ?
+            RETURNING {DEAD_LETTER_COLUMNS}
+        """, (error_class, error, now_ms(), queue_id)) as cursor:
             row = await cursor.fetchone()
-            if row:
-                return QueueItem(
-                    id=row[0],
-                    letta_user_id=row[1],
-                    message_id=row[2],
-                    status=row[3],
-                    attempts=row[4],
-                    timestamp=row[5]
-                )
-            raise ValueError(f"Queue item with ID {queue_id} not found")
-
-async def get_all_queue_items() -> List[Dict[str, Any]]:
-    """Get all queue items with their details."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("""
-            SELECT 
-                q.id, q.letta_user_id, q.message_id, q.status,
-                q.timestamp, q.attempts,
-                pp.username, pp.display_name,
-                m.message, m.agent_response
-            FROM queue q
-            LEFT JOIN platform_profiles pp ON q.letta_user_id = pp.letta_user_id
-            LEFT JOIN messages m ON q.message_id = m.id
-            WHERE q.status IN ('pending', 'processing', 'failed')
-            ORDER BY q.timestamp DESC
-        """) as cursor:
-            rows = await cursor.fetchall()
-            return [
-                {
-                    "id": row[0],
-                    "letta_user_id": row[1],
-                    "message_id": row[2],
-                    "status": row[3],
-                    "timestamp": row[4],
-                    "attempts": row[5],
-                    "username": row[6],
-                    "display_name": row[7],
-                    "message": row[8],
-                    "agent_response": row[9]
-                }
-                for row in rows
-            ]
+        if not row:
+            return None, False
+        async with db.execute("DELETE FROM queue WHERE id = ? RETURNING status", (queue_id,)) as cursor:
+            (status,) = await cursor.fetchone()
+        return row, status in UNFINISHED_QUEUE_STATUSES
+
+    row, was_unfinished = await get_database().write(_move)
+    if not row:
+        return None
+    if was_unfinished:
+        get_queue_depth().remove()
+    return _dead_letter_from_row(row)
+
+async def get_dead_letters(error_class: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Get dead letters with their message and user details, newest first.
+
+    Args:
+        error_class: Only return dead letters of this error class
+        limit: Maximum number of dead letters to return
+    """
+    conditions, params = "", []
+    if error_class:
+        conditions = "WHERE d.error_class = ?"
+        params.append(error_class)
+    limit_sql = ""
+    if limit:
+        limit_sql = "LIMIT ?"
+        params.append(limit)
+
+    rows = await get_database().fetchall(f"""
+        SELECT
+            d.id, d.queue_id, d.letta_user_id, d.message_id, d.attempts,
+            d.error_class, d.last_error, d.queued_at_ms, d.failed_at_ms,
+            pp.username, pp.display_name, m.message
+        FROM dead_letters d
+        LEFT JOIN messages m ON m.id = d.message_id
+        LEFT JOIN platform_profiles pp ON pp.id = m.platform_profile_id
+        {conditions}
+        ORDER BY d.failed_at_ms DESC, d.id DESC
+        {limit_sql}
+    """, params)
+    return [
+        {
+            "id": row[0],
+            "queue_id": row[1],
+            "letta_user_id": row[2],
+            "message_id": row[3],
+            "attempts": row[4],
+            "error_class": row[5],
+            "last_error": row[6],
+            "queued_at_ms": row[7],
+            "failed_at_ms": row[8],
+            "username": row[9],
+            "display_name": row[10],
+            "message": row[11]
+        }
+        for row in rows
+    ]
+
+async def replay_dead_letters(dead_letter_ids: Optional[List[int]] = None, error_class: Optional[str] = None) -> int:
+    """Queue dead-lettered messages again and remove their dead letters.
+
+    Replayed messages start over with no attempts and are queued behind
+    the user's current messages.
+
+    Args:
+        dead_letter_ids: Dead letters to replay; all of them if not given
+        error_class: Only replay dead letters of this error class
+
+    Returns:
+        int: Number of messages queued again
+    """
+    conditions, params = ["1 = 1"], []
+    if dead_letter_ids is not None:
+        if not dead_letter_ids:
+            return 0
+        conditions.append(f"id IN ({', '.join('?' for _ in dead_letter_ids)})")
+        params.extend(dead_letter_ids)
+    if error_class:
+        conditions.append("error_class = ?")
+        params.append(error_class)
+    where = " AND ".join(conditions)
+
+    async def _replay(db: aiosqlite.Connection) -> int:
+        now = datetime.utcnow().isoformat()
+        # Replay in the order the messages were originally queued
+        cursor = await db.execute(f"""
+            INSERT INTO queue (letta_user_id, message_id, status, timestamp, timestamp_ms, attempts)
+            SELECT letta_user_id, message_id, 'pending', ?, ?, 0
+            FROM dead_letters WHERE {where}
+            ORDER BY queued_at_ms ASC, id ASC
+        """, (now, now_ms(), *params))
+        replayed = cursor.rowcount
+        await db.execute(f"DELETE FROM dead_letters WHERE {where}", params)
+        return replayed
+
+    replayed = await get_database().write(_replay)
+    if replayed:
+        get_queue_depth().add(replayed)
+        get_queue_notifier().notify()
+    return replayed
+
+async def expire_queue_items(ttl_seconds: float, platform_ttl_seconds: Optional[Dict[str, float]] = None) -> int:
+    """Mark pending items that have waited longer than their TTL as 'expired'.
+
+    Expires every stale item in one statement, so a backlog left by an
+    outage is cleared at once instead of being sent to the agent.
+
+    Args:
+        ttl_seconds: Time to live of pending items, 0 for no limit
+        platform_ttl_seconds: Time to live per platform, overriding
+            `ttl_seconds`; 0 for no limit on that platform
+
+    Returns:
+        int: Number of items expired
+    """
+    ttls = {platform: float(seconds) for platform, seconds in (platform_ttl_seconds or {}).items()}
+    limited = [seconds for seconds in [ttl_seconds, *ttls.values()] if seconds > 0]
+    if not limited:
+        return 0
+
+    now = now_ms()
+    # Nothing younger than the shortest TTL can expire; lets the status index narrow the scan
+    params: list = [now - int(min(limited) * 1000)]
+    ttl_sql = "?"
+    if ttls:
+        cases = " ".join("WHEN ? THEN ?" for _ in ttls)
+        ttl_sql = f"""CASE (
+            SELECT pp.platform FROM messages m
+            JOIN platform_profiles pp ON pp.id = m.platform_profile_id
+            WHERE m.id = queue.message_id
+        ) {cases} ELSE ? END"""
+        for platform, seconds in ttls.items():
+            params.extend([platform, int(seconds * 1000) or None])
+    params.extend([int(ttl_seconds * 1000) or None, now])
+
+    # A TTL of NULL (no limit) makes the comparison NULL, which never matches
+    cursor = await get_database().execute(f"""
+        UPDATE queue
+        SET status = 'expired', lease_owner = NULL, lease_expires_at = NULL
+        WHERE status = 'pending'
+        AND timestamp_ms < ?
+        AND timestamp_ms + ({ttl_sql}) < ?
+    """, params)
+    get_queue_depth().remove(cursor.rowcount)
+    return cursor.rowcount
+
+async def archive_queue_items(retention_seconds: float, batch_size: int = 500) -> int:
+    """Move one batch of finished queue items to the archive table.
+
+    Items that reached a final status and were queued more than
+    `retention_seconds` ago leave the queue, keeping it small however long
+    the service runs. Each batch is a short transaction of its own, so
+    callers archive a large backlog batch by batch without holding up
+    other writes.
+
+    Args:
+        retention_seconds: How long finished items stay in the queue
+        batch_size: Most items moved in this batch
+
+    Returns:
+        int: Number of items archived; less than `batch_size` once the
+            backlog is cleared
+    """
+    cutoff = now_ms() - int(retention_seconds * 1000)
+    statuses = ", ".join(f"'{status}'" for status in FINISHED_QUEUE_STATUSES)
+
+    async def _archive(db: aiosqlite.Connection) -> int:
+        async with db.execute(f"""
+            SELECT id FROM queue
+            WHERE status IN ({statuses}) AND timestamp_ms < ?
+            LIMIT ?
+        """, (cutoff, batch_size)) as cursor:
+            queue_ids = [row[0] for row in await cursor.fetchall()]
+        if not queue_ids:
+            return 0
+
+        placeholders = ", ".join("?" for _ in queue_ids)
+        await db.execute(f"""
+            INSERT OR REPLACE INTO queue_archive (
+                id, letta_user_id, message_id, status, attempts,
+                timestamp, timestamp_ms, last_error, archived_at_ms
+            )
+            SELECT id, letta_user_id, message_id, status, attempts,
+                timestamp, timestamp_ms, last_error, ?
+            FROM queue WHERE id IN ({placeholders})
+        """, (now_ms(), *queue_ids))
+        await db.execute(f"DELETE FROM queue WHERE id IN ({placeholders})", queue_ids)
+        return len(queue_ids)
+
+    return await get_database().write(_archive)
+
+async def get_all_queue_items(include_archived: bool = False, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Get all queue items with their details, newest first.
+
+    Without `include_archived` only unfinished and failed items are listed.
+    With it the whole history is: every item still in the queue, whatever
+    its status, and the finished items moved to the archive.
+
+    Args:
+        include_archived: List every status, including archived items
+        limit: Maximum number of items to return
+
+    Returns:
+        List[Dict[str, Any]]: Queue items; archived ones have `archived` set
+    """
+    if include_archived:
+        live_where_sql = ""
+        archived_sql = """
+            UNION ALL
+            SELECT id, letta_user_id, message_id, status, timestamp, attempts, timestamp_ms, 1
+            FROM queue_archive
+        """
+    else:
+        live_where_sql = "WHERE status IN ('pending', 'processing', 'failed')"
+        archived_sql = ""
+    limit_sql = "LIMIT ?" if limit is not None else ""
+    params = (limit,) if limit is not None else ()
+
+    rows = await get_database().fetchall(f"""
+        SELECT 
+            q.id, q.letta_user_id, q.message_id, q.status,
+            q.timestamp, q.attempts,
+            pp.username, pp.display_name,
+            m.message, m.agent_response, q.archived
+        FROM (
+            SELECT id, letta_user_id, message_id, status, timestamp, attempts, timestamp_ms, 0 AS archived
+            FROM queue
+            {live_where_sql}
+            {archived_sql}
+        ) q
+        LEFT JOIN platform_profiles pp ON q.letta_user_id = pp.letta_user_id
+        LEFT JOIN messages m ON q.message_id = m.id
+        ORDER BY q.timestamp_ms DESC, q.id DESC
+        {limit_sql}
+    """, params)
+    return [
+        {
+            "id": row[0],
+            "letta_user_id": row[1],
+            "message_id": row[2],
+            "status": row[3],
+            "timestamp": row[4],
+            "attempts": row[5],
+            "username": row[6],
+            "display_name": row[7],
+            "message": row[8],
+            "agent_response": row[9],
+            "archived": bool(row[10])
+        }
+        for row in rows
+    ]
 
 async def flush_all_queue_items(current_mode: str) -> bool:
     """Flush all queue items for the current mode."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        try:
-            await db.execute("""
-                UPDATE queue 
-                SET status = 'flushed' 
-                WHERE status = 'pending'
-            """)
-            await db.commit()
-            return True
-        except Exception as e:
-            logger.error(f"Error flushing queue items: {str(e)}")
-            return False 
+    try:
+        cursor = await get_database().execute("""
+            UPDATE queue 
+            SET status = 'flushed' 
+            WHERE status = 'pending'
+        """)
+        get_queue_depth().remove(cursor.rowcount)
+        return True
+    except Exception as e:
+        logger.error(f"Error flushing queue items: {str(e)}")
+        return False
 
 async def delete_queue_item(queue_id: int) -> bool:
     """Delete a specific queue item."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        try:
-            await db.execute("DELETE FROM queue WHERE id = ?", (queue_id,))
-            await db.commit()
-            return True
-        except Exception as e:
-            logger.error(f"Error deleting queue item {queue_id}: {str(e)}")
-            return False 
\ No newline at end of file
+    async def _delete(db: aiosqlite.Connection) -> Optional[str]:
+        async with db.execute("DELETE FROM queue WHERE id = ? RETURNING status", (queue_id,)) as cursor:
+            row = await cursor.fetchone()
+        return row[0] if row else None
+
+    try:
+        status = await get_database().write(_delete)
+        if status in UNFINISHED_QUEUE_STATUSES:
+            get_queue_depth().remove()
+        return True
+    except Exception as e:
+        logger.error(f"Error deleting queue item {queue_id}: {str(e)}")
+        return False 
\ No newline at end of file
@@ -1,96 +1,143 @@
 """User-related database operations (get_or_create_user, platform lookup, etc)."""
-import os
+import dataclasses
 import json
 import logging
 import uuid
 from datetime import datetime
-from typing import Optional, List, Tuple, Dict, Any
+from typing import Optional, List, Tuple, Dict, Any, Set
 import aiosqlite
 from runtime.core.letta_client import get_letta_client
+from ..activity import get_activity_tracker
+from ..connection import get_database
 from ..models import LettaUser, PlatformProfile
+from ..profile_cache import get_profile_cache
 from sqlalchemy.orm import Session
 from database.session import get_session
 
-# Database file path
-DB_PATH = os.path.join(os.path.dirname(__file__), "..", "..", "sanctum.db")
-
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Columns of letta_users in LettaUser field order
+LETTA_USER_COLUMNS = """
+    id, created_at, last_active, letta_identity_id, letta_block_id,
+    agent_preferences, custom_instructions, is_active
+"""
+
+def _letta_user_from_row(row: tuple) -> LettaUser:
+    """Build a LettaUser from a row selected with LETTA_USER_COLUMNS."""
+    return LettaUser(
+        id=row[0],
+        created_at=row[1],
+        last_active=row[2],
+        letta_identity_id=row[3],
+        letta_block_id=row[4],
+        agent_preferences=row[5],
+        custom_instructions=row[6],
+        is_active=bool(row[7])
+    )
+
+def build_identity_name(username: Optional[str], display_name: Optional[str], platform_user_id: Optional[str]) -> str:
+    """Name shown for a user's Letta identity and core block."""
+    return display_name or username or f"Unknown User {platform_user_id}"
+
+def build_core_block_value(
+    username: Optional[str],
+    display_name: Optional[str],
+    platform_user_id: Optional[str],
+    created_at: str
+) -> str:
+    """Build the standardized value of a user's core block."""
+    # Parse name components
+    name_parts = (display_name or username or "Unknown User").split()
+    first_name = name_parts[0]
+    last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else None
+    
+    block_content = []
+    if first_name and last_name:
+        block_content.append(f"About Me ({first_name}, {last_name})")
+    elif first_name:
+        block_content.append(f"About Me ({first_name})")
+    else:
+        block_content.append(f"About Me ({username or 'Unknown User'})")
+    
+    if platform_user_id:
+        block_content.append(f"This user's Telegram ID is: {platform_user_id}")
+    if username:
+        block_content.append(f"This user's Telegram Username is: {username}")
+    
+    return json.dumps({
+        "type": "human_core",
+        "data": {
+            "name": build_identity_name(username, display_name, platform_user_id),
+            "created_at": created_at,
+            "content": "\n".join(block_content)
+        }
+    })
+
+async def create_letta_resources(
+    username: Optional[str],
+    display_name: Optional[str],
+    platform_user_id: Optional[str]
+) -> Tuple[str, str]:
+    """Create a Letta identity and core block for a user.
+    
+    Returns:
+        Tuple[str, str]: The identity ID and block ID
+    """
+    client = get_letta_client()
+    now = datetime.utcnow().isoformat()
+    
+    # 1. Create Letta identity
+    unique_id = str(uuid.uuid4())[:8]
+    identity = await client.create_identity(
+        identifier_key=f"broca_user_{unique_id}",
+        name=build_identity_name(username, display_name, platform_user_id),
+        identity_type="user"
+    )
+    
+    # 2. Create core block with standardized format
+    block = await client.create_block(
+        label="human",  # Always use "human" as the label
+        value=build_core_block_value(username, display_name, platform_user_id, now)
+    )
+    return identity.id, block.id
+
 async def get_or_create_letta_user(username: str = None, display_name: str = None, platform_user_id: str = None) -> LettaUser:
-    """Create a new Letta user with default settings and associated Letta identity."""
+    """Create a new Letta user with default settings and associated Letta identity.
+    
+    The Letta identity and core block are created inline. Inbound message
+    handling uses get_or_create_platform_profile instead, which leaves them
+    to the background provisioner.
+    """
     now = datetime.utcnow().isoformat()
     
     try:
-        # Get the singleton Letta client
-        client = get_letta_client()
-        
-        # Parse name components
-        name_parts = (display_name or username or "Unknown User").split()
-        first_name = name_parts[0]
-        last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else None
-            
-        # 1. Create Letta identity
-        unique_id = str(uuid.uuid4())[:8]
-        identity_data = {
-            "identifier_key": f"broca_user_{unique_id}",
-            "name": display_name or username or f"Unknown User {platform_user_id}",
-            "identity_type": "user"
-        }
-        identity = client.identities.create(**identity_data)
-        
-        # 2. Create core block with standardized format
-        block_content = []
-        if first_name and last_name:
-            block_content.append(f"About Me ({first_name}, {last_name})")
-        elif first_name:
-            block_content.append(f"About Me ({first_name})")
-        else:
-            block_content.append(f"About Me ({username or 'Unknown User'})")
-            
-        block_content.append(f"This user's Telegram ID is: {platform_user_id}")
-        if username:
-            block_content.append(f"This user's Telegram Username is: {username}")
-        
-        block_data = {
-            "label": "human",  # Always use "human" as the label
-            "value": json.dumps({
-                "type": "human_core",
-                "data": {
-                    "name": display_name or username or f"Unknown User {platform_user_id}",
-                    "created_at": now,
-                    "content": "\n".join(block_content)
-                }
-            })
-        }
-        block = client.blocks.create(**block_data)
+        identity_id, block_id = await create_letta_resources(username, display_name, platform_user_id)
         
         # 3. Create user record with Letta identity ID and block ID
-        async with aiosqlite.connect(DB_PATH) as db:
-            cursor = await db.execute("""
-                INSERT INTO letta_users (
-                    created_at,
-                    last_active,
-                    letta_identity_id,
-                    letta_block_id,
-                    agent_preferences,
-                    custom_instructions,
-                    is_active
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            """, (now, now, identity.id, block.id, None, None, True))
-            await db.commit()
-            
-            user_id = cursor.lastrowid
-            return LettaUser(
-                id=user_id,
-                created_at=now,
-                last_active=now,
-                letta_identity_id=identity.id,
-                letta_block_id=block.id,
-                agent_preferences=None,
-                custom_instructions=None,
-                is_active=True
-            )
+        cursor = await get_database().execute("""
+            INSERT INTO letta_users (
+                created_at,
+                last_active,
+                letta_identity_id,
+                letta_block_id,
+                agent_preferences,
+                custom_instructions,
+                is_active
+            ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (now, now, identity_id, block_id, None, None, True))
+        
+        user_id = cursor.lastrowid
+        return LettaUser(
+            id=user_id,
+            created_at=now,
+            last_active=now,
+            letta_identity_id=identity_id,
+            letta_block_id=block_id,
+            agent_preferences=None,
+            custom_instructions=None,
+            is_active=True
+        )
             
     except Exception as e:
         logger.error(f"Error creating Letta user and identity: {str(e)}")
@@ -103,63 +150,47 @@ async def get_or_create_platform_profile(
     display_name: str,
     metadata: Optional[Dict[str, Any]] = None
 ) -> Tuple[PlatformProfile, LettaUser]:
-    """Get or create a platform profile and its associated Letta user."""
+    """Get or create a platform profile and its associated Letta user.
+    
+    New users are created locally, without their Letta identity and core
+    block, and handed to the background provisioner, so no remote calls are
+    made while handling an inbound message. The lookup and the inserts run in
+    one write transaction, so concurrent first messages from a new user
+    create a single user.
+    
+    Returning senders are served from the profile cache. The profile is only
+    written when its username, display name or metadata changed; last_active
+    is always left to the activity tracker, for new users too.
+    """
     now = datetime.utcnow().isoformat()
     metadata_json = json.dumps(metadata) if metadata else None
+    cache = get_profile_cache()
+    created = False
     
-    async with aiosqlite.connect(DB_PATH) as db:
-        # Check if profile exists
-        async with db.execute(
-            "SELECT * FROM platform_profiles WHERE platform = ? AND platform_user_id = ?",
-            (platform, platform_user_id)
-        ) as cursor:
+    async def _get_or_create(db: aiosqlite.Connection) -> Tuple[PlatformProfile, LettaUser]:
+        nonlocal created
+        async with db.execute("""
+            SELECT id, letta_user_id, created_at
+            FROM platform_profiles
+            WHERE platform = ? AND platform_user_id = ?
+        """, (platform, platform_user_id)) as cursor:
             profile_row = await cursor.fetchone()
-            
-            if profile_row:
-                # Update existing profile
-                await db.execute("""
-                    UPDATE platform_profiles 
-                    SET username = ?, display_name = ?, metadata = ?, last_active = ?
-                    WHERE id = ?
-                """, (username, display_name, metadata_json, now, profile_row[0]))
-                await db.commit()
-                
-                # Get associated Letta user
-                async with db.execute(
-                    "SELECT * FROM letta_users WHERE id = ?",
-                    (profile_row[1],)  # letta_user_id
-                ) as user_cursor:
-                    user_row = await user_cursor.fetchone()
-                    letta_user = LettaUser(
-                        id=user_row[0],
-                        created_at=user_row[1],
-                        last_active=user_row[2],
-                        letta_identity_id=user_row[3],
-                        agent_preferences=user_row[4],
-                        custom_instructions=user_row[5],
-                        is_active=bool(user_row[6])
-                    )
-                
-                profile = PlatformProfile(
-                    id=profile_row[0],
-                    letta_user_id=profile_row[1],
-                    platform=profile_row[2],
-                    platform_user_id=profile_row[3],
-                    username=username,
-                    display_name=display_name,
-                    metadata=metadata_json,
-                    created_at=profile_row[7],
-                    last_active=now
-                )
-                
-                return profile, letta_user
-            
-            # Create new Letta user and profile
-            letta_user = await get_or_create_letta_user(
-                username=username,
-                display_name=display_name,
-                platform_user_id=platform_user_id
-            )
+        
+        if profile_row:
+            # Update existing profile
+            profile_id, letta_user_id, created_at = profile_row
+            await db.execute("""
+                UPDATE platform_profiles 
+                SET username = ?, display_name = ?, metadata = ?
+                WHERE id = ?
+            """, (username, display_name, metadata_json, profile_id))
+        else:
+            # Create the Letta user locally; its Letta resources come later
+            cursor = await db.execute("""
+                INSERT INTO letta_users (created_at, is_active)
+                VALUES (?, ?)
+            """, (now, True))
+            letta_user_id = cursor.lastrowid
             
             cursor = await db.execute("""
                 INSERT INTO platform_profiles (
@@ -169,34 +200,63 @@ async def get_or_create_platform_profile(
                     username,
                     display_name,
                     metadata,
-                    created_at,
-                    last_active
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                letta_user.id,
-                platform,
-                platform_user_id,
-                username,
-                display_name,
-                metadata_json,
-                now,
-                now
-            ))
-            await db.commit()
-            
-            profile = PlatformProfile(
-                id=cursor.lastrowid,
-                letta_user_id=letta_user.id,
-                platform=platform,
-                platform_user_id=platform_user_id,
-                username=username,
-                display_name=display_name,
-                metadata=metadata_json,
-                created_at=now,
-                last_active=now
-            )
-            
-            return profile, letta_user
+                    created_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (letta_user_id, platform, platform_user_id, username, display_name, metadata_json, now))
+            profile_id = cursor.lastrowid
+            created_at = now
+            created = True
+        
+        # Get associated Letta user
+        async with db.execute(
+            f"SELECT {LETTA_USER_COLUMNS} FROM letta_users WHERE id = ?",
+            (letta_user_id,)
+        ) as cursor:
+            letta_user = _letta_user_from_row(await cursor.fetchone())
+        if created:
+            letta_user = dataclasses.replace(letta_user, last_active=now)
+        
+        profile = PlatformProfile(
+            id=profile_id,
+            letta_user_id=letta_user_id,
+            platform=platform,
+            platform_user_id=platform_user_id,
+            username=username,
+            display_name=display_name,
+            metadata=metadata_json,
+            created_at=created_at,
+            last_active=now
+        )
+        return profile, letta_user
+    
+    cached = cache.get(platform, platform_user_id)
+    if cached:
+        profile, letta_user = cached
+        if (profile.username, profile.display_name, profile.metadata) != (username, display_name, metadata_json):
+            await get_database().execute("""
+                UPDATE platform_profiles
+                SET username = ?, display_name = ?, metadata = ?
+                WHERE id = ?
+            """, (username, display_name, metadata_json, profile.id))
+        profile = dataclasses.replace(
+            profile, username=username, display_name=display_name, metadata=metadata_json, last_active=now
+        )
+        cache.put(profile, letta_user, loaded=False)
+        get_activity_tracker().touch_profile(profile.id, now)
+    else:
+        profile, letta_user = await get_database().write(_get_or_create)
+        cache.put(profile, letta_user)
+        tracker = get_activity_tracker()
+        tracker.touch_profile(profile.id, now)
+        if created:
+            tracker.touch_letta_user(letta_user.id, now)
+    
+    if not letta_user.letta_block_id:
+        # Imported here: the provisioner itself uses this module
+        from runtime.core.provisioner import get_provisioner
+        get_provisioner().request(letta_user.id, username, display_name, platform_user_id)
+    
+    return profile, letta_user
 
 async def update_letta_user(
     user_id: int,
@@ -206,6 +266,9 @@ async def update_letta_user(
     """
     Update a Letta user's preferences and settings in the database.
 
+    The user's last_active is recorded by the activity tracker rather than
+    written with the update.
+
     Args:
         user_id: The ID of the user to update.
         agent_preferences: Optional dictionary of agent preferences to store as JSON.
@@ -226,49 +289,48 @@ async def update_letta_user(
         updates.append("custom_instructions = ?")
         values.append(custom_instructions)
     
-    updates.append("last_active = ?")
-    values.append(now)
+    values.append(user_id)
     
-    if not updates:
-        raise ValueError("No updates specified")
-    
-    async with aiosqlite.connect(DB_PATH) as db:
+    if updates:
         query = f"""
             UPDATE letta_users 
             SET {', '.join(updates)}
             WHERE id = ?
-            RETURNING *
+            RETURNING {LETTA_USER_COLUMNS}
         """
-        values.append(user_id)
         
-        async with db.execute(query, values) as cursor:
-            row = await cursor.fetchone()
-            if not row:
-                raise ValueError(f"User with ID {user_id} not found")
-            
-            await db.commit()
-            return LettaUser(
-                id=row[0],
-                created_at=row[1],
-                last_active=row[2],
-                letta_identity_id=row[3],
-                agent_preferences=row[4],
-                custom_instructions=row[5],
-                is_active=bool(row[6])
-            )
+        async def _update(db: aiosqlite.Connection) -> Optional[tuple]:
+            async with db.execute(query, values) as cursor:
+                return await cursor.fetchone()
+        
+        row = await get_database().write(_update)
+    else:
+        # Nothing to write but the activity
+        row = await get_database().fetchone(f"SELECT {LETTA_USER_COLUMNS} FROM letta_users WHERE id = ?", values)
+    if not row:
+        raise ValueError(f"User with ID {user_id} not found")
+    
+    get_activity_tracker().touch_letta_user(user_id, now)
+    
+    letta_user = dataclasses.replace(_letta_user_from_row(row), last_active=now)
+    get_profile_cache().update_letta_user(
+        user_id,
+        last_active=letta_user.last_active,
+        agent_preferences=letta_user.agent_preferences,
+        custom_instructions=letta_user.custom_instructions
+    )
+    return letta_user
 
 async def get_user_details(letta_user_id: int) -> Optional[Tuple[str, str]]:
     """Get user details for a Letta user."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("""
-            SELECT display_name, username 
-            FROM platform_profiles 
-            WHERE letta_user_id = ?
-        """, (letta_user_id,)) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                return row[0], row[1]
-            return None
+    row = await get_database().fetchone("""
+        SELECT display_name, username 
+        FROM platform_profiles 
+        WHERE letta_user_id = ?
+    """, (letta_user_id,))
+    if row:
+        return row[0], row[1]
+    return None
 
 async def get_all_users() -> List[Dict[str, Any]]:
     """
@@ -277,95 +339,164 @@ async def get_all_users() -> List[Dict[str, Any]]:
     Returns:
         List[Dict[str, Any]]: List of user records with associated profile data.
     """
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("""
-            SELECT 
-                lu.id, lu.created_at, lu.last_active, lu.letta_identity_id,
-                lu.agent_preferences, lu.custom_instructions,
-                lu.is_active,
-                pp.username, pp.display_name, pp.platform
-            FROM letta_users lu
-            LEFT JOIN platform_profiles pp ON lu.id = pp.letta_user_id
-        """) as cursor:
-            rows = await cursor.fetchall()
-            return [
-                {
-                    "id": row[0],
-                    "created_at": row[1],
-                    "last_active": row[2],
-                    "letta_identity_id": row[3],
-                    "agent_preferences": json.loads(row[4]) if row[4] else None,
-                    "custom_instructions": row[5],
-                    "is_active": bool(row[6]),
-                    "username": row[7],
-                    "display_name": row[8],
-                    "platform": row[9]
-                }
-                for row in rows
-            ]
+    rows = await get_database().fetchall("""
+        SELECT 
+            lu.id, lu.created_at, lu.last_active, lu.letta_identity_id,
+            lu.agent_preferences, lu.custom_instructions,
+            lu.is_active,
+            pp.username, pp.display_name, pp.platform
+        FROM letta_users lu
+        LEFT JOIN platform_profiles pp ON lu.id = pp.letta_user_id
+    """)
+    return [
+        {
+            "id": row[0],
+            "created_at": row[1],
+            "last_active": row[2],
+            "letta_identity_id": row[3],
+            "agent_preferences": json.loads(row[4]) if row[4] else None,
+            "custom_instructions": row[5],
+            "is_active": bool(row[6]),
+            "username": row[7],
+            "display_name": row[8],
+            "platform": row[9]
+        }
+        for row in rows
+    ]
 
 async def get_platform_profile_id(letta_user_id: int) -> Optional[Tuple[int, str]]:
     """Get platform profile ID and platform user ID for a Letta user."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("""
-            SELECT id, platform_user_id 
-            FROM platform_profiles 
-            WHERE letta_user_id = ?
-        """, (letta_user_id,)) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                return row[0], row[1]
-            return None
+    row = await get_database().fetchone("""
+        SELECT id, platform_user_id 
+        FROM platform_profiles 
+        WHERE letta_user_id = ?
+    """, (letta_user_id,))
+    if row:
+        return row[0], row[1]
+    return None
 
 async def get_platform_profile(profile_id: int) -> Optional[PlatformProfile]:
     """Get platform profile by ID."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        async with db.execute("""
-            SELECT id, letta_user_id, platform, platform_user_id, username, 
-                   display_name, metadata, created_at, last_active
-            FROM platform_profiles 
-            WHERE id = ?
-        """, (profile_id,)) as cursor:
-            row = await cursor.fetchone()
-            if row:
-                return PlatformProfile(
-                    id=row[0],
-                    letta_user_id=row[1],
-                    platform=row[2],
-                    platform_user_id=row[3],
-                    username=row[4],
-                    display_name=row[5],
-                    metadata=row[6],
-                    created_at=row[7],
-                    last_active=row[8]
-                )
-            return None
+    row = await get_database().fetchone("""
+        SELECT id, letta_user_id, platform, platform_user_id, username, 
+               display_name, metadata, created_at, last_active
+        FROM platform_profiles 
+        WHERE id = ?
+    """, (profile_id,))
+    if row:
+        return PlatformProfile(
+            id=row[0],
+            letta_user_id=row[1],
+            platform=row[2],
+            platform_user_id=row[3],
+            username=row[4],
+            display_name=row[5],
+            metadata=row[6],
+            created_at=row[7],
+            last_active=row[8]
+        )
+    return None
 
 async def get_letta_user_block_id(letta_user_id: int) -> Optional[str]:
     """Get the Letta block ID for a user."""
-    async with aiosqlite.connect(DB_PATH) as db:
+    row = await get_database().fetchone("""
+        SELECT letta_block_id 
+        FROM letta_users 
+        WHERE id = ?
+    """, (letta_user_id,))
+    if row:
+        return row[0]
+    return None
+
+async def get_user_block_ids(block_ids: List[str]) -> Set[str]:
+    """Get which of the given Letta block IDs are users' core blocks."""
+    if not block_ids:
+        return set()
+    placeholders = ", ".join("?" for _ in block_ids)
+    rows = await get_database().fetchall(f"""
+        SELECT letta_block_id 
+        FROM letta_users 
+        WHERE letta_block_id IN ({placeholders})
+    """, list(block_ids))
+    return {row[0] for row in rows}
+
+async def get_unprovisioned_users() -> List[Tuple[int, Optional[str], Optional[str], Optional[str]]]:
+    """Get users that have no Letta core block yet.
+    
+    Returns:
+        List of (letta_user_id, username, display_name, platform_user_id) tuples
+    """
+    rows = await get_database().fetchall("""
+        SELECT lu.id, pp.username, pp.display_name, pp.platform_user_id
+        FROM letta_users lu
+        LEFT JOIN platform_profiles pp ON pp.letta_user_id = lu.id
+        WHERE lu.letta_block_id IS NULL
+        GROUP BY lu.id
+        ORDER BY lu.id
+    """)
+    return [(row[0], row[1], row[2], row[3]) for row in rows]
+
+async def set_letta_resources(letta_user_id: int, identity_id: str, block_id: str) -> bool:
+    """Record a user's Letta identity and core block.
+    
+    Only succeeds for a user that has no core block yet, so when two
+    processes provision the same user the first one wins.
+    
+    Returns:
+        bool: True if the resources were recorded
+    """
+    cursor = await get_database().execute("""
+        UPDATE letta_users
+        SET letta_identity_id = ?, letta_block_id = ?
+        WHERE id = ? AND letta_block_id IS NULL
+    """, (identity_id, block_id, letta_user_id))
+    if cursor.rowcount > 0:
+        get_profile_cache().update_letta_user(
+            letta_user_id, letta_identity_id=identity_id, letta_block_id=block_id
+        )
+        return True
+    return False
+
+async def add_spare_letta_resources(identity_id: str, block_id: str) -> None:
+    """Put an unassigned Letta identity and core block in the spare pool."""
+    await get_database().execute("""
+        INSERT INTO letta_spares (letta_identity_id, letta_block_id, created_at)
+        VALUES (?, ?, ?)
+    """, (identity_id, block_id, datetime.utcnow().isoformat()))
+
+async def take_spare_letta_resources() -> Optional[Tuple[str, str]]:
+    """Remove the oldest spare identity and core block from the pool.
+    
+    Returns:
+        Optional[Tuple[str, str]]: The identity ID and block ID, or None if the pool is empty
+    """
+    async def _take(db: aiosqlite.Connection) -> Optional[Tuple[str, str]]:
         async with db.execute("""
-            SELECT letta_block_id 
-            FROM letta_users 
-            WHERE id = ?
-        """, (letta_user_id,)) as cursor:
+            DELETE FROM letta_spares
+            WHERE id = (SELECT MIN(id) FROM letta_spares)
+            RETURNING letta_identity_id, letta_block_id
+        """) as cursor:
             row = await cursor.fetchone()
-            if row:
-                return row[0]
-            return None
+        return (row[0], row[1]) if row else None
+    
+    return await get_database().write(_take)
+
+async def count_spare_letta_resources() -> int:
+    """Count the spare identities and core blocks in the pool."""
+    row = await get_database().fetchone("SELECT COUNT(*) FROM letta_spares")
+    return row[0] if row else 0
 
 async def upsert_user(user_id: int, username: str, first_name: str) -> None:
     """Upsert a user's details."""
     now = datetime.utcnow().isoformat()
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute("""
-            INSERT INTO platform_profiles (
-                letta_user_id, platform, platform_user_id, username, display_name,
-                created_at, last_active
-            ) VALUES (?, 'telegram', ?, ?, ?, ?, ?)
-            ON CONFLICT(platform, platform_user_id) DO UPDATE SET
-                username = excluded.username,
-                display_name = excluded.display_name,
-                last_active = excluded.last_active
-        """, (user_id, str(user_id), username, first_name, now, now))
-        await db.commit() 
\ No newline at end of file
+    await get_database().execute("""
+        INSERT INTO platform_profiles (
+            letta_user_id, platform, platform_user_id, username, display_name,
+            created_at, last_active
+        ) VALUES (?, 'telegram', ?, ?, ?, ?, ?)
+        ON CONFLICT(platform, platform_user_id) DO UPDATE SET
+            username = excluded.username,
+            display_name = excluded.display_name,
+            last_active = excluded.last_active
+    """, (user_id, str(user_id), username, first_name, now, now))
+    get_profile_cache().invalidate('telegram', str(user_id)) 
\ No newline at end of file
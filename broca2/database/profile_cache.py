@@ -0,0 +1,124 @@
+"""In-process cache of platform profiles and their Letta users.
+
+Every inbound message looks up its sender's platform profile and Letta user.
+The cache keeps the most recently seen senders in memory, keyed by
+`(platform, platform_user_id)`, so returning senders are resolved without
+reading the database. It is write-through: the user operations update the
+cached entries whenever they write a profile or Letta user in this process.
+Changes made by other processes, such as `utool`, are not seen until the
+entry expires, `ttl` seconds after it was loaded, and is read again.
+"""
+import dataclasses
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Set, Tuple
+
+from common.config import get_settings_section
+from common.metrics import get_metrics
+from .connection import DEFAULT_DATABASE_SETTINGS
+from .models import LettaUser, PlatformProfile
+
+logger = logging.getLogger(__name__)
+
+ProfileKey = Tuple[str, str]
+
+class ProfileCache:
+    """LRU cache of (PlatformProfile, LettaUser) pairs."""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 300):
+        """Initialize an empty cache.
+
+        Args:
+            max_size: Most senders kept; 0 disables the cache
+            ttl: Seconds an entry is served before it is read again; 0 for no limit
+        """
+        self.max_size = max(0, max_size)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[ProfileKey, Tuple[PlatformProfile, LettaUser, float]]" = OrderedDict()
+        self._keys_by_user: Dict[int, Set[ProfileKey]] = {}
+
+    def __len__(self) -> int:
+        """Number of cached senders."""
+        return len(self._entries)
+
+    def get(self, platform: str, platform_user_id: str) -> Optional[Tuple[PlatformProfile, LettaUser]]:
+        """Get a sender's cached profile and Letta user, counting the hit or miss."""
+        key = (platform, platform_user_id)
+        entry = self._entries.get(key)
+        if entry is not None and self.ttl > 0 and time.monotonic() - entry[2] >= self.ttl:
+            # Expired: read it again in case another process changed it
+            self._forget(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            get_metrics().increment("profile_cache_misses_total")
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        get_metrics().increment("profile_cache_hits_total")
+        return entry[0], entry[1]
+
+    def put(self, profile: PlatformProfile, letta_user: LettaUser, loaded: bool = True) -> None:
+        """Cache a sender's profile and Letta user, evicting the least recently used.
+
+        Args:
+            profile: The sender's platform profile
+            letta_user: The profile's Letta user
+            loaded: Whether they were just read from the database, restarting
+                the entry's TTL; False for changes made by this process
+        """
+        if self.max_size <= 0:
+            return
+        key = (profile.platform, profile.platform_user_id)
+        previous = self._entries.get(key)
+        cached_at = time.monotonic() if loaded or previous is None else previous[2]
+        self._entries[key] = (profile, letta_user, cached_at)
+        self._entries.move_to_end(key)
+        self._keys_by_user.setdefault(letta_user.id, set()).add(key)
+        while len(self._entries) > self.max_size:
+            self._forget(next(iter(self._entries)))
+        get_metrics().set_gauge("profile_cache_size", len(self._entries))
+
+    def update_letta_user(self, letta_user_id: int, **changes) -> None:
+        """Apply changes to a cached Letta user, in every profile it is cached under."""
+        for key in self._keys_by_user.get(letta_user_id, ()):
+            profile, letta_user, cached_at = self._entries[key]
+            self._entries[key] = (profile, dataclasses.replace(letta_user, **changes), cached_at)
+
+    def invalidate(self, platform: str, platform_user_id: str) -> None:
+        """Drop a sender's cached entry, if any."""
+        if (platform, platform_user_id) in self._entries:
+            self._forget((platform, platform_user_id))
+            get_metrics().set_gauge("profile_cache_size", len(self._entries))
+
+    def clear(self) -> None:
+        """Drop every cached entry."""
+        self._entries.clear()
+        self._keys_by_user.clear()
+        get_metrics().set_gauge("profile_cache_size", 0)
+
+    def _forget(self, key: ProfileKey) -> None:
+        """Remove an entry and its Letta user index."""
+        _, letta_user, _ = self._entries.pop(key)
+        keys = self._keys_by_user.get(letta_user.id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_user[letta_user.id]
+
+# Create a singleton instance
+_profile_cache: Optional[ProfileCache] = None
+
+def get_profile_cache() -> ProfileCache:
+    """Get the profile cache singleton, sized from settings.json."""
+    global _profile_cache
+    if _profile_cache is None:
+        settings = get_settings_section("database", DEFAULT_DATABASE_SETTINGS)
+        _profile_cache = ProfileCache(
+            max_size=int(settings["profile_cache_size"]),
+            ttl=float(settings["profile_cache_ttl"])
+        )
+    return _profile_cache
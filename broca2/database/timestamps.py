@@ -0,0 +1,59 @@
+"""Epoch-millisecond timestamps used for ordering and range queries.
+
+Text timestamps are kept for display, but they were written in several
+formats over time (ISO 8601 with and without an offset, SQLite's
+CURRENT_TIMESTAMP and Telegram's "%Y-%m-%d %H:%M UTC"), so they do not sort
+correctly as text. Every row also stores the same instant as integer epoch
+milliseconds in a `timestamp_ms` column.
+"""
+import time
+from datetime import datetime, timezone
+from typing import Optional, Union
+
+# Text formats that datetime.fromisoformat() does not accept
+_TEXT_FORMATS = (
+    "%Y-%m-%d %H:%M UTC",
+    "%Y-%m-%d %H:%M:%S UTC",
+    "%Y-%m-%dT%H:%M:%S.%fZ",
+    "%Y-%m-%dT%H:%M:%SZ",
+)
+
+def now_ms() -> int:
+    """Current time in epoch milliseconds."""
+    return int(time.time() * 1000)
+
+def to_epoch_ms(value: Union[str, datetime, None]) -> Optional[int]:
+    """Convert a stored timestamp to epoch milliseconds.
+
+    Naive timestamps are taken to be UTC, which is how they were written.
+
+    Args:
+        value: A datetime or a timestamp string in any of the stored formats
+
+    Returns:
+        Optional[int]: Epoch milliseconds, or None if the value can't be parsed
+    """
+    if value is None:
+        return None
+
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        text = str(value).strip()
+        if not text:
+            return None
+        try:
+            parsed = datetime.fromisoformat(text)
+        except ValueError:
+            for text_format in _TEXT_FORMATS:
+                try:
+                    parsed = datetime.strptime(text, text_format)
+                    break
+                except ValueError:
+                    continue
+            else:
+                return None
+
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
@@ -3,6 +3,7 @@ import asyncio
 import sys
 import logging
 import os
+import signal
 import time
 import json
 from typing import Optional
@@ -12,8 +13,15 @@ from pathlib import Path
 from runtime.core.agent import AgentClient
 from runtime.core.queue import QueueProcessor
 from runtime.core.plugin import PluginManager
+from runtime.core.provisioner import get_provisioner
+from runtime.core.maintenance import DEFAULT_MAINTENANCE_SETTINGS, get_maintenance_scheduler
+from database.activity import get_activity_tracker
+from database.connection import get_database
+from database.depth import get_queue_depth
+from database.ingest import get_ingest_writer
 from database.operations.shared import initialize_database, check_and_migrate_db
-from common.config import get_env_var, get_settings, validate_settings
+from common.config import get_env_var, get_settings, get_settings_section, validate_settings
+from common.metrics import DEFAULT_METRICS_SETTINGS, export_metrics
 from common.logging import setup_logging
 
 # Load environment variables
@@ -51,11 +59,15 @@ class Application:
         # Initialize queue processor with plugin manager
         self.queue_processor = QueueProcessor(
             message_processor=self._process_message,
-            plugin_manager=self.plugin_manager
+            plugin_manager=self.plugin_manager,
+            message_streamer=self.agent.stream_message
         )
         
         self._settings_file = "settings.json"
         self._settings_mtime = 0
+        self._metrics_task: Optional[asyncio.Task] = None
+        self._queue_task: Optional[asyncio.Task] = None
+        self._shutdown = asyncio.Event()
         
         # Create default settings if needed
         create_default_settings()
@@ -108,16 +120,17 @@ class Application:
         except Exception as e:
             logger.error(f"Failed to reload settings: {str(e)}")
     
-    async def _process_message(self, message: str) -> Optional[str]:
+    async def _process_message(self, message: str, agent_id: Optional[str] = None) -> Optional[str]:
         """Process a message through the agent.
         
         Args:
             message: The message to process
+            agent_id: The agent from the pool that should handle the message
             
         Returns:
             The agent's response or None if processing failed
         """
-        return await self.agent.process_message(message)
+        return await self.agent.process_message(message, agent_id)
     
     async def _on_message_processed(self, user_id: int, response: str) -> None:
         """Handle processed messages.
@@ -130,13 +143,57 @@ class Application:
         # This will be handled by individual plugins
         logger.info(f"Message processed for user {user_id}: {response}")
     
+    def _install_signal_handlers(self) -> None:
+        """Shut down gracefully on SIGINT or SIGTERM.
+
+        The handlers are removed once a shutdown starts, so a second signal
+        stops the process immediately.
+        """
+        loop = asyncio.get_running_loop()
+
+        def request_shutdown(sig: signal.Signals) -> None:
+            logger.warning(f"⚠️ Received {sig.name}, shutting down (send again to force)")
+            for handled in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(handled)
+            self._shutdown.set()
+
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, request_shutdown, sig)
+            except (NotImplementedError, RuntimeError):
+                # Signal handlers are not supported on this platform
+                pass
+
     async def start(self) -> None:
-        """Start all application components."""
+        """Start all application components and run until asked to shut down."""
+        self._install_signal_handlers()
         try:
-            # Initialize and migrate the database safely
+            # Open the shared database connections, then initialize and migrate
+            await get_database().open()
             await initialize_database()
             await check_and_migrate_db()
             
+            # Count the backlog left from the last run before plugins admit messages
+            await get_queue_depth().sync()
+            
+            # Provision Letta resources for new users in the background
+            await get_provisioner().start()
+            
+            # Write users' last_active times in batches
+            get_activity_tracker().start()
+            
+            # Archive, back up, prune and vacuum the database in the background
+            if get_settings_section("maintenance", DEFAULT_MAINTENANCE_SETTINGS)["enabled"]:
+                get_maintenance_scheduler().start()
+            
+            # Export metrics to a file for scraping, if configured
+            metrics_settings = get_settings_section("metrics", DEFAULT_METRICS_SETTINGS)
+            if metrics_settings["export_path"]:
+                self._metrics_task = asyncio.create_task(export_metrics(
+                    metrics_settings["export_path"],
+                    float(metrics_settings["export_interval"])
+                ))
+            
             # Initialize the agent
             logger.info("🔄 Initializing agent API connection...")
             if not await self.agent.initialize():
@@ -159,44 +216,30 @@ class Application:
             logger.info("📋 Initializing message queue processor...")
             self.queue_processor = QueueProcessor(
                 message_processor=self._process_message,
-                plugin_manager=self.plugin_manager
+                plugin_manager=self.plugin_manager,
+                message_streamer=self.agent.stream_message
             )
             
             # Set initial message mode
             self.queue_processor.set_message_mode('echo')
             
             # Start queue processor
-            queue_task = asyncio.create_task(self.queue_processor.start())
+            self._queue_task = asyncio.create_task(self.queue_processor.start())
             
             logger.info("✅ Application started successfully!")
             
             # Start settings monitor task
             settings_task = asyncio.create_task(self._monitor_settings())
             
-            # Keep application running until interrupted
-            try:
-                while True:
-                    await asyncio.sleep(1)
-            except KeyboardInterrupt:
-                logger.info("Shutdown requested")
+            # Keep application running until a shutdown is requested
+            await self._shutdown.wait()
+            settings_task.cancel()
             
-        except KeyboardInterrupt:
-            logger.warning("⚠️ Shutdown requested by user")
-            # Cancel the queue processor task
-            if self.queue_processor:
-                queue_task.cancel()
-                try:
-                    await queue_task
-                except asyncio.CancelledError:
-                    pass
-            # Clean up agent
-            await self.agent.cleanup()
-            raise
         except Exception as e:
             logger.error(f"❌ Error: {str(e)}")
-            # Clean up agent
-            await self.agent.cleanup()
             raise
+        finally:
+            await self.stop()
     
     async def _monitor_settings(self):
         """Monitor settings file for changes."""
@@ -211,6 +254,16 @@ class Application:
             if self.queue_processor:
                 logger.info("🛑 Stopping queue processor...")
                 await self.queue_processor.stop()
+            if self._queue_task:
+                if not self._queue_task.done() and not self.queue_processor.is_running:
+                    # Shut down before the processor got going
+                    self._queue_task.cancel()
+                await asyncio.gather(self._queue_task, return_exceptions=True)
+            
+            # Stop the background work that calls Letta or the database
+            # before the Letta client is closed
+            await get_provisioner().stop()
+            await get_maintenance_scheduler().stop()
             
             # Clean up agent
             logger.info("🛑 Cleaning up agent...")
@@ -220,6 +273,16 @@ class Application:
             logger.info("🛑 Stopping plugin manager...")
             await self.plugin_manager.stop()
             
+            # Commit buffered inbound messages, then close database connections
+            # once nothing can write anymore
+            if self._metrics_task:
+                self._metrics_task.cancel()
+            
+            logger.info("🛑 Closing database...")
+            await get_ingest_writer().flush()
+            await get_activity_tracker().stop()
+            await get_database().close()
+            
             # Remove PID file
             try:
                 os.remove("broca2.pid")
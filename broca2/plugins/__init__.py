@@ -73,6 +73,22 @@ class Plugin(ABC):
         """
         pass
     
+    def get_streaming_handler(self) -> Optional[Callable]:
+        """Get the streaming response handler for this platform.
+        
+        This is an optional method that plugins can override to show a
+        response while the agent is still producing it. The handler is called
+        as `await handler(chunks, profile, message_id)`, where `chunks` is an
+        async iterator of text deltas, and returns the full text it delivered
+        (or None if nothing was delivered). The base implementation returns
+        None, in which case responses are delivered in one piece through the
+        message handler.
+        
+        Returns:
+            Optional[Callable]: The streaming handler or None
+        """
+        return None
+    
     def get_settings(self) -> Optional[Dict[str, Any]]:
         """Get the plugin's settings.
         
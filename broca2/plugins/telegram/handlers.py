@@ -5,8 +5,8 @@ from telethon import events
 from datetime import datetime
 from runtime.core.message import MessageFormatter
 from database.operations.users import get_or_create_platform_profile
-from database.operations.messages import insert_message
-from database.operations.queue import add_to_queue
+from database.operations.queue import enqueue_message
+from runtime.core.admission import get_admission_controller
 
 class MessageBuffer:
     """Buffers messages for batch processing."""
@@ -82,11 +82,15 @@ class MessageBuffer:
     async def _flush_buffer(self, buffer_key: Tuple[int, int, int]) -> None:
         """Flush the message buffer for a user.
         
+        The buffer is removed before its messages are queued, so messages
+        arriving meanwhile start a new buffer instead of being cleared with
+        this one, and buffers of users who went quiet do not accumulate.
+        
         Args:
             buffer_key: Tuple of (platform_user_id, letta_user_id, platform_profile_id)
         """
         platform_user_id, letta_user_id, platform_profile_id = buffer_key
-        buffer = self.buffers.get(buffer_key)
+        buffer = self.buffers.pop(buffer_key, None)
         if not buffer or not buffer["messages"]:
             print(f"No messages to flush for user {platform_user_id}")
             return
@@ -103,23 +107,15 @@ class MessageBuffer:
         print(f"Inserting message into database: {combined_text[:50]}...")
         
         # Insert message and add to queue
-        message_id = await insert_message(
+        message_id = await enqueue_message(
             letta_user_id=letta_user_id,
             platform_profile_id=platform_profile_id,
             role="user",
             message=combined_text,
             timestamp=first_msg_date
         )
-        await add_to_queue(letta_user_id, message_id)
         
         print(f"Message {message_id} added to queue for user {platform_user_id}")
-        
-        # Clear the buffer
-        self.buffers[buffer_key] = {
-            "messages": [],
-            "task": None
-        }
-        print(f"Buffer cleared for user {platform_user_id}")
 
 class MessageHandler:
     """Handles Telegram message events."""
@@ -165,6 +161,10 @@ class MessageHandler:
             print(f"Ignoring message from bot {sender.id} (@{sender.username})")
             return
         
+        # Shed or hold back the message if the queue or sender is over its limits
+        if not await get_admission_controller().admit("telegram", str(sender.id)):
+            return
+        
         # Sanitize user input
         message = self.formatter.sanitize_text(event.text)
         sender_first_name = self.formatter.sanitize_text(sender.first_name) if sender.first_name else "Unknown"
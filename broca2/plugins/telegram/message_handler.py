@@ -7,8 +7,8 @@ from datetime import datetime
 
 from runtime.core.message import Message, MessageHandler, MessageFormatter as BaseMessageFormatter
 from database.operations.users import get_or_create_platform_profile
-from database.operations.messages import insert_message
-from database.operations.queue import add_to_queue
+from database.operations.queue import enqueue_message
+from runtime.core.admission import get_admission_controller
 from plugins.telegram.settings import TelegramSettings, MessageMode
 
 class MessageFormatter(BaseMessageFormatter):
@@ -140,42 +140,37 @@ class MessageBuffer:
     async def _flush_buffer(self, buffer_key: Tuple[int, int, int]) -> None:
         """Flush the buffer for a specific user.
         
+        The buffer is removed before its messages are queued, so messages
+        arriving meanwhile start a new buffer instead of being cleared with
+        this one, and buffers of users who went quiet do not accumulate.
+        
         Args:
             buffer_key: Tuple of (platform_user_id, letta_user_id, platform_profile_id)
         """
-        if buffer_key not in self.buffers:
+        buffer = self.buffers.pop(buffer_key, None)
+        if buffer is None:
             return
             
         platform_user_id, letta_user_id, platform_profile_id = buffer_key
-        buffer = self.buffers[buffer_key]
         
         try:
-            # Process each message in the buffer
-            for msg in buffer["messages"]:
-                # Insert message into database
-                message_id = await insert_message(
+            # Submit the whole buffer at once so it lands in a single commit;
+            # gather keeps the messages in buffer order
+            await asyncio.gather(*(
+                enqueue_message(
                     letta_user_id=letta_user_id,
                     platform_profile_id=platform_profile_id,
                     role="user",
                     message=msg["message"],
                     timestamp=msg["timestamp"].isoformat()
                 )
-                
-                # Add to processing queue
-                await add_to_queue(
-                    message_id=message_id,
-                    letta_user_id=letta_user_id
-                )
+                for msg in buffer["messages"]
+            ))
                 
             print(f"Flushed {len(buffer['messages'])} messages for user {platform_user_id}")
             
         except Exception as e:
             print(f"Error flushing buffer for user {platform_user_id}: {str(e)}")
-            
-        finally:
-            # Clear the buffer
-            buffer["messages"].clear()
-            buffer["flush_task"] = None
 
 class TelegramMessageHandler(MessageHandler):
     """Handles Telegram message events."""
@@ -212,6 +207,10 @@ class TelegramMessageHandler(MessageHandler):
         
         print(f"Received message from user {message.user_id}")
         
+        # Shed or hold back the message if the queue or sender is over its limits
+        if not await get_admission_controller().admit("telegram", str(message.user_id)):
+            return
+        
         # Get or create Letta user and platform profile
         profile, letta_user = await get_or_create_platform_profile(
             platform="telegram",
@@ -21,6 +21,10 @@ class TelegramPluginWrapper(Plugin):
         """Get the message handler."""
         return self._plugin.get_message_handler()
     
+    def get_streaming_handler(self):
+        """Get the streaming response handler."""
+        return self._plugin.get_streaming_handler()
+    
     def get_settings(self):
         """Get plugin settings."""
         return self._plugin.get_settings()
@@ -20,6 +20,7 @@ class TelegramSettings:
     # Message handling
     message_mode: MessageMode = MessageMode.ECHO
     buffer_delay: int = 5  # seconds
+    stream_edit_interval: float = 1.0  # seconds between edits of a streamed response
     
     # Session management
     auto_save_session: bool = True
@@ -39,6 +40,7 @@ class TelegramSettings:
             session_string=get_env_var("TELEGRAM_SESSION_STRING", default=""),
             message_mode=MessageMode(get_env_var("TELEGRAM_MESSAGE_MODE", default="echo")),
             buffer_delay=int(get_env_var("TELEGRAM_BUFFER_DELAY", default="5")),
+            stream_edit_interval=float(get_env_var("TELEGRAM_STREAM_EDIT_INTERVAL", default="1.0")),
             auto_save_session=get_env_var("TELEGRAM_AUTO_SAVE_SESSION", default="true").lower() == "true"
         )
     
@@ -54,6 +56,7 @@ class TelegramSettings:
             "session_string": self.session_string,
             "message_mode": self.message_mode.value,
             "buffer_delay": self.buffer_delay,
+            "stream_edit_interval": self.stream_edit_interval,
             "auto_save_session": self.auto_save_session
         }
     
@@ -73,5 +76,6 @@ class TelegramSettings:
             session_string=data.get("session_string"),
             message_mode=MessageMode(data.get("message_mode", "echo")),
             buffer_delay=data.get("buffer_delay", 5),
+            stream_edit_interval=data.get("stream_edit_interval", 1.0),
             auto_save_session=data.get("auto_save_session", True)
         ) 
\ No newline at end of file
@@ -3,7 +3,7 @@ import asyncio
 import logging
 import os
 import json
-from typing import Dict, Any, Optional, Callable, List
+from typing import Dict, Any, Optional, Callable, List, AsyncIterator
 from dotenv import load_dotenv, set_key
 from pathlib import Path
 
@@ -96,6 +96,10 @@ class TelegramPlugin(Plugin):
         """Get the message handler for this platform."""
         return self._handle_response
     
+    def get_streaming_handler(self) -> Callable:
+        """Get the streaming response handler for this platform."""
+        return self._handle_stream
+    
     async def _handle_response(self, response: str, profile, message_id: int) -> None:
         """Handle sending a response to a Telegram user.
         
@@ -173,6 +177,126 @@ class TelegramPlugin(Plugin):
                 logger.error("Could not update message status - database operations not available")
             raise
     
+    async def _handle_stream(self, chunks: AsyncIterator[str], profile, message_id: int) -> Optional[str]:
+        """Stream a response to a Telegram user while the agent produces it.
+        
+        The first text is sent as a new message, which is then edited as more
+        text arrives, at most once per `stream_edit_interval` seconds to stay
+        within Telegram's rate limits. Partial text is shown as plain text;
+        the final edit applies markdown formatting.
+        
+        Args:
+            chunks: Async iterator of response text deltas
+            profile: The platform profile of the recipient
+            message_id: The ID of the message being responded to
+            
+        If the stream or delivery fails after part of the response was
+        shown, the message is finished with the text received so far and
+        that text is returned, so the item completes instead of being sent
+        to the agent again.
+        
+        Returns:
+            Optional[str]: The full response text, or None if the agent produced none
+            
+        Raises:
+            DeliveryUncertainError: If delivery failed after the agent responded
+                but before anything was shown
+        """
+        from common.exceptions import DeliveryUncertainError
+        from database.operations.messages import update_message_status
+        
+        if self.formatter is None:
+            from plugins.telegram.message_handler import MessageFormatter
+            self.formatter = MessageFormatter()
+        
+        try:
+            telegram_user_id = int(profile.platform_user_id)
+        except ValueError:
+            logger.error(f"Invalid Telegram user ID format: {profile.platform_user_id}")
+            await update_message_status(
+                message_id=message_id,
+                status="failed",
+                response=f"Invalid Telegram user ID format: {profile.platform_user_id}"
+            )
+            return None
+        
+        edit_interval = self.settings.stream_edit_interval if self.settings else 1.0
+        loop = asyncio.get_running_loop()
+        text = ""
+        shown = ""
+        sent = None
+        last_edit = 0.0
+        
+        try:
+            async with self.client.action(telegram_user_id, 'typing'):
+                async for delta in chunks:
+                    text += delta
+                    if not text.strip() or loop.time() - last_edit < edit_interval:
+                        continue
+                    if sent is None:
+                        sent = await self.client.send_message(telegram_user_id, text)
+                    else:
+                        try:
+                            await self.client.edit_message(telegram_user_id, sent, text)
+                        except Exception as edit_error:
+                            # A dropped intermediate edit is caught up by the next one
+                            logger.debug(f"Intermediate edit failed: {str(edit_error)}")
+                            continue
+                    shown = text
+                    last_edit = loop.time()
+            
+            if not text.strip():
+                return None
+            
+            formatted = self.formatter.format_response(text)
+            if sent is None:
+                try:
+                    await self.client.send_message(telegram_user_id, formatted, parse_mode='markdown')
+                except Exception as markdown_error:
+                    logger.warning(f"Markdown parsing failed, falling back to plain text: {str(markdown_error)}")
+                    await self.client.send_message(telegram_user_id, formatted)
+            else:
+                try:
+                    await self.client.edit_message(telegram_user_id, sent, formatted, parse_mode='markdown')
+                except Exception as markdown_error:
+                    logger.warning(f"Markdown parsing failed, falling back to plain text: {str(markdown_error)}")
+                    if formatted != shown:
+                        await self.client.edit_message(telegram_user_id, sent, formatted)
+            logger.info(f"Streamed response to user {profile.username} ({telegram_user_id})")
+            
+            await update_message_status(
+                message_id=message_id,
+                status="success",
+                response=formatted
+            )
+            return text
+            
+        except Exception as e:
+            error_msg = f"Failed to stream response to {profile.platform_user_id}: {str(e)}"
+            logger.error(error_msg)
+            if shown:
+                # The user has part of the response; finish it rather than answer twice
+                if text != shown:
+                    try:
+                        await self.client.edit_message(telegram_user_id, sent, text)
+                    except Exception as edit_error:
+                        logger.warning(f"Failed to show the rest of the interrupted response: {str(edit_error)}")
+                await update_message_status(
+                    message_id=message_id,
+                    status="success",
+                    response=text
+                )
+                return text
+            await update_message_status(
+                message_id=message_id,
+                status="failed",
+                response=error_msg
+            )
+            if text.strip() and not isinstance(e, DeliveryUncertainError):
+                # The agent already took its turn; only delivery failed
+                raise DeliveryUncertainError(error_msg) from e
+            raise
+    
     def get_settings(self) -> Optional[Dict[str, Any]]:
         """Get the plugin's settings."""
         if self.settings is None:
@@ -253,7 +377,12 @@ class TelegramPlugin(Plugin):
                     if event.sender_id == await self.client.get_peer_id('me'):
                         logger.info(f"🔍 DEBUG: Skipping message from self: {event.sender_id}")
                         return
-                    
+
+                    # Shed or hold back the message if the queue or sender is over its limits
+                    from runtime.core.admission import get_admission_controller
+                    if not await get_admission_controller().admit("telegram", str(event.sender_id)):
+                        return
+
                     # Get message details
                     message = event.message.text
                     user_id = event.sender_id
@@ -284,8 +413,7 @@ class TelegramPlugin(Plugin):
                     
                     # Import database operations lazily
                     from database.operations.users import get_or_create_platform_profile
-                    from database.operations.messages import insert_message
-                    from database.operations.queue import add_to_queue
+                    from database.operations.queue import enqueue_message
                     
                     # Get or create user profile
                     profile, letta_user = await get_or_create_platform_profile(
@@ -295,8 +423,8 @@ class TelegramPlugin(Plugin):
                         display_name=first_name
                     )
                     
-                    # Insert message into database
-                    message_id = await insert_message(
+                    # Insert message into database and add it to the processing queue
+                    message_id = await enqueue_message(
                         letta_user_id=letta_user.id,
                         platform_profile_id=profile.id,
                         role="user",
@@ -304,9 +432,6 @@ class TelegramPlugin(Plugin):
                         timestamp=event.date.strftime("%Y-%m-%d %H:%M UTC")
                     )
                     
-                    # Add to processing queue
-                    await add_to_queue(letta_user.id, message_id)
-                    
                     logger.info(f"✅ Message queued for processing: {message_id}")
                     
                 except Exception as e:
@@ -41,9 +41,14 @@ class MessageBuffer:
         await self.flush()
     
     async def flush(self) -> None:
-        """Flush all buffered messages to the queue."""
+        """Flush all buffered messages to the queue.
+        
+        The buffered messages are taken before they are queued, so messages
+        arriving meanwhile stay buffered for the next flush.
+        """
         if not self.messages:
             return
+        messages, self.messages = self.messages, []
         
         try:
             # Initialize letta_client lazily if needed
@@ -52,7 +57,7 @@ class MessageBuffer:
                 self.letta_client = LettaClient()
             
             # Add all messages to queue
-            for message in self.messages:
+            for message in messages:
                 await self.letta_client.add_to_queue(
                     message=message["message"],
                     user_id=message["user_id"],
@@ -66,8 +71,6 @@ class MessageBuffer:
         except Exception as e:
             logger.error(f"Error flushing messages: {e}")
             raise
-        finally:
-            self.clear()
     
     def clear(self) -> None:
         """Clear all buffered messages."""
@@ -4,8 +4,9 @@ from typing import Dict, Any, Optional
 from datetime import datetime
 from runtime.core.message import MessageFormatter
 from database.operations.users import get_or_create_platform_profile
-from database.operations.messages import insert_message, update_message_status
-from database.operations.queue import add_to_queue
+from database.operations.messages import update_message_status
+from database.operations.queue import enqueue_message
+from runtime.core.admission import get_admission_controller
 
 logger = logging.getLogger(__name__)
 
@@ -18,18 +19,23 @@ class TelegramMessageHandler:
         self.letta_client = None  # Initialize lazily
         logger.info("Initialized MessageHandler")
     
-    async def process_incoming_message(self, message) -> Dict[str, Any]:
+    async def process_incoming_message(self, message) -> Optional[Dict[str, Any]]:
         """Process an incoming message.
         
         Args:
             message: The incoming message
             
         Returns:
-            dict: Message processing result
+            dict: Message processing result, or None if the message was shed
         """
         try:
             # Extract message data
             user_id = message.from_user.id
+
+            # Shed or hold back the message if the queue or sender is over its limits
+            if not await get_admission_controller().admit("telegram", str(user_id)):
+                return None
+
             username = message.from_user.username
             first_name = message.from_user.first_name
             timestamp = message.date
@@ -47,8 +53,8 @@ class TelegramMessageHandler:
                 display_name=sender_first_name
             )
             
-            # Insert message
-            message_id = await insert_message(
+            # Insert message and add it to the queue
+            message_id = await enqueue_message(
                 letta_user_id=letta_user.id,
                 platform_profile_id=profile.id,
                 role="user",
@@ -56,9 +62,6 @@ class TelegramMessageHandler:
                 timestamp=timestamp.strftime("%Y-%m-%d %H:%M UTC")
             )
             
-            # Add to queue
-            await add_to_queue(letta_user.id, message_id)
-            
             return {
                 "message_id": message_id,
                 "letta_user_id": letta_user.id,
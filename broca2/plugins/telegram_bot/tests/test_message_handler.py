@@ -4,8 +4,7 @@ from unittest.mock import AsyncMock, MagicMock, patch
 # Patch DB functions in the module where they are used
 patch("plugins.telegram_bot.message_handler.get_or_create_platform_profile", new_callable=AsyncMock).start()
 patch("database.operations.users.get_or_create_letta_user", new_callable=AsyncMock).start()
-patch("plugins.telegram_bot.message_handler.insert_message", new=AsyncMock(return_value=123)).start()
-patch("plugins.telegram_bot.message_handler.add_to_queue", new=AsyncMock()).start()
+patch("plugins.telegram_bot.message_handler.enqueue_message", new=AsyncMock(return_value=123)).start()
 
 # Ensure get_or_create_platform_profile always returns a tuple
 patch("plugins.telegram_bot.message_handler.get_or_create_platform_profile", new=AsyncMock(return_value=(MagicMock(), MagicMock()))).start()
@@ -0,0 +1,232 @@
+"""Admission control for inbound messages.
+
+Platform plugins ask the admission controller before queueing a message, so
+load is turned away at the edge instead of piling up in the queue:
+
+- Queue depth: at `defer_depth` unfinished items new messages are held back
+  until the queue drains below it, for up to `defer_timeout` seconds; at
+  `max_depth` they are shed outright.
+- Per-sender rate: each sender has a token bucket refilled at
+  `rate_per_minute` and holding up to `burst` tokens. A sender who runs out
+  is deferred until a token is available or shed, per `rate_limit_policy`.
+
+At most `max_deferred` messages are held back at once; beyond that they are
+shed, so deferral cannot itself exhaust memory.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from common.config import get_settings_section
+from common.metrics import get_metrics
+from database.depth import get_queue_depth
+
+# Defaults for the "admission" section of settings.json
+DEFAULT_ADMISSION_SETTINGS = {
+    "max_depth": 10000,
+    "defer_depth": 2000,
+    "defer_timeout": 10,
+    "rate_per_minute": 30,
+    "burst": 10,
+    "rate_limit_policy": "defer",
+    "max_deferred": 100,
+    "max_tracked_senders": 10000
+}
+
+# What happens to a message from a sender over their rate limit
+RATE_LIMIT_POLICIES = ("defer", "shed")
+
+# How often deferred messages check whether they may proceed, in seconds
+DEFER_POLL_SECONDS = 0.5
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Token bucket refilled continuously at a fixed rate."""
+
+    def __init__(self, rate: float, capacity: float):
+        """Initialize a full bucket.
+
+        Args:
+            rate: Tokens added per second
+            capacity: Most tokens the bucket holds
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        """Add the tokens accrued since the last update."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self) -> bool:
+        """Take a token if one is available."""
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def wait_time(self) -> float:
+        """Seconds until a token is available."""
+        self._refill()
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+class AdmissionController:
+    """Decides whether inbound messages are queued, held back or shed."""
+
+    def __init__(
+        self,
+        max_depth: int = 10000,
+        defer_depth: int = 2000,
+        defer_timeout: float = 10,
+        rate_per_minute: float = 30,
+        burst: int = 10,
+        rate_limit_policy: str = "defer",
+        max_deferred: int = 100,
+        max_tracked_senders: int = 10000
+    ):
+        """Initialize the controller.
+
+        Args:
+            max_depth: Queue depth at which messages are shed; 0 disables
+            defer_depth: Queue depth at which messages are held back; 0 disables
+            defer_timeout: Longest a message is held back before it is shed, in seconds
+            rate_per_minute: Messages per minute each sender may send; 0 disables
+            burst: Messages a sender may send at once before being limited
+            rate_limit_policy: 'defer' or 'shed' messages over a sender's rate limit
+            max_deferred: Most messages held back at once
+            max_tracked_senders: Most senders whose rate is tracked; the least
+                recently seen are forgotten first
+        """
+        if rate_limit_policy not in RATE_LIMIT_POLICIES:
+            raise ValueError(
+                f"Invalid rate_limit_policy '{rate_limit_policy}'. Must be one of: {', '.join(RATE_LIMIT_POLICIES)}"
+            )
+        self.max_depth = max_depth
+        self.defer_depth = defer_depth
+        self.defer_timeout = defer_timeout
+        self.rate = rate_per_minute / 60
+        self.burst = max(1, burst)
+        self.rate_limit_policy = rate_limit_policy
+        self.max_deferred = max_deferred
+        self.max_tracked_senders = max(1, max_tracked_senders)
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self._deferred = 0
+
+    def _bucket(self, platform: str, sender: str) -> TokenBucket:
+        """Get a sender's token bucket, forgetting the least recent sender if full."""
+        key = (platform, sender)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.max_tracked_senders:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _queue_full(self) -> bool:
+        """Whether the queue is deep enough to shed messages."""
+        return self.max_depth > 0 and get_queue_depth().value >= self.max_depth
+
+    def _queue_busy(self) -> bool:
+        """Whether the queue is deep enough to hold messages back."""
+        return self.defer_depth > 0 and get_queue_depth().value >= self.defer_depth
+
+    def _shed(self, platform: str, sender: str, reason: str) -> bool:
+        """Record a shed message."""
+        get_metrics().increment("ingest_shed_total", platform=platform, reason=reason)
+        logger.warning(f"Shedding message from {platform} sender {sender} ({reason})")
+        return False
+
+    async def admit(self, platform: str, sender: str) -> bool:
+        """Decide whether to queue a message, holding it back if needed.
+
+        Args:
+            platform: Platform the message arrived on
+            sender: The sender's platform user ID
+
+        Returns:
+            bool: True if the message may be queued, False if it should be dropped
+        """
+        depth = get_queue_depth()
+        if not depth.synced:
+            # Count the existing backlog before judging the queue by it
+            try:
+                await depth.sync()
+            except Exception as e:
+                logger.error(f"Failed to count the queue depth: {str(e)}")
+
+        if self._queue_full():
+            return self._shed(platform, sender, "queue_full")
+
+        bucket = self._bucket(platform, sender) if self.rate > 0 else None
+        rate_limited = bucket is not None and not bucket.take()
+        if rate_limited and self.rate_limit_policy == "shed":
+            return self._shed(platform, sender, "rate_limited")
+
+        if rate_limited or self._queue_busy():
+            if self._deferred >= self.max_deferred:
+                return self._shed(platform, sender, "too_many_deferred")
+            reason = "rate_limited" if rate_limited else "queue_busy"
+            get_metrics().increment("ingest_deferred_total", platform=platform, reason=reason)
+            self._deferred += 1
+            try:
+                if not await self._wait(bucket if rate_limited else None):
+                    return self._shed(platform, sender, f"{reason}_timeout")
+            finally:
+                self._deferred -= 1
+
+        get_metrics().increment("ingest_admitted_total", platform=platform)
+        return True
+
+    async def _wait(self, bucket: Optional[TokenBucket]) -> bool:
+        """Hold a message back until it may proceed or the timeout passes.
+
+        Args:
+            bucket: The sender's bucket to take a token from, if rate limited
+
+        Returns:
+            bool: Whether the message may proceed
+        """
+        deadline = time.monotonic() + self.defer_timeout
+        while True:
+            if self._queue_full():
+                return False
+            if bucket is not None and bucket.take():
+                bucket = None
+            if bucket is None and not self._queue_busy():
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            delay = DEFER_POLL_SECONDS if bucket is None else max(bucket.wait_time(), 0.01)
+            await asyncio.sleep(min(delay, remaining))
+
+# Create a singleton instance
+_admission_controller: Optional[AdmissionController] = None
+
+def get_admission_controller() -> AdmissionController:
+    """Get the admission controller singleton, configured from settings.json."""
+    global _admission_controller
+    if _admission_controller is None:
+        settings = get_settings_section("admission", DEFAULT_ADMISSION_SETTINGS)
+        _admission_controller = AdmissionController(
+            max_depth=int(settings["max_depth"]),
+            defer_depth=int(settings["defer_depth"]),
+            defer_timeout=float(settings["defer_timeout"]),
+            rate_per_minute=float(settings["rate_per_minute"]),
+            burst=int(settings["burst"]),
+            rate_limit_policy=settings["rate_limit_policy"],
+            max_deferred=int(settings["max_deferred"]),
+            max_tracked_senders=int(settings["max_tracked_senders"])
+        )
+    return _admission_controller
@@ -1,9 +1,11 @@
 """Agent API client and operations."""
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, AsyncIterator
 import logging
 from letta_client import MessageCreate
-from .letta_client import get_letta_client
+from .letta_client import get_letta_client, close_letta_client
+from .agent_pool import get_agent_ids
 from common.config import get_env_var
+from common.exceptions import DeadlineExceededError, DeliveryUncertainError, LettaUnavailableError
 from common.logging import setup_logging
 
 # Setup logging
@@ -16,16 +18,17 @@ class AgentClient:
     def __init__(self):
         """Initialize the agent client with configuration."""
         self.debug_mode = get_env_var("DEBUG_MODE", default="false", cast_type=lambda x: x.lower() == "true")
-        self.agent_id = get_env_var("AGENT_ID", required=not self.debug_mode)
+        self.agent_ids = get_agent_ids()
+        self.agent_id = self.agent_ids[0] if self.agent_ids else None
         
-        logger.debug(f"Initializing AgentClient with ID: {self.agent_id}")
+        logger.debug(f"Initializing AgentClient with IDs: {self.agent_ids}")
         logger.debug(f"Debug mode: {self.debug_mode}")
         
         if not self.debug_mode and not self.agent_id:
             raise ValueError(
                 "Missing required environment variable. Please ensure AGENT_ID "
-                "is set in your .env file, or set DEBUG_MODE=true to run in "
-                "debug mode without an agent API."
+                "(or AGENT_IDS for an agent pool) is set in your .env file, or "
+                "set DEBUG_MODE=true to run in debug mode without an agent API."
             )
     
     async def initialize(self) -> bool:
@@ -39,32 +42,39 @@ class AgentClient:
             client = get_letta_client()
             logger.debug("Retrieved Letta client instance")
             
-            # Verify agent exists
-            logger.debug(f"Attempting to retrieve agent {self.agent_id}")
-            try:
-                agent = client.agents.retrieve(self.agent_id)
-                logger.info(f"✅ Connected to agent {agent.id}: {agent.name}")
-                return True
-            except Exception as e:
-                logger.error(f"❌ Agent {self.agent_id} not found: {str(e)}")
-                return False
+            # Verify every agent in the pool exists
+            for agent_id in self.agent_ids:
+                logger.debug(f"Attempting to retrieve agent {agent_id}")
+                try:
+                    agent = await client.retrieve_agent(agent_id)
+                    logger.info(f"✅ Connected to agent {agent.id}: {agent.name}")
+                except Exception as e:
+                    logger.error(f"❌ Agent {agent_id} not found: {str(e)}")
+                    return False
+            return True
             
         except Exception as e:
             logger.error(f"❌ Failed to initialize Letta client: {str(e)}")
             return False
     
-    async def process_message(self, message: str) -> Optional[str]:
-        """Process a message through the agent API."""
+    async def process_message(self, message: str, agent_id: Optional[str] = None) -> Optional[str]:
+        """Process a message through the agent API.
+        
+        Args:
+            message: The message to send
+            agent_id: Agent to send it to, defaults to the first configured agent
+        """
         if self.debug_mode:
             logger.debug(f"Debug mode: returning message without processing: {message}")
             return message
             
         try:
             client = get_letta_client()
+            agent_id = agent_id or self.agent_id
             
-            logger.debug(f"Sending message to agent {self.agent_id}: {message}")
-            response = client.agents.messages.create(
-                agent_id=self.agent_id,
+            logger.debug(f"Sending message to agent {agent_id}: {message}")
+            response = await client.send_messages(
+                agent_id=agent_id,
                 messages=[MessageCreate(role="user", content=message)]
             )
             
@@ -99,10 +109,46 @@ class AgentClient:
             
             return response_content
             
+        except (LettaUnavailableError, DeadlineExceededError, DeliveryUncertainError):
+            # The queue processor decides whether to retry the message
+            raise
         except Exception as e:
             logger.error(f"Error processing message: {str(e)}")
             return None
     
+    async def stream_message(self, message: str, agent_id: Optional[str] = None) -> AsyncIterator[str]:
+        """Process a message through the agent API, yielding the response as it is produced.
+        
+        Args:
+            message: The message to send
+            agent_id: Agent to send it to, defaults to the first configured agent
+            
+        Yields:
+            str: Pieces of the assistant's response text, in order
+        """
+        if self.debug_mode:
+            logger.debug(f"Debug mode: returning message without processing: {message}")
+            yield message
+            return
+        
+        client = get_letta_client()
+        agent_id = agent_id or self.agent_id
+        
+        logger.debug(f"Streaming message to agent {agent_id}: {message}")
+        async for chunk in client.stream_messages(
+            agent_id=agent_id,
+            messages=[MessageCreate(role="user", content=message)]
+        ):
+            if getattr(chunk, 'message_type', None) != 'assistant_message':
+                continue
+            
+            content = chunk.content
+            if not isinstance(content, str):
+                # Content may arrive as a list of text parts
+                content = "".join(getattr(part, 'text', '') or '' for part in content or [])
+            if content:
+                yield content
+    
     async def cleanup(self) -> None:
         """Clean up any resources used by the agent client."""
-        pass 
\ No newline at end of file
+        close_letta_client() 
\ No newline at end of file
@@ -0,0 +1,78 @@
+"""Assignment of users to a pool of equivalent Letta agents."""
+import bisect
+import hashlib
+import logging
+from typing import List, Optional, Tuple
+
+from common.config import get_env_var
+
+logger = logging.getLogger(__name__)
+
+# Points each agent gets on the hash ring; more points spread users more evenly
+RING_REPLICAS = 128
+
+def _hash(key: str) -> int:
+    """Stable 64-bit hash of a string (Python's hash() is salted per process)."""
+    return int.from_bytes(hashlib.sha1(key.encode("utf-8")).digest()[:8], "big")
+
+def get_agent_ids() -> List[str]:
+    """Get the configured agent IDs.
+
+    AGENT_IDS holds a comma-separated pool of equivalent agents. Without it
+    the pool is the single AGENT_ID.
+
+    Returns:
+        List[str]: Agent IDs in configuration order, without duplicates
+    """
+    configured = get_env_var("AGENT_IDS", default="") or ""
+    agent_ids = [agent_id.strip() for agent_id in configured.split(",") if agent_id.strip()]
+    if not agent_ids:
+        agent_id = get_env_var("AGENT_ID")
+        agent_ids = [agent_id] if agent_id else []
+    return list(dict.fromkeys(agent_ids))
+
+class AgentPool:
+    """Maps users to agents by consistent hashing on the Letta user ID.
+
+    A user always lands on the same agent, so their conversation history
+    stays in one place. Adding or removing an agent only moves the users on
+    the affected part of the ring.
+    """
+
+    def __init__(self, agent_ids: List[str], replicas: int = RING_REPLICAS):
+        """Initialize the pool.
+
+        Args:
+            agent_ids: Equivalent agents to spread users across
+            replicas: Points per agent on the hash ring
+
+        Raises:
+            ValueError: If no agent IDs are given
+        """
+        if not agent_ids:
+            raise ValueError("Agent pool needs at least one agent ID")
+        self.agent_ids = list(dict.fromkeys(agent_ids))
+        ring: List[Tuple[int, str]] = sorted(
+            (_hash(f"{agent_id}#{replica}"), agent_id)
+            for agent_id in self.agent_ids
+            for replica in range(replicas)
+        )
+        self._ring_keys = [key for key, _ in ring]
+        self._ring_agents = [agent_id for _, agent_id in ring]
+        if len(self.agent_ids) > 1:
+            logger.info(f"Agent pool of {len(self.agent_ids)} agents: {', '.join(self.agent_ids)}")
+
+    @property
+    def primary(self) -> str:
+        """The first configured agent."""
+        return self.agent_ids[0]
+
+    def __len__(self) -> int:
+        return len(self.agent_ids)
+
+    def agent_for(self, letta_user_id: Optional[int]) -> str:
+        """Get the agent that serves a user."""
+        if len(self.agent_ids) == 1 or letta_user_id is None:
+            return self.primary
+        index = bisect.bisect(self._ring_keys, _hash(f"user:{letta_user_id}"))
+        return self._ring_agents[index % len(self._ring_agents)]
@@ -0,0 +1,97 @@
+"""Core block attachment tracking for shared agents."""
+import logging
+from typing import Dict, Optional
+
+from database.operations.users import get_user_block_ids
+from .letta_client import get_letta_client
+
+logger = logging.getLogger(__name__)
+
+class BlockAttachmentManager:
+    """Keeps track of which user core block is attached to each agent.
+
+    A user's core block stays attached after their message is processed and
+    is only swapped out when another user's message needs the agent, so
+    consecutive messages from one user cost a single round trip each instead
+    of three. Callers must serialize use of an agent (the queue processor
+    holds the agent's lock) while calling into the manager.
+    """
+
+    def __init__(self, letta_client=None):
+        """Initialize the manager.
+
+        Args:
+            letta_client: Letta client to use, defaults to the shared instance
+        """
+        self.letta_client = letta_client or get_letta_client()
+        self._attached: Dict[str, Optional[str]] = {}  # agent_id -> attached user block
+
+    def attached_block(self, agent_id: str) -> Optional[str]:
+        """The user block currently attached to an agent, if known."""
+        return self._attached.get(agent_id)
+
+    async def reconcile(self, agent_id: str) -> None:
+        """Learn which user blocks are attached to an agent, e.g. after a restart.
+
+        Leaves at most one user block attached: if a previous run left
+        several behind, all of them are detached.
+        """
+        blocks = await self.letta_client.list_agent_blocks(agent_id)
+        block_ids = [block.id for block in blocks]
+        known_user_blocks = await get_user_block_ids(block_ids)
+        user_block_ids = [block_id for block_id in block_ids if block_id in known_user_blocks]
+
+        if len(user_block_ids) == 1:
+            self._attached[agent_id] = user_block_ids[0]
+            logger.info(f"Agent {agent_id} has user core block {user_block_ids[0][:8]}... attached")
+            return
+
+        for block_id in user_block_ids:
+            logger.info(f"Detaching leftover user core block {block_id[:8]}... from agent {agent_id}")
+            await self.letta_client.detach_block(agent_id=agent_id, block_id=block_id)
+        self._attached[agent_id] = None
+
+    async def ensure_attached(self, agent_id: str, block_id: str) -> None:
+        """Make a user's core block the one attached to an agent.
+
+        Does nothing if it is already attached; otherwise detaches the
+        previous user's block first.
+        """
+        current = self._attached.get(agent_id)
+        if current == block_id:
+            logger.info(f"User core block {block_id[:8]}... already attached to agent")
+            return
+
+        if current is not None:
+            logger.info(f"Detaching core block {current[:8]}... from agent")
+            # Forget it first: if the detach fails the agent's state is unknown
+            self._attached[agent_id] = None
+            await self.letta_client.detach_block(agent_id=agent_id, block_id=current)
+
+        logger.info(f"Attaching user core block {block_id[:8]}... to agent")
+        await self.letta_client.attach_block(agent_id=agent_id, block_id=block_id)
+        self._attached[agent_id] = block_id
+
+    def forget(self, agent_id: str) -> None:
+        """Drop what is known about an agent; the next attach starts from scratch."""
+        self._attached.pop(agent_id, None)
+
+    async def release(self, agent_id: str) -> None:
+        """Detach the attached user block from an agent.
+
+        Failures are logged, not raised.
+        """
+        block_id = self._attached.get(agent_id)
+        self._attached[agent_id] = None
+        if block_id is None:
+            return
+        try:
+            logger.info(f"Detaching core block {block_id[:8]}... from agent")
+            await self.letta_client.detach_block(agent_id=agent_id, block_id=block_id)
+        except Exception as e:
+            logger.error(f"Failed to detach core block {block_id[:8]}...: {str(e)}")
+
+    async def release_all(self) -> None:
+        """Detach every tracked user block."""
+        for agent_id in list(self._attached):
+            await self.release(agent_id)
@@ -0,0 +1,77 @@
+"""Archival of finished queue items.
+
+Queue rows are kept after they reach a final status, so without archival
+the table and every scan of it grow for as long as the service runs. The
+compactor, run periodically by the maintenance scheduler, moves finished
+items older than the retention window to the `queue_archive` table, in
+small batches that each commit on their own, so the writer is never held
+for long and the live queue stays small.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from common.config import get_settings_section
+from common.metrics import get_metrics
+from database.operations.queue import archive_queue_items
+
+# Defaults for the "archive" section of settings.json
+DEFAULT_ARCHIVE_SETTINGS = {
+    "enabled": True,
+    "retention_seconds": 86400,
+    "batch_size": 500,
+    "interval": 300
+}
+
+# Pause between batches, leaving the writer free for other work
+BATCH_PAUSE_SECONDS = 0.05
+
+logger = logging.getLogger(__name__)
+
+class QueueCompactor:
+    """Moves finished queue items to the archive."""
+
+    def __init__(self, retention_seconds: float = 86400, batch_size: int = 500, interval: float = 300):
+        """Initialize the compactor.
+
+        Args:
+            retention_seconds: How long finished items stay in the queue
+            batch_size: Items moved per transaction
+            interval: Seconds between archival runs by the maintenance scheduler
+        """
+        self.retention_seconds = retention_seconds
+        self.batch_size = max(1, batch_size)
+        self.interval = interval
+
+    async def compact(self) -> int:
+        """Archive every finished item past the retention window.
+
+        Returns:
+            int: Number of items archived
+        """
+        total = 0
+        while True:
+            archived = await archive_queue_items(self.retention_seconds, self.batch_size)
+            total += archived
+            if archived < self.batch_size:
+                break
+            await asyncio.sleep(BATCH_PAUSE_SECONDS)
+        if total:
+            logger.info(f"Archived {total} finished queue items")
+            get_metrics().increment("queue_items_archived_total", total)
+        return total
+
+# Create a singleton instance
+_compactor: Optional[QueueCompactor] = None
+
+def get_queue_compactor() -> QueueCompactor:
+    """Get the queue compactor singleton, configured from settings.json."""
+    global _compactor
+    if _compactor is None:
+        settings = get_settings_section("archive", DEFAULT_ARCHIVE_SETTINGS)
+        _compactor = QueueCompactor(
+            retention_seconds=float(settings["retention_seconds"]),
+            batch_size=int(settings["batch_size"]),
+            interval=float(settings["interval"])
+        )
+    return _compactor
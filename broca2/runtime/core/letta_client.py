@@ -1,57 +1,409 @@
 """
 Letta API client implementation using the official SDK.
+
+The SDK client is synchronous, so every call made from a coroutine goes
+through the async methods below. They run the SDK call on a bounded thread
+pool, sized to the HTTP connection pool, and enforce a per-call deadline, so
+a slow Letta request never blocks the event loop. The same deadline is passed
+to the SDK as the request's timeout, so a call the event loop gave up on does
+not keep its thread for much longer. Calls go through the shared circuit
+breaker and retry policy from `resilience`.
 """
 
-import os
+import asyncio
 import logging
-from typing import Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, List, Optional
+
+import httpx
 from letta_client import Letta
-from common.config import get_env_var
+from common.config import get_env_var, get_settings_section
+from common.exceptions import CircuitOpenError, DeadlineExceededError, DeliveryUncertainError, LettaUnavailableError
+from common.metrics import get_metrics
+from .resilience import get_circuit_breaker, get_retry_policy, hedged, is_endpoint_failure, is_retryable, may_have_acted, remaining_time
+
+# Defaults for the "letta" section of settings.json
+DEFAULT_LETTA_SETTINGS = {
+    "max_connections": 10,
+    "max_keepalive_connections": 10,
+    "keepalive_expiry": 30,
+    "connect_timeout": 10,
+    "timeout": 60,
+    "message_timeout": 180
+}
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
 class LettaClient:
     """Client for interacting with the Letta API."""
-    
+
     def __init__(self):
         """Initialize the Letta client with configuration from settings."""
         self.api_endpoint = get_env_var("AGENT_ENDPOINT")
         self.api_key = get_env_var("AGENT_API_KEY")
-        
+        self.settings = get_settings_section("letta", DEFAULT_LETTA_SETTINGS)
+        self.breaker = get_circuit_breaker("letta")
+        self.retry_policy = get_retry_policy()
+
         logger.debug(f"Initializing Letta client with endpoint: {self.api_endpoint}")
         logger.debug(f"Using API key: {self.api_key[:4]}...")
-        
+
+        # Shared HTTP connection pool with keep-alive; httpx clients are thread-safe
+        self._http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=int(self.settings["max_connections"]),
+                max_keepalive_connections=int(self.settings["max_keepalive_connections"]),
+                keepalive_expiry=float(self.settings["keepalive_expiry"])
+            ),
+            timeout=httpx.Timeout(
+                float(self.settings["message_timeout"]),
+                connect=float(self.settings["connect_timeout"])
+            )
+        )
+
         # Initialize the official Letta client
         self._client = Letta(
             base_url=self.api_endpoint,
-            token=self.api_key
+            token=self.api_key,
+            httpx_client=self._http_client
         )
-    
+
+        # One thread per pooled connection, so calls never queue inside httpx
+        self._executor = ThreadPoolExecutor(
+            max_workers=int(self.settings["max_connections"]),
+            thread_name_prefix="letta"
+        )
+
+        # Calls given up on while their thread was still running
+        self._abandoned = 0
+        self._abandoned_lock = threading.Lock()
+
     @property
     def client(self):
         """Get the underlying Letta client instance."""
         return self._client
-    
+
     @property
     def agents(self):
         """Get the agents API client."""
         return self._client.agents
-    
+
     @property
     def blocks(self):
         """Get the blocks API client."""
         return self._client.blocks
-    
+
     @property
     def identities(self):
         """Get the identities API client."""
         return self._client.identities
+
+    async def call(
+        self,
+        function: Callable[..., Any],
+        *args,
+        timeout: Optional[float] = None,
+        idempotent: bool = False,
+        operation: Optional[str] = None,
+        **kwargs
+    ) -> Any:
+        """Run a synchronous SDK call without blocking the event loop.
+
+        Each attempt is bounded by `timeout` and by the deadline of the
+        current context (see `resilience.deadline`). Failed attempts are
+        retried with backoff when `is_retryable` allows it; slow idempotent
+        attempts may be hedged.
+
+        Args:
+            function: SDK method to call, e.g. `client.agents.retrieve`. It is
+                passed `request_options` limiting the HTTP request to the
+                attempt's time budget, with the SDK's own retries disabled.
+            *args: Positional arguments for the call
+            timeout: Deadline in seconds, defaults to the `letta.timeout` setting
+            idempotent: Whether repeating the call is harmless even if the
+                server already acted on it
+            operation: Name used in logs and metric labels
+            **kwargs: Keyword arguments for the call
+
+        Returns:
+            Whatever the SDK call returns
+
+        Raises:
+            CircuitOpenError: If the circuit breaker refuses the call
+            LettaUnavailableError: If the endpoint failed, timed out or was
+                unreachable on the last attempt
+            DeadlineExceededError: If the context's deadline ran out
+            Exception: Other errors raised by the SDK (e.g. 4xx responses)
+        """
+        if timeout is None:
+            timeout = float(self.settings["timeout"])
+        operation = operation or getattr(function, "__name__", "call")
+        caller_options = kwargs.pop("request_options", None) or {}
+        metrics = get_metrics()
+        loop = asyncio.get_running_loop()
+        attempt = 0
+
+        while True:
+            attempt += 1
+            budget = timeout
+            remaining = remaining_time()
+            if remaining is not None:
+                if remaining <= 0:
+                    metrics.increment("letta_requests_total", operation=operation, outcome="deadline")
+                    raise DeadlineExceededError(f"Deadline passed before Letta {operation} could be made")
+                budget = min(timeout, remaining)
+
+            try:
+                self.breaker.before_call()
+            except LettaUnavailableError:
+                metrics.increment("letta_requests_total", operation=operation, outcome="circuit_open")
+                raise
+
+            request_options = {**caller_options, "timeout_in_seconds": budget, "max_retries": 0}
+            request = partial(function, *args, request_options=request_options, **kwargs)
+
+            async def _attempt() -> Any:
+                return await self._run_in_thread(loop, request, budget, operation)
+
+            try:
+                if idempotent and 0 < self.retry_policy.hedge_after < budget:
+                    result = await hedged(
+                        _attempt,
+                        self.retry_policy.hedge_after,
+                        lambda: metrics.increment("letta_hedges_total", operation=operation)
+                    )
+                else:
+                    result = await _attempt()
+            except asyncio.CancelledError:
+                self.breaker.record_inconclusive()
+                raise
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError) and budget < timeout:
+                    # The caller's deadline ran out, not the endpoint's time
+                    self.breaker.record_inconclusive()
+                    metrics.increment("letta_requests_total", operation=operation, outcome="deadline")
+                    raise DeadlineExceededError(f"Deadline passed during Letta {operation}") from e
+
+                endpoint_failure = is_endpoint_failure(e)
+                if endpoint_failure:
+                    self.breaker.record_failure()
+                else:
+                    # The endpoint answered; the request itself was at fault
+                    self.breaker.record_success()
+
+                if attempt < self.retry_policy.max_attempts and is_retryable(e, idempotent):
+                    delay = self.retry_policy.backoff(attempt)
+                    remaining = remaining_time()
+                    if remaining is None or remaining > delay:
+                        metrics.increment("letta_retries_total", operation=operation)
+                        logger.warning(f"Letta {operation} failed ({str(e) or type(e).__name__}); retrying in {delay:.1f}s")
+                        await asyncio.sleep(delay)
+                        continue
+
+                metrics.increment("letta_requests_total", operation=operation, outcome="error")
+                if endpoint_failure:
+                    raise LettaUnavailableError(f"Letta {operation} failed: {str(e) or type(e).__name__}") from e
+                raise
+
+            self.breaker.record_success()
+            metrics.increment("letta_requests_total", operation=operation, outcome="ok")
+            return result
+
+    async def _run_in_thread(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        request: Callable[[], Any],
+        budget: float,
+        operation: str
+    ) -> Any:
+        """Run a blocking request on the thread pool, waiting at most `budget` seconds.
+
+        A request given up on before its thread picked it up is never made.
+        One whose thread is already running cannot be interrupted; it is
+        counted in `letta_abandoned_calls_total` and, until the SDK's timeout
+        ends it, in the `letta_abandoned_calls` gauge.
+        """
+        metrics = get_metrics()
+        state = {"started": False, "finished": False, "abandoned": False}
+
+        def run() -> Any:
+            with self._abandoned_lock:
+                if state["abandoned"]:
+                    return None
+                state["started"] = True
+            try:
+                return request()
+            finally:
+                with self._abandoned_lock:
+                    state["finished"] = True
+                    if state["abandoned"]:
+                        self._abandoned -= 1
+                        metrics.set_gauge("letta_abandoned_calls", self._abandoned)
+
+        future = loop.run_in_executor(self._executor, run)
+        try:
+            return await asyncio.wait_for(future, timeout=budget)
+        except BaseException:
+            with self._abandoned_lock:
+                state["abandoned"] = True
+                if state["started"] and not state["finished"]:
+                    self._abandoned += 1
+                    metrics.increment("letta_abandoned_calls_total", operation=operation)
+                    metrics.set_gauge("letta_abandoned_calls", self._abandoned)
+            raise
+
+    async def send_messages(self, agent_id: str, messages: List[Any]) -> Any:
+        """Send messages to an agent and wait for its response.
+        
+        Raises:
+            DeliveryUncertainError: If the send failed after the agent may
+                already have processed the messages; sending them again
+                could give the agent a duplicate turn
+            CircuitOpenError, LettaUnavailableError, DeadlineExceededError:
+                If the messages certainly were not processed
+        """
+        try:
+            return await self.call(
+                self._client.agents.messages.create,
+                agent_id=agent_id,
+                messages=messages,
+                timeout=float(self.settings["message_timeout"]),
+                operation="send_messages"
+            )
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            # call() wraps endpoint failures and timeouts; judge by the original error.
+            # Errors raised before the request was made carry no cause.
+            cause = e.__cause__ if isinstance(e, (LettaUnavailableError, DeadlineExceededError)) else e
+            if cause is not None and may_have_acted(cause):
+                raise DeliveryUncertainError(
+                    f"Letta send_messages failed after the agent may have processed it: {str(e) or type(e).__name__}"
+                ) from e
+            raise
+
+    async def stream_messages(self, agent_id: str, messages: List[Any]) -> AsyncIterator[Any]:
+        """Send messages to an agent and yield response chunks as they arrive.
+        
+        Tokens are streamed, so assistant message chunks carry text deltas.
+        The SDK's stream is a blocking iterator; it is drained on the thread
+        pool and handed over through a queue. Waiting for the next chunk is
+        bounded by the `letta.message_timeout` setting and the context's
+        deadline. The stream is never retried: part of it may already have
+        been shown to the user.
+        
+        Raises:
+            CircuitOpenError: If the circuit breaker refuses the call
+            LettaUnavailableError: If the endpoint certainly did not process
+                the messages (connection failed, 503 or 429)
+            DeliveryUncertainError: If the stream failed after the agent may
+                have processed the messages, including any failure after
+                the first chunk
+            Exception: If the endpoint rejected the request (4xx)
+        """
+        remaining = remaining_time()
+        if remaining is not None and remaining <= 0:
+            raise DeadlineExceededError("Deadline passed before Letta stream could be opened")
+        self.breaker.before_call()
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+        stopped = threading.Event()
+        end = object()
+        
+        def put(item: Any) -> None:
+            try:
+                loop.call_soon_threadsafe(chunks.put_nowait, item)
+            except RuntimeError:
+                # The event loop is gone; nobody is listening any more
+                stopped.set()
+        
+        def pump() -> None:
+            try:
+                messages_api = self._client.agents.messages
+                # Older SDK releases call the streaming endpoint create_stream
+                create_stream = getattr(messages_api, "create_stream", None) or messages_api.stream
+                for chunk in create_stream(agent_id=agent_id, messages=messages, stream_tokens=True):
+                    if stopped.is_set():
+                        break
+                    put(chunk)
+            except Exception as e:
+                put(e)
+            finally:
+                put(end)
+        
+        loop.run_in_executor(self._executor, pump)
+        timeout = float(self.settings["message_timeout"])
+        if remaining is not None:
+            timeout = min(timeout, remaining)
+        received = False
+        try:
+            while True:
+                try:
+                    item = await asyncio.wait_for(chunks.get(), timeout=timeout)
+                except asyncio.TimeoutError as e:
+                    item = e
+                if item is end:
+                    self.breaker.record_success()
+                    return
+                if isinstance(item, Exception):
+                    endpoint_failure = is_endpoint_failure(item)
+                    if endpoint_failure:
+                        self.breaker.record_failure()
+                    else:
+                        self.breaker.record_success()
+                    if received or may_have_acted(item):
+                        raise DeliveryUncertainError(
+                            f"Letta stream failed after the agent may have processed it: {str(item) or type(item).__name__}"
+                        ) from item
+                    if endpoint_failure:
+                        raise LettaUnavailableError(f"Letta stream failed: {str(item) or type(item).__name__}") from item
+                    raise item
+                received = True
+                yield item
+        finally:
+            # Stop the pump if the consumer gave up early
+            stopped.set()
+            self.breaker.record_inconclusive()
+    
+    async def retrieve_agent(self, agent_id: str) -> Any:
+        """Get an agent by ID."""
+        return await self.call(self._client.agents.retrieve, agent_id, idempotent=True, operation="retrieve_agent")
+
+    async def attach_block(self, agent_id: str, block_id: str) -> Any:
+        """Attach a core memory block to an agent."""
+        return await self.call(self._client.agents.blocks.attach, agent_id=agent_id, block_id=block_id, operation="attach_block")
+
+    async def detach_block(self, agent_id: str, block_id: str) -> Any:
+        """Detach a core memory block from an agent."""
+        return await self.call(self._client.agents.blocks.detach, agent_id=agent_id, block_id=block_id, operation="detach_block")
+
+    async def list_agent_blocks(self, agent_id: str) -> List[Any]:
+        """List the core memory blocks attached to an agent."""
+        return await self.call(self._client.agents.blocks.list, agent_id=agent_id, idempotent=True, operation="list_agent_blocks")
+
+    async def create_identity(self, **identity_data) -> Any:
+        """Create a Letta identity."""
+        return await self.call(self._client.identities.create, operation="create_identity", **identity_data)
+
+    async def create_block(self, **block_data) -> Any:
+        """Create a core memory block."""
+        return await self.call(self._client.blocks.create, operation="create_block", **block_data)
+
+    async def update_identity(self, identity_id: str, **identity_data) -> Any:
+        """Update a Letta identity."""
+        return await self.call(self._client.identities.modify, identity_id, idempotent=True, operation="update_identity", **identity_data)
+    
+    async def update_block(self, block_id: str, **block_data) -> Any:
+        """Update a core memory block."""
+        return await self.call(self._client.blocks.modify, block_id, idempotent=True, operation="update_block", **block_data)
     
     def close(self):
-        """Close the client."""
-        # The official client doesn't need explicit closing
-        pass
+        """Close the client's thread pool and HTTP connections."""
+        self._executor.shutdown(wait=False)
+        self._http_client.close()
 
 # Create a singleton instance
 _letta_client: Optional[LettaClient] = None
@@ -61,4 +413,11 @@ def get_letta_client() -> LettaClient:
     global _letta_client
     if _letta_client is None:
         _letta_client = LettaClient()
-    return _letta_client 
\ No newline at end of file
+    return _letta_client
+
+def close_letta_client() -> None:
+    """Close the Letta client singleton if it was created."""
+    global _letta_client
+    if _letta_client is not None:
+        _letta_client.close()
+        _letta_client = None
@@ -0,0 +1,223 @@
+"""Scheduled database maintenance.
+
+The maintenance scheduler runs each job once its interval has passed since
+its last run. Last runs are stored in the `maintenance_runs` table, so a
+daily job still runs daily across restarts. Jobs run one at a time:
+
+- archive: move finished queue items to the archive (see compactor.py)
+- backup: online backup of the database, keeping the newest few
+- prune: delete messages past their age or per-user count limit
+- vacuum: return free pages to the file system with incremental_vacuum
+- analyze: refresh query planner statistics
+
+A job with an interval of 0 is disabled. A job the database is not set up
+for, such as vacuum without `auto_vacuum = INCREMENTAL`, is recorded as
+skipped.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from common.config import get_settings_section
+from common.exceptions import MaintenanceJobSkipped
+from common.metrics import get_metrics
+from database.connection import get_database
+from database.maintenance import (
+    analyze_database,
+    backup_database,
+    backup_path,
+    get_maintenance_runs,
+    incremental_vacuum,
+    is_incremental_vacuum_enabled,
+    prune_messages,
+    record_maintenance_run,
+    remove_old_backups,
+)
+from .compactor import DEFAULT_ARCHIVE_SETTINGS, get_queue_compactor
+
+# Defaults for the "maintenance" section of settings.json
+DEFAULT_MAINTENANCE_SETTINGS = {
+    "enabled": True,
+    "check_interval": 60,
+    "backup_interval": 86400,
+    "backup_directory": "backups",
+    "backup_keep": 7,
+    "backup_pages_per_step": 256,
+    "prune_interval": 86400,
+    "message_max_age_days": 0,
+    "messages_per_user": 0,
+    "vacuum_interval": 3600,
+    "vacuum_pages_per_step": 1000,
+    "analyze_interval": 86400
+}
+
+logger = logging.getLogger(__name__)
+
+class MaintenanceJob:
+    """A maintenance task run every `interval` seconds."""
+
+    def __init__(self, name: str, interval: float, run: Callable[[], Awaitable[str]]):
+        """Initialize the job.
+
+        Args:
+            name: Name used in logs, metrics and `maintenance_runs`
+            interval: Seconds between runs; 0 disables the job
+            run: Coroutine function doing the work, returning a summary
+        """
+        self.name = name
+        self.interval = interval
+        self.run = run
+
+class MaintenanceScheduler:
+    """Runs maintenance jobs when they are due."""
+
+    def __init__(self, jobs: List[MaintenanceJob], check_interval: float = 60):
+        """Initialize the scheduler.
+
+        Args:
+            jobs: The jobs to run
+            check_interval: Seconds between checks for due jobs
+        """
+        self.jobs: Dict[str, MaintenanceJob] = {job.name: job for job in jobs}
+        self.check_interval = check_interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_job(self, name: str) -> str:
+        """Run a job now and record its outcome.
+
+        Args:
+            name: Name of the job
+
+        Returns:
+            str: The job's summary
+
+        Raises:
+            KeyError: If there is no job with that name
+        """
+        job = self.jobs[name]
+        started = time.monotonic()
+        try:
+            detail = await job.run()
+        except MaintenanceJobSkipped as e:
+            logger.info(f"Maintenance job {name} skipped: {str(e)}")
+            get_metrics().increment("maintenance_runs_total", job=name, status="skipped")
+            await record_maintenance_run(name, "skipped", str(e))
+            return str(e)
+        except Exception as e:
+            logger.error(f"Maintenance job {name} failed: {str(e)}")
+            get_metrics().increment("maintenance_runs_total", job=name, status="error")
+            await record_maintenance_run(name, "error", str(e))
+            raise
+        logger.info(f"Maintenance job {name} finished in {time.monotonic() - started:.1f}s: {detail}")
+        get_metrics().increment("maintenance_runs_total", job=name, status="ok")
+        await record_maintenance_run(name, "ok", detail)
+        return detail
+
+    async def run_due(self) -> None:
+        """Run every enabled job whose interval has passed since its last run."""
+        last_runs = {run["job"]: run["last_run_ms"] or 0 for run in await get_maintenance_runs()}
+        now = time.time() * 1000
+        for job in self.jobs.values():
+            if job.interval <= 0 or now - last_runs.get(job.name, 0) < job.interval * 1000:
+                continue
+            try:
+                await self.run_job(job.name)
+            except Exception:
+                # Already logged and recorded; the other jobs still run
+                pass
+
+    async def _run(self) -> None:
+        """Check for due jobs every check interval until cancelled."""
+        while True:
+            try:
+                await self.run_due()
+            except Exception as e:
+                logger.error(f"Maintenance check failed: {str(e)}")
+            await asyncio.sleep(self.check_interval)
+
+    def start(self) -> None:
+        """Start running jobs in the background."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop running jobs; a job in progress is cancelled."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+def _backup_job(directory: str, keep: int, pages_per_step: int) -> Callable[[], Awaitable[str]]:
+    """Build the backup job."""
+    async def _backup() -> str:
+        os.makedirs(directory, exist_ok=True)
+        destination = backup_path(directory)
+        size = await backup_database(destination, pages_per_step=pages_per_step)
+        removed = remove_old_backups(directory, keep)
+        return f"{destination} ({size} bytes), removed {len(removed)} old backup(s)"
+    return _backup
+
+def _prune_job(max_age_days: float, max_per_user: int) -> Callable[[], Awaitable[str]]:
+    """Build the message pruning job."""
+    async def _prune() -> str:
+        deleted = await prune_messages(max_age_seconds=max_age_days * 86400, max_per_user=max_per_user)
+        get_metrics().increment("messages_pruned_total", deleted)
+        return f"deleted {deleted} message(s)"
+    return _prune
+
+def _vacuum_job(pages_per_step: int) -> Callable[[], Awaitable[str]]:
+    """Build the incremental vacuum job."""
+    async def _vacuum() -> str:
+        if not await is_incremental_vacuum_enabled():
+            raise MaintenanceJobSkipped(
+                "auto_vacuum is not INCREMENTAL; run dbtool vacuum --enable-incremental while the bot is stopped"
+            )
+        return f"freed {await incremental_vacuum(pages_per_step)} page(s)"
+    return _vacuum
+
+async def _archive() -> str:
+    """Archive finished queue items."""
+    return f"archived {await get_queue_compactor().compact()} item(s)"
+
+async def _analyze() -> str:
+    """Refresh query planner statistics."""
+    await analyze_database()
+    return "statistics refreshed"
+
+# Create a singleton instance
+_scheduler: Optional[MaintenanceScheduler] = None
+
+def get_maintenance_scheduler() -> MaintenanceScheduler:
+    """Get the maintenance scheduler singleton, configured from settings.json."""
+    global _scheduler
+    if _scheduler is None:
+        settings = get_settings_section("maintenance", DEFAULT_MAINTENANCE_SETTINGS)
+        archive_settings = get_settings_section("archive", DEFAULT_ARCHIVE_SETTINGS)
+
+        # Relative backup directories are relative to the database file
+        backup_directory = os.path.join(
+            os.path.dirname(os.path.abspath(get_database().db_path)),
+            settings["backup_directory"]
+        )
+        prune_enabled = settings["message_max_age_days"] or settings["messages_per_user"]
+
+        _scheduler = MaintenanceScheduler([
+            MaintenanceJob(
+                "archive",
+                float(archive_settings["interval"]) if archive_settings["enabled"] else 0,
+                _archive
+            ),
+            MaintenanceJob("backup", float(settings["backup_interval"]), _backup_job(
+                backup_directory, int(settings["backup_keep"]), int(settings["backup_pages_per_step"])
+            )),
+            MaintenanceJob("prune", float(settings["prune_interval"]) if prune_enabled else 0, _prune_job(
+                float(settings["message_max_age_days"]), int(settings["messages_per_user"])
+            )),
+            MaintenanceJob("vacuum", float(settings["vacuum_interval"]), _vacuum_job(
+                int(settings["vacuum_pages_per_step"])
+            )),
+            MaintenanceJob("analyze", float(settings["analyze_interval"]), _analyze)
+        ], check_interval=float(settings["check_interval"]))
+    return _scheduler
@@ -19,6 +19,7 @@ class PluginManager:
         self._plugins: Dict[str, Plugin] = {}
         self._event_handlers: Dict[EventType, List[Callable[[Event], None]]] = {}
         self._platform_handlers: Dict[str, Callable] = {}
+        self._streaming_handlers: Dict[str, Callable] = {}
         self._running = False
     
     async def load_plugin(self, plugin_path: str) -> None:
@@ -57,6 +58,10 @@ class PluginManager:
                         if handler:
                             self._platform_handlers[platform] = handler
                             logger.info(f"Registered message handler for platform: {platform}")
+                        streaming_handler = plugin.get_streaming_handler()
+                        if streaming_handler:
+                            self._streaming_handlers[platform] = streaming_handler
+                            logger.info(f"Registered streaming handler for platform: {platform}")
                     
                     self._plugins[plugin_name] = plugin
                     logger.info(f"Loaded plugin: {plugin_name}")
@@ -86,6 +91,9 @@ class PluginManager:
         if platform and platform in self._platform_handlers:
             del self._platform_handlers[platform]
             logger.info(f"Unregistered message handler for platform: {platform}")
+        if platform and platform in self._streaming_handlers:
+            del self._streaming_handlers[platform]
+            logger.info(f"Unregistered streaming handler for platform: {platform}")
         
         try:
             await plugin.stop()
@@ -177,6 +185,17 @@ class PluginManager:
         """
         return self._platform_handlers.get(platform)
     
+    def get_streaming_handler(self, platform: str) -> Optional[Callable]:
+        """Get the streaming response handler for a platform.
+        
+        Args:
+            platform: Platform name to get handler for
+            
+        Returns:
+            Optional[Callable]: Streaming handler if registered, None otherwise
+        """
+        return self._streaming_handlers.get(platform)
+    
     async def discover_plugins(self, plugins_dir: str = "plugins", config: dict = None) -> None:
         """Discover and load all plugins in the plugins directory with dynamic settings.
         
@@ -0,0 +1,242 @@
+"""Background provisioning of Letta identities and core blocks for new users.
+
+New users are created locally when their first message arrives; their Letta
+identity and core block are created here, off the ingest path. Provisioning
+is single-flight per user: however many messages arrive before it finishes,
+one identity and one block are created. Optionally a pool of spare
+identities and blocks is kept ready, so a burst of new users only needs them
+renamed instead of created.
+"""
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+from common.config import get_settings_section
+from database.operations.users import (
+    add_spare_letta_resources,
+    build_core_block_value,
+    build_identity_name,
+    count_spare_letta_resources,
+    create_letta_resources,
+    get_letta_user_block_id,
+    get_unprovisioned_users,
+    get_user_details,
+    get_platform_profile_id,
+    set_letta_resources,
+    take_spare_letta_resources
+)
+from database.profile_cache import get_profile_cache
+from .letta_client import get_letta_client
+
+# Defaults for the "provisioning" section of settings.json
+DEFAULT_PROVISIONING_SETTINGS = {
+    "concurrency": 4,
+    "spare_pool_size": 0,
+    "wait_timeout": 60
+}
+
+# Name given to spare identities and blocks until they are assigned
+SPARE_NAME = "Unassigned User"
+
+logger = logging.getLogger(__name__)
+
+class LettaProvisioner:
+    """Creates Letta resources for new users in the background."""
+
+    def __init__(self, concurrency: int = 4, spare_pool_size: int = 0, wait_timeout: float = 60, letta_client=None):
+        """Initialize the provisioner.
+
+        Args:
+            concurrency: Users provisioned at the same time
+            spare_pool_size: Spare identity/block pairs to keep ready, 0 to disable
+            wait_timeout: Longest time `wait_ready` waits for a user, in seconds
+            letta_client: Letta client to use, defaults to the shared instance
+        """
+        self.concurrency = max(1, concurrency)
+        self.spare_pool_size = max(0, spare_pool_size)
+        self.wait_timeout = wait_timeout
+        self.letta_client = letta_client or get_letta_client()
+        self._inflight: Dict[int, asyncio.Task] = {}  # letta_user_id -> provisioning task
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._refill_task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _bind_loop(self) -> None:
+        """Reset state left behind by an event loop that is no longer running."""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._inflight = {}
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._refill_task = None
+            self._loop = loop
+
+    def request(
+        self,
+        letta_user_id: int,
+        username: Optional[str],
+        display_name: Optional[str],
+        platform_user_id: Optional[str]
+    ) -> asyncio.Task:
+        """Provision a user in the background unless that is already under way.
+
+        Returns:
+            asyncio.Task: The user's provisioning task, resolving to the core block ID
+        """
+        self._bind_loop()
+        task = self._inflight.get(letta_user_id)
+        if task is None:
+            task = asyncio.create_task(self._provision(letta_user_id, username, display_name, platform_user_id))
+            self._inflight[letta_user_id] = task
+            task.add_done_callback(lambda done: self._finished(letta_user_id, done))
+        return task
+
+    def _finished(self, letta_user_id: int, task: asyncio.Task) -> None:
+        """Forget a finished provisioning task and log its failure."""
+        if self._inflight.get(letta_user_id) is task:
+            del self._inflight[letta_user_id]
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            logger.error(f"Failed to provision Letta resources for user {letta_user_id}: {str(task.exception())}")
+        else:
+            # Covers users another process provisioned first, which set_letta_resources did not record here
+            get_profile_cache().update_letta_user(letta_user_id, letta_block_id=task.result())
+
+    async def wait_ready(self, letta_user_id: int) -> str:
+        """Get a user's core block ID, waiting for provisioning if needed.
+
+        Starts provisioning if it is not under way, e.g. for a user whose
+        provisioning was interrupted by a restart.
+
+        Raises:
+            asyncio.TimeoutError: If provisioning does not finish within `wait_timeout`
+            Exception: Whatever made provisioning fail
+        """
+        self._bind_loop()
+        task = self._inflight.get(letta_user_id)
+        if task is None:
+            block_id = await get_letta_user_block_id(letta_user_id)
+            if block_id:
+                return block_id
+            username = display_name = platform_user_id = None
+            details = await get_user_details(letta_user_id)
+            if details:
+                display_name, username = details
+            profile = await get_platform_profile_id(letta_user_id)
+            if profile:
+                platform_user_id = profile[1]
+            task = self.request(letta_user_id, username, display_name, platform_user_id)
+        return await asyncio.wait_for(asyncio.shield(task), timeout=self.wait_timeout)
+
+    async def _provision(
+        self,
+        letta_user_id: int,
+        username: Optional[str],
+        display_name: Optional[str],
+        platform_user_id: Optional[str]
+    ) -> str:
+        """Give a user a Letta identity and core block."""
+        async with self._semaphore:
+            block_id = await get_letta_user_block_id(letta_user_id)
+            if block_id:
+                return block_id
+
+            spare = await take_spare_letta_resources()
+            if spare:
+                identity_id, block_id = spare
+                try:
+                    await self._personalize(identity_id, block_id, username, display_name, platform_user_id)
+                except Exception as e:
+                    # The spare still works, it just keeps its placeholder name
+                    logger.warning(f"Failed to personalize spare core block {block_id[:8]}... for user {letta_user_id}: {str(e)}")
+            else:
+                identity_id, block_id = await create_letta_resources(username, display_name, platform_user_id)
+
+            if not await set_letta_resources(letta_user_id, identity_id, block_id):
+                # Another process provisioned the user first; keep ours for the next one
+                await add_spare_letta_resources(identity_id, block_id)
+                block_id = await get_letta_user_block_id(letta_user_id)
+            else:
+                logger.info(f"Provisioned Letta identity and core block {block_id[:8]}... for user {letta_user_id}")
+
+        self._schedule_refill()
+        return block_id
+
+    async def _personalize(
+        self,
+        identity_id: str,
+        block_id: str,
+        username: Optional[str],
+        display_name: Optional[str],
+        platform_user_id: Optional[str]
+    ) -> None:
+        """Rename a spare identity and fill in its core block for a user."""
+        now = datetime.utcnow().isoformat()
+        await asyncio.gather(
+            self.letta_client.update_identity(
+                identity_id,
+                name=build_identity_name(username, display_name, platform_user_id)
+            ),
+            self.letta_client.update_block(
+                block_id,
+                value=build_core_block_value(username, display_name, platform_user_id, now)
+            )
+        )
+
+    def _schedule_refill(self) -> None:
+        """Top up the spare pool in the background."""
+        if self.spare_pool_size and (self._refill_task is None or self._refill_task.done()):
+            self._refill_task = asyncio.create_task(self._refill())
+
+    async def _refill(self) -> None:
+        """Create spare identities and blocks until the pool is full."""
+        try:
+            missing = self.spare_pool_size - await count_spare_letta_resources()
+            for _ in range(max(0, missing)):
+                # New users take precedence over spares
+                async with self._semaphore:
+                    identity_id, block_id = await create_letta_resources(None, SPARE_NAME, None)
+                    await add_spare_letta_resources(identity_id, block_id)
+            if missing > 0:
+                logger.info(f"Added {missing} spare Letta identities and core blocks")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to refill spare Letta resources: {str(e)}")
+
+    async def start(self) -> None:
+        """Resume provisioning interrupted by a restart and fill the spare pool."""
+        self._bind_loop()
+        for letta_user_id, username, display_name, platform_user_id in await get_unprovisioned_users():
+            self.request(letta_user_id, username, display_name, platform_user_id)
+        self._schedule_refill()
+
+    async def stop(self) -> None:
+        """Cancel background provisioning.
+
+        Users whose provisioning is cancelled are picked up again by `start`.
+        """
+        if self._loop is not asyncio.get_running_loop():
+            return
+        tasks = list(self._inflight.values())
+        if self._refill_task is not None:
+            tasks.append(self._refill_task)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+# Create a singleton instance
+_provisioner: Optional[LettaProvisioner] = None
+
+def get_provisioner() -> LettaProvisioner:
+    """Get the provisioner singleton instance."""
+    global _provisioner
+    if _provisioner is None:
+        settings = get_settings_section("provisioning", DEFAULT_PROVISIONING_SETTINGS)
+        _provisioner = LettaProvisioner(
+            concurrency=int(settings["concurrency"]),
+            spare_pool_size=int(settings["spare_pool_size"]),
+            wait_timeout=float(settings["wait_timeout"])
+        )
+    return _provisioner
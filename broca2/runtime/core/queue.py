@@ -1,19 +1,30 @@
 """Queue processing and message handling."""
 import asyncio
 import logging
-from typing import Dict, Any, Optional, Callable, List, Tuple
+import os
+import socket
+import uuid
+from typing import Dict, Any, AsyncIterator, Awaitable, Optional, Callable, List, Set, Tuple
 from datetime import datetime
-from common.config import validate_settings, get_env_var
-from common.exceptions import PluginError
-from database.operations.messages import (
-    get_message_text, 
-    update_message_with_response,
-    get_message_platform_profile
+from common.config import validate_settings, get_env_var, get_settings, get_settings_section
+from common.exceptions import PluginError, CircuitOpenError, LettaUnavailableError
+from common.metrics import get_metrics
+from database.operations.messages import update_message_with_response
+from database.operations.queue import (
+    claim_work_items, expire_queue_items, recover_orphaned_queue_items, release_queue_item,
+    release_queue_leases, renew_queue_leases, update_queue_status
 )
-from database.operations.users import get_user_details, get_platform_profile_id, get_letta_user_block_id
-from database.operations.queue import get_pending_queue_item, update_queue_status
+from database.depth import get_queue_depth
+from database.models import WorkItem
+from database.notify import get_queue_notifier
 from .message import MessageFormatter
 from runtime.core.letta_client import get_letta_client
+from runtime.core.blocks import BlockAttachmentManager
+from runtime.core.agent_pool import AgentPool, get_agent_ids
+from runtime.core.provisioner import get_provisioner
+from runtime.core.resilience import DEFAULT_RESILIENCE_SETTINGS, deadline, get_circuit_breaker
+from runtime.core.retry import PERMANENT, UNCERTAIN, classify_error, get_retry_scheduler
+from runtime.core.scheduler import DeadlineScheduler, FairScheduler
 from common.logging import setup_logging
 
 # Setup logging with emojis
@@ -36,27 +47,69 @@ def add_emoji(record):
 # Add emoji filter to logger
 logger.addFilter(add_emoji)
 
+# Defaults for the "queue" section of settings.json
+DEFAULT_QUEUE_SETTINGS = {
+    "workers": 4,
+    "lease_seconds": 60,
+    "drain_timeout": 8,
+    "poll_min_seconds": 0.5,
+    "coalesce_window_seconds": 10,
+    "coalesce_max_messages": 5,
+    "ordering": "fair",
+    "platform_weights": {}
+}
+
+# Defaults for the "deadlines" section of settings.json
+DEFAULT_DEADLINE_SETTINGS = {
+    "response_seconds": 60,
+    "platform_response_seconds": {},
+    "ttl_seconds": 0,
+    "platform_ttl_seconds": {}
+}
+
+# Ways the queue processor can pick the next items to claim
+QUEUE_ORDERINGS = ("fair", "edf", "fifo")
+
+# Defaults for the "streaming" section of settings.json
+DEFAULT_STREAMING_SETTINGS = {
+    "enabled": True
+}
+
 class QueueProcessor:
     """Handles processing of queued messages."""
     
     def __init__(
         self,
-        message_processor: Callable[[str], str],
+        message_processor: Callable[[str, str], Awaitable[Optional[str]]],
         message_mode: str = 'echo',
         plugin_manager: Optional[Any] = None,
         telegram_client: Optional[Any] = None,
-        on_message_processed: Optional[Callable[[int, str], None]] = None
+        on_message_processed: Optional[Callable[[int, str], None]] = None,
+        max_workers: Optional[int] = None,
+        message_streamer: Optional[Callable[[str, str], AsyncIterator[str]]] = None
     ):
         """Initialize the queue processor.
         
         Args:
-            message_processor: Function to process messages
+            message_processor: Coroutine function processing a message, called
+                with the message and the ID of the agent that should handle it
             message_mode: The message mode ('echo', 'listen', or 'live')
             plugin_manager: The plugin manager instance for routing responses
             telegram_client: The Telegram client instance for typing indicator
             on_message_processed: Optional callback for when a message is processed
+            max_workers: Maximum number of items processed concurrently
+                (defaults to queue.workers in settings.json)
+            message_streamer: Optional streaming counterpart of message_processor,
+                yielding the response text as it is produced. Used for platforms
+                with a streaming handler when streaming.enabled is set.
         """
+        queue_settings = get_settings_section("queue", DEFAULT_QUEUE_SETTINGS)
+        streaming_settings = get_settings_section("streaming", DEFAULT_STREAMING_SETTINGS)
+        deadline_settings = get_settings_section("deadlines", DEFAULT_DEADLINE_SETTINGS)
+        resilience_settings = get_settings_section("resilience", DEFAULT_RESILIENCE_SETTINGS)
+        
         self.message_processor = message_processor
+        self.message_streamer = message_streamer if streaming_settings["enabled"] else None
         self.message_mode = message_mode
         self.formatter = MessageFormatter()
         self.is_running = False
@@ -64,66 +117,182 @@ class QueueProcessor:
         self.telegram_client = telegram_client
         self.on_message_processed = on_message_processed
         self.processing_messages = set()  # Track messages being processed
+        self.max_workers = max(1, int(max_workers or queue_settings["workers"]))
+        self._active_users: Dict[int, asyncio.Task] = {}  # letta_user_id -> in-flight worker
+        self._workers: Set[asyncio.Task] = set()  # every worker, including ones waiting on the user's previous one
+        self._sending: Set[int] = set()  # IDs of queue items whose agent call has started
+        self._finishing: Set[asyncio.Task] = set()  # recording and delivering responses already received
+        self._agent_locks: Dict[str, asyncio.Lock] = {}  # agent_id -> core block lock
+        self._slot_freed = asyncio.Event()
         self._stop_event = asyncio.Event()
+        self._stopped = asyncio.Event()
+        
+        # Lease identity for claiming items from a queue shared between processes
+        self.lease_owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = float(queue_settings["lease_seconds"])
+        
+        # On shutdown, in-flight items get this long to finish before they are released
+        self.drain_timeout = float(queue_settings["drain_timeout"])
+        
+        # New work is signalled by the notifier; polling is only a fallback that
+        # backs off from poll_min_seconds up to queue_refresh while idle.
+        self.notifier = get_queue_notifier()
+        self.poll_min_seconds = float(queue_settings["poll_min_seconds"])
+        
+        # A burst of messages from one user is answered in a single agent call
+        self.coalesce_window_seconds = float(queue_settings["coalesce_window_seconds"])
+        self.coalesce_max_messages = max(1, int(queue_settings["coalesce_max_messages"]))
+        
+        # Workers are shared between users by deficit round robin ('fair') or
+        # go to the earliest response deadline ('edf') instead of to whoever
+        # has the oldest backlog ('fifo')
+        self.ordering = queue_settings["ordering"]
+        if self.ordering not in QUEUE_ORDERINGS:
+            logger.warning(f"Unknown queue ordering {self.ordering!r}, using 'fair'")
+            self.ordering = "fair"
+        if self.ordering == "fair":
+            self.scheduler = FairScheduler(queue_settings["platform_weights"])
+        elif self.ordering == "edf":
+            self.scheduler = DeadlineScheduler(
+                deadline_settings["response_seconds"],
+                deadline_settings["platform_response_seconds"]
+            )
+        else:
+            self.scheduler = None
+        
+        # Pending items older than their TTL are expired rather than answered
+        self.ttl_seconds = float(deadline_settings["ttl_seconds"])
+        self.platform_ttl_seconds = deadline_settings["platform_ttl_seconds"]
+        self._last_sweep = 0.0
+        try:
+            self.refresh_interval = get_settings().get("queue_refresh", 5)
+            max_retries = get_settings().get("max_retries", 3)
+        except (FileNotFoundError, ValueError):
+            self.refresh_interval = 5
+            max_retries = 3
+        
+        # Failed items are retried with backoff or dead-lettered by error class
+        self.retry_scheduler = get_retry_scheduler(max_retries)
+        
+        # While the Letta endpoint is down the breaker is open and the queue
+        # pauses; each item's calls share a deadline derived from its age
+        self.breaker = get_circuit_breaker("letta")
+        self.item_deadline = float(resilience_settings["item_deadline"])
         self.letta_client = get_letta_client()
-        self.agent_id = get_env_var("AGENT_ID", required=True)
+        self.block_manager = BlockAttachmentManager(self.letta_client)
+        
+        # Users are spread over a pool of equivalent agents (AGENT_IDS); each
+        # agent is a serialized lane guarded by its lock
+        self.agent_pool = AgentPool(get_agent_ids() or [get_env_var("AGENT_ID", required=True)])
+        self.agent_id = self.agent_pool.primary
+    
+    @property
+    def max_retries(self) -> int:
+        """Retries of a failed item after its first attempt."""
+        return self.retry_scheduler.max_retries
+    
+    @max_retries.setter
+    def max_retries(self, value: int) -> None:
+        self.retry_scheduler.max_retries = value
     
     async def _process_with_core_block(
         self,
         message: str,
-        letta_user_id: int
+        work_item: WorkItem,
+        streaming_handler: Optional[Callable] = None
     ) -> Tuple[Optional[str], str]:
-        """Process a message with proper core block management."""
-        # Get the user's core block ID
-        block_id = await get_letta_user_block_id(letta_user_id)
+        """Process a message with proper core block management.
+        
+        The message goes to the user's agent in the agent pool. Core blocks
+        are attached to that shared agent, so processing holds the agent's
+        lock: two users' blocks are never attached to it at the same time even
+        when several workers are running, while different agents work in
+        parallel. The user's block is left attached afterwards and only
+        swapped out when another user's message needs the agent.
+        
+        With a streaming handler the response is streamed straight to the
+        platform while it is produced, and the returned response is the text
+        the handler delivered.
+        
+        Returns:
+            The response and a status, 'completed' or 'failed'
+            
+        Raises:
+            CircuitOpenError: If the circuit breaker refused a call; nothing was sent
+            Exception: Whatever else the item failed with, to be classified
+                by the retry scheduler
+        """
+        block_id = work_item.letta_block_id
         if not block_id:
-            logger.error(f"Core block not found for user {letta_user_id} - Cannot process message")
+            # A new user's core block may still be being provisioned
+            block_id = await get_provisioner().wait_ready(work_item.letta_user_id)
+        
+        agent_id = self.agent_pool.agent_for(work_item.letta_user_id)
+        async with self._get_agent_lock(agent_id):
+            try:
+                with deadline(self._item_deadline(work_item)):
+                    return await self._call_agent(message, work_item, agent_id, block_id, streaming_handler)
+            except (CircuitOpenError, LettaUnavailableError):
+                # The agent's attached blocks are uncertain, but asking it now would fail too
+                self.block_manager.forget(agent_id)
+                raise
+            except Exception:
+                # The agent's attached blocks are uncertain after an error
+                await self._reconcile_blocks(agent_id)
+                raise
+    
+    def _item_deadline(self, work_item: WorkItem) -> Optional[float]:
+        """Deadline for the Letta calls made for an item, as a time.time() timestamp.
+        
+        Counted from when this attempt claimed the item, not from when it was
+        queued: time spent waiting out an outage or a retry backoff does not
+        count against it. Messages that are simply too old are expired by
+        the queue TTL instead.
+        """
+        if not work_item.claimed_at_ms or self.item_deadline <= 0:
+            return None
+        return work_item.claimed_at_ms / 1000 + self.item_deadline
+    
+    async def _call_agent(
+        self,
+        message: str,
+        work_item: WorkItem,
+        agent_id: str,
+        block_id: str,
+        streaming_handler: Optional[Callable]
+    ) -> Tuple[Optional[str], str]:
+        """Attach the user's core block and send the message; the agent's lock must be held."""
+        # Attach core block unless it is still attached from the user's last message
+        await self.block_manager.ensure_attached(agent_id, block_id)
+        
+        # Process the message; from here on the agent may act on it
+        self._sending.update(item.id for item in work_item.batch)
+        logger.info(f"Processing message on agent {agent_id} with attached core block {block_id[:8]}...")
+        if streaming_handler:
+            chunks = self.message_streamer(message, agent_id)
+            response = await streaming_handler(chunks, work_item.profile, work_item.message_id)
+        else:
+            response = await self.message_processor(message, agent_id)
+        
+        if not response:
+            logger.warning("No response received from agent - Message processing failed")
             return None, 'failed'
             
+        return response, 'completed'
+    
+    async def _reconcile_blocks(self, agent_id: str) -> None:
+        """Re-read which user core block is attached to an agent."""
         try:
-            # Attach core block
-            logger.info(f"Attaching user core block {block_id[:8]}... to agent")
-            self.letta_client.agents.blocks.attach(
-                agent_id=self.agent_id,
-                block_id=block_id
-            )
-            
-            # Process the message
-            logger.info(f"Processing message with attached core block {block_id[:8]}...")
-            response = await self.message_processor(message)
-            
-            # Detach core block
-            logger.info(f"Detaching core block {block_id[:8]}... from agent")
-            self.letta_client.agents.blocks.detach(
-                agent_id=self.agent_id,
-                block_id=block_id
-            )
-            
-            if not response:
-                logger.warning("No response received from agent - Message processing failed")
-                return None, 'failed'
-                
-            return response, 'completed'
-            
+            await self.block_manager.reconcile(agent_id)
         except Exception as e:
-            logger.error(f"Error during message processing: {str(e)}")
-            # Try to detach core block even if there was an error
-            try:
-                logger.info(f"Cleaning up: Detaching core block {block_id[:8]}... from agent")
-                self.letta_client.agents.blocks.detach(
-                    agent_id=self.agent_id,
-                    block_id=block_id
-                )
-                logger.info("Core block successfully detached")
-            except Exception as detach_error:
-                logger.error(f"Failed to detach core block after error: {str(detach_error)}")
-            return None, 'failed'
+            logger.error(f"Failed to reconcile core blocks on agent {agent_id}: {str(e)}")
+            self.block_manager.forget(agent_id)
     
-    async def _route_response(self, message_id: int, response: str) -> bool:
+    async def _route_response(self, work_item: WorkItem, response: str) -> bool:
         """Route a response through the appropriate platform handler.
         
         Args:
-            message_id: ID of the message being responded to
+            work_item: The work item being responded to
             response: The response to route
             
         Returns:
@@ -133,11 +302,8 @@ class QueueProcessor:
             logger.warning("No plugin manager available for response routing")
             return False
             
-        # Get the platform profile for the message
-        profile = await get_message_platform_profile(message_id)
-        if not profile:
-            logger.error(f"Could not find platform profile for message {message_id}")
-            return False
+        profile = work_item.profile
+        message_id = work_item.message_id
             
         # Get the handler for this platform
         handler = self.plugin_manager.get_platform_handler(profile.platform)
@@ -156,110 +322,373 @@ class QueueProcessor:
             logger.error(f"Error routing response through {profile.platform} handler: {str(e)}")
             return False
     
+    def _get_streaming_handler(self, work_item: WorkItem) -> Optional[Callable]:
+        """Get the streaming handler for a work item's platform, if streaming is possible."""
+        if not self.message_streamer or not self.plugin_manager:
+            return None
+        get_handler = getattr(self.plugin_manager, 'get_streaming_handler', None)
+        return get_handler(work_item.profile.platform) if get_handler else None
+    
+    def _get_agent_lock(self, agent_id: str) -> asyncio.Lock:
+        """Get the lock serializing core block usage on an agent."""
+        if agent_id not in self._agent_locks:
+            self._agent_locks[agent_id] = asyncio.Lock()
+        return self._agent_locks[agent_id]
+    
+    async def _process_item(self, work_item: WorkItem) -> None:
+        """Process a single claimed work item from formatting to response routing.
+        
+        Items coalesced into the work item are sent together with it as one
+        turn, and every one of their messages gets the shared response.
+        
+        Args:
+            work_item: The hydrated work item to process
+        """
+        if work_item.coalesced:
+            logger.info(f"Found {len(work_item.batch)} pending messages (Queue IDs: {', '.join(str(item.id) for item in work_item.batch)})")
+            get_metrics().increment("queue_messages_coalesced_total", len(work_item.coalesced))
+        else:
+            logger.info(f"Found pending message (Queue ID: {work_item.id})")
+        
+        # Whether the agent has answered; from then on the item is never sent again
+        answered = False
+        try:
+            if work_item.message is None:
+                logger.warning(f"Message {work_item.message_id} not found in database")
+                await self.retry_scheduler.fail(work_item, PERMANENT, "Message not found")
+                return
+            
+            if work_item.platform is None:
+                logger.warning(f"Platform profile not found for message {work_item.message_id}")
+                await self.retry_scheduler.fail(work_item, PERMANENT, "Platform profile not found")
+                return
+            
+            # Format message with consistent metadata
+            formatted_message = self.formatter.format_message(
+                message="\n".join(item.message for item in work_item.batch),
+                platform_user_id=work_item.platform_user_id,
+                username=work_item.username,
+                platform=work_item.platform
+            )
+            
+            # Process message according to mode
+            streaming_handler = None
+            if self.message_mode == 'echo':
+                # Echo mode: Return the formatted message
+                logger.info("ECHO MODE: Returning formatted message")
+                response = formatted_message  # Use formatted message with metadata
+                status = 'completed'
+            else:
+                # Process with agent
+                logger.info(f"Processing message in {self.message_mode.upper()} mode")
+                streaming_handler = self._get_streaming_handler(work_item)
+                try:
+                    response, status = await self._process_with_core_block(
+                        message=formatted_message,
+                        work_item=work_item,
+                        streaming_handler=streaming_handler
+                    )
+                except CircuitOpenError as e:
+                    # Never attempted, so the items keep their place and retry budget
+                    logger.warning(f"Letta endpoint unavailable, not sending queue item {work_item.id}: {str(e)}")
+                    for item in work_item.batch:
+                        await release_queue_item(item.id, refund_attempt=True)
+                    get_metrics().increment("queue_items_requeued_total", len(work_item.batch), reason="circuit_open")
+                    return
+            answered = True
+            
+            # Shutdown must not lose a response the agent already gave
+            finishing = asyncio.create_task(self._finish_item(work_item, response, status, streaming_handler))
+            self._finishing.add(finishing)
+            finishing.add_done_callback(self._finishing.discard)
+            await asyncio.shield(finishing)
+            
+        except asyncio.CancelledError:
+            if not answered and work_item.id in self._sending:
+                # The agent may have received the message, so it is not sent again
+                logger.warning(f"Queue item {work_item.id} interrupted by shutdown while being sent")
+                try:
+                    await self.retry_scheduler.fail(work_item, UNCERTAIN, "Interrupted by shutdown")
+                except Exception as schedule_error:
+                    logger.error(f"Failed to dead-letter queue item {work_item.id}: {str(schedule_error)}")
+            raise
+        except Exception as e:
+            logger.error(f"Error processing queue item {work_item.id}: {str(e)}")
+            error_class = UNCERTAIN if answered else classify_error(e)
+            try:
+                await self.retry_scheduler.fail(work_item, error_class, str(e) or type(e).__name__)
+            except Exception as schedule_error:
+                logger.error(f"Failed to schedule retry of queue item {work_item.id}: {str(schedule_error)}")
+    
+    async def _finish_item(
+        self,
+        work_item: WorkItem,
+        response: Optional[str],
+        status: str,
+        streaming_handler: Optional[Callable]
+    ) -> None:
+        """Record the agent's answer to a work item and deliver it.
+        
+        Args:
+            work_item: The work item the agent answered
+            response: The agent's response, if any
+            status: Queue status to record for the work item's messages
+            streaming_handler: The handler the response was streamed to, if any
+        """
+        if response:
+            # Update message and queue status
+            for item in work_item.batch:
+                await update_message_with_response(item.message_id, response)
+                await update_queue_status(item.id, status)
+            
+            # Route response through platform handler (a streamed response has already been delivered)
+            if not streaming_handler and not await self._route_response(work_item, response):
+                logger.warning("Failed to route response through platform handler")
+        else:
+            # The agent answered without a response; sending the message again would not help
+            logger.warning("No response received from agent - Message processing failed")
+            await self.retry_scheduler.fail(work_item, PERMANENT, "No response received from agent")
+    
+    async def _run_item(self, work_item: WorkItem, previous: Optional[asyncio.Task] = None) -> None:
+        """Worker task wrapper that frees the user's slot when done.
+        
+        Args:
+            work_item: The work item to process
+            previous: The user's worker still delivering their previous response, if any
+        """
+        try:
+            if previous is not None:
+                # A user's next item is claimable once their previous one is
+                # marked finished, which is before its response is delivered
+                await asyncio.wait({previous})
+            await self._process_item(work_item)
+        except Exception as e:
+            logger.error(f"Worker error on queue item {work_item.id}: {str(e)}")
+        finally:
+            # Always remove from processing set and release the user
+            self.processing_messages.difference_update(item.id for item in work_item.batch)
+            self._sending.difference_update(item.id for item in work_item.batch)
+            if self._active_users.get(work_item.letta_user_id) is asyncio.current_task():
+                del self._active_users[work_item.letta_user_id]
+            self._slot_freed.set()
+            # The user's next item may now be claimable
+            self.notifier.notify_local()
+    
+    def _dispatch(self, work_item: WorkItem) -> None:
+        """Hand a work item to a new worker task, after the user's current one."""
+        self.processing_messages.update(item.id for item in work_item.batch)
+        previous = self._active_users.get(work_item.letta_user_id)
+        worker = asyncio.create_task(self._run_item(work_item, previous))
+        self._workers.add(worker)
+        worker.add_done_callback(self._workers.discard)
+        self._active_users[work_item.letta_user_id] = worker
+    
+    async def _renew_leases(self) -> None:
+        """Heartbeat that keeps the leases on in-flight items alive."""
+        interval = self.lease_seconds / 3
+        while True:
+            await asyncio.sleep(interval)
+            queue_ids = list(self.processing_messages)
+            if not queue_ids:
+                continue
+            try:
+                renewed = await renew_queue_leases(self.lease_owner, queue_ids, self.lease_seconds)
+                if renewed < len(queue_ids):
+                    logger.warning(f"Renewed {renewed} of {len(queue_ids)} leases - some items finished or were reclaimed")
+            except Exception as e:
+                logger.error(f"Failed to renew queue leases: {str(e)}")
+    
+    async def _sweep_queue(self) -> None:
+        """Expire stale pending items and recount the queue depth.
+
+        Runs at most once per refresh interval.
+        """
+        now = asyncio.get_running_loop().time()
+        if now - self._last_sweep < self.refresh_interval:
+            return
+        self._last_sweep = now
+        try:
+            expired = await expire_queue_items(self.ttl_seconds, self.platform_ttl_seconds)
+            depth = await get_queue_depth().sync()
+        except Exception as e:
+            logger.error(f"Failed to sweep the queue: {str(e)}")
+            return
+        get_metrics().set_gauge("queue_depth", depth)
+        if expired:
+            logger.warning(f"Expired {expired} queue items older than their TTL")
+            get_metrics().increment("queue_items_expired_total", expired)
+    
+    def _is_orphaned_owner(self, lease_owner: str) -> bool:
+        """Whether a lease owner is a processor on this host that no longer runs.
+
+        Owners on other hosts cannot be checked; their items are recovered
+        once their leases expire.
+        """
+        try:
+            host, pid, token = lease_owner.rsplit(":", 2)
+            pid = int(pid)
+        except ValueError:
+            return False
+        if host != socket.gethostname() or lease_owner == self.lease_owner:
+            return False
+        if pid == os.getpid():
+            # An earlier run that had the same process ID, e.g. in a container
+            return True
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+    
+    async def _recover_orphaned_items(self) -> None:
+        """Requeue items left in flight by processors that crashed or were killed."""
+        try:
+            recovered = await recover_orphaned_queue_items(self._is_orphaned_owner)
+        except Exception as e:
+            logger.error(f"Failed to recover orphaned queue items: {str(e)}")
+            return
+        if recovered:
+            logger.warning(f"Recovered {recovered} queue items orphaned by a previous run")
+            get_metrics().increment("queue_items_recovered_total", recovered)
+    
+    async def _drain(self) -> None:
+        """Let in-flight items finish, then release the ones that did not.
+
+        Workers get up to `drain_timeout` seconds; leases keep being renewed
+        meanwhile. Workers still running after that are cancelled. Items not
+        yet sent to the agent are put back in the queue with the attempt
+        refunded, so the next processor picks them up immediately instead of
+        after the lease expires. Items interrupted while being sent may have
+        reached the agent and are dead-lettered as uncertain instead, and
+        responses already received are still recorded and delivered.
+        """
+        workers = set(self._workers)
+        if not workers:
+            return
+        logger.info(f"Waiting up to {self.drain_timeout:g}s for {len(workers)} in-flight item(s) to finish")
+        _, unfinished = await asyncio.wait(workers, timeout=self.drain_timeout)
+        if not unfinished:
+            return
+        
+        # Nothing runs between taking this snapshot and cancelling the workers
+        unsent = [queue_id for queue_id in self.processing_messages if queue_id not in self._sending]
+        for worker in unfinished:
+            worker.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+        if self._finishing:
+            await asyncio.gather(*self._finishing, return_exceptions=True)
+        try:
+            released = await release_queue_leases(self.lease_owner, "Interrupted by shutdown", unsent)
+        except Exception as e:
+            logger.error(f"Failed to release in-flight queue items: {str(e)}")
+            return
+        logger.warning(f"Released {released} queue item(s) still in flight after {self.drain_timeout:g}s")
+        get_metrics().increment("queue_items_released_total", released)
+    
+    async def _wait_for_stop(self, timeout: float) -> None:
+        """Wait until the processor is stopped or the timeout elapses."""
+        try:
+            await asyncio.wait_for(self._stop_event.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+    
+    async def _wait_for_slot(self, timeout: float) -> None:
+        """Wait until a worker finishes, the processor is stopped, or the timeout elapses."""
+        waiters = [asyncio.ensure_future(self._slot_freed.wait()), asyncio.ensure_future(self._stop_event.wait())]
+        try:
+            await asyncio.wait(waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+    
     async def start(self) -> None:
-        """Start processing the queue."""
+        """Start processing the queue.
+        
+        Items are dispatched to up to `max_workers` concurrent workers. Each
+        Letta user has at most one item in flight, so a user's messages are
+        still processed strictly in order. Items are claimed with a lease that
+        is renewed while they are in flight, so several processors can share
+        one database.
+        """
         if self.is_running:
             logger.warning("Queue processor is already running")
             return
             
         self.is_running = True
         self._stop_event.clear()
-        logger.info(f"Queue processor started in {self.message_mode.upper()} mode")
+        self._stopped.clear()
+        logger.info(
+            f"Queue processor started in {self.message_mode.upper()} mode with {self.max_workers} workers "
+            f"and {len(self.agent_pool)} agent(s)"
+        )
+        if self.max_workers < len(self.agent_pool):
+            logger.warning(f"Only {self.max_workers} of {len(self.agent_pool)} agents can be used at once; raise queue.workers")
+        
+        # Pick up items and core blocks left behind by a previous run
+        await self._recover_orphaned_items()
+        for agent_id in self.agent_pool.agent_ids:
+            await self._reconcile_blocks(agent_id)
+        
+        heartbeat_task = asyncio.create_task(self._renew_leases())
+        self.notifier.listen()
+        idle_interval = self.poll_min_seconds
+        paused = False
         
         try:
             while self.is_running and not self._stop_event.is_set():
                 try:
-                    # Get next message from queue
-                    queue_item = await get_pending_queue_item()
-                    if not queue_item:
-                        await asyncio.sleep(1)  # Wait before checking again
+                    self._slot_freed.clear()
+                    
+                    free_slots = self.max_workers - len(self._active_users)
+                    if free_slots <= 0:
+                        await self._wait_for_slot(timeout=1)
                         continue
                     
-                    # Skip if already processing this message
-                    if queue_item.id in self.processing_messages:
-                        await asyncio.sleep(1)
+                    # Leave items in the queue while the Letta endpoint is down
+                    pause = self.breaker.retry_after() if self.message_mode != 'echo' else 0
+                    if pause > 0:
+                        if not paused:
+                            logger.warning("Letta endpoint unavailable - pausing queue processing")
+                            paused = True
+                            get_metrics().set_gauge("queue_paused", 1)
+                        await self._wait_for_stop(timeout=pause)
                         continue
+                    if paused:
+                        logger.info("Resuming queue processing")
+                        paused = False
+                        get_metrics().set_gauge("queue_paused", 0)
                     
-                    self.processing_messages.add(queue_item.id)
-                    logger.info(f"Found pending message (Queue ID: {queue_item.id})")
+                    await self._sweep_queue()
                     
-                    try:
-                        # Get message details
-                        message_data = await get_message_text(queue_item.message_id)
-                        if not message_data:
-                            logger.warning(f"Message {queue_item.message_id} not found in database")
-                            await update_queue_status(queue_item.id, 'failed')
-                            self.processing_messages.remove(queue_item.id)
-                            continue
-                        
-                        _, message_text = message_data  # Get the message text (second element) instead of role
-                        
-                        # Get user details
-                        user_data = await get_user_details(queue_item.letta_user_id)
-                        if not user_data:
-                            logger.warning(f"User details not found for Letta user {queue_item.letta_user_id}")
-                            await update_queue_status(queue_item.id, 'failed')
-                            self.processing_messages.remove(queue_item.id)
-                            continue
-                            
-                        display_name, username = user_data
-                        
-                        # Format message with consistent metadata
-                        platform_profile = await get_platform_profile_id(queue_item.letta_user_id)
-                        if not platform_profile:
-                            logger.warning(f"Platform profile not found for Letta user {queue_item.letta_user_id}")
-                            await update_queue_status(queue_item.id, 'failed')
-                            self.processing_messages.remove(queue_item.id)
-                            continue
-                            
-                        platform_profile_id, platform_user_id = platform_profile
-                        
-                        # Get platform name from profile
-                        from database.operations.users import get_platform_profile
-                        profile = await get_platform_profile(platform_profile_id)
-                        platform_name = profile.platform if profile else None
-                        
-                        formatted_message = self.formatter.format_message(
-                            message=message_text,
-                            platform_user_id=platform_user_id,
-                            username=username,
-                            platform=platform_name
-                        )
-                        
-                        # Process message according to mode
-                        if self.message_mode == 'echo':
-                            # Echo mode: Return the formatted message
-                            logger.info("ECHO MODE: Returning formatted message")
-                            response = formatted_message  # Use formatted message with metadata
-                            status = 'completed'
+                    # Claim the next message of every idle user
+                    sequence = self.notifier.sequence
+                    work_items = await claim_work_items(
+                        lease_owner=self.lease_owner,
+                        lease_seconds=self.lease_seconds,
+                        limit=free_slots,
+                        coalesce_window_seconds=self.coalesce_window_seconds,
+                        coalesce_max_messages=self.coalesce_max_messages,
+                        select_heads=self.scheduler.select if self.scheduler else None
+                    )
+                    if not work_items:
+                        # Sleep until notified, backing off the fallback poll while idle
+                        if await self.notifier.wait(timeout=idle_interval, since=sequence):
+                            idle_interval = self.poll_min_seconds
                         else:
-                            # Process with agent
-                            logger.info(f"Processing message in {self.message_mode.upper()} mode")
-                            response, status = await self._process_with_core_block(
-                                message=formatted_message,
-                                letta_user_id=queue_item.letta_user_id
-                            )
-                        
-                        if response:
-                            # Update message and queue status
-                            await update_message_with_response(queue_item.message_id, response)
-                            await update_queue_status(queue_item.id, status)
-                            
-                            # Route response through platform handler
-                            if not await self._route_response(queue_item.message_id, response):
-                                logger.warning("Failed to route response through platform handler")
-                        else:
-                            # Mark as failed if no response
-                            await update_queue_status(queue_item.id, 'failed')
-                            logger.warning("No response received from agent - Message processing failed")
-                        
-                    except Exception as e:
-                        logger.error(f"Error processing queue item {queue_item.id}: {str(e)}")
-                        await update_queue_status(queue_item.id, 'failed')
-                        
-                    finally:
-                        # Always remove from processing set
-                        self.processing_messages.remove(queue_item.id)
+                            idle_interval = min(idle_interval * 2, max(self.refresh_interval, self.poll_min_seconds))
+                        continue
+                    
+                    idle_interval = self.poll_min_seconds
+                    
+                    for work_item in work_items:
+                        # Skip if already processing this message
+                        if work_item.id in self.processing_messages:
+                            continue
+                        if self.scheduler:
+                            self.scheduler.charge(work_item.letta_user_id, len(work_item.batch))
+                        self._dispatch(work_item)
                         
                 except asyncio.CancelledError:
                     logger.info("Queue processor received cancellation signal")
@@ -269,23 +698,32 @@ class QueueProcessor:
                     await asyncio.sleep(1)  # Wait before retrying
                     
         finally:
-            self.is_running = False
-            logger.info("Queue processor stopped")
+            self.notifier.close()
+            try:
+                await self._drain()
+            finally:
+                heartbeat_task.cancel()
+                self.is_running = False
+                self._stopped.set()
+                logger.info("Queue processor stopped")
     
     async def stop(self) -> None:
-        """Stop processing the queue."""
+        """Stop processing the queue.
+        
+        Waits for in-flight items to finish for up to `drain_timeout`
+        seconds; the rest are released back to the queue unless they were
+        already being sent to the agent.
+        """
         if not self.is_running:
             return
             
         logger.info("Stopping queue processor...")
         self._stop_event.set()
-        self.is_running = False
-        
-        # Wait for any in-progress messages to complete
-        while self.processing_messages:
-            await asyncio.sleep(0.1)
+        self.notifier.notify_local()
+        await self._stopped.wait()
         
-        logger.info("Queue processor stopped")
+        # Don't leave a user's core block attached to the agent while we're gone
+        await self.block_manager.release_all()
     
     def set_message_mode(self, mode: str) -> None:
         """Update the message processing mode."""
@@ -0,0 +1,273 @@
+"""Circuit breaking, retries and deadlines for calls to the Letta endpoint.
+
+- A circuit breaker trips after consecutive endpoint failures and refuses
+  calls until a cool-down has passed, then lets a single probe call through.
+  The queue processor pauses while it is open instead of failing items.
+- Retries back off exponentially with full jitter. Calls that may have
+  reached the server (sending a message, creating resources) are only
+  retried when the server cannot have acted on them. A message send that
+  failed after the server may have acted on it is never repeated, not even
+  by the queue (see `may_have_acted`).
+- Deadlines are set per attempt at a queue item, from when it was claimed,
+  and propagate to every call made on its behalf through a context variable.
+"""
+import asyncio
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional
+
+import httpx
+
+from common.config import get_settings_section
+from common.exceptions import CircuitOpenError
+from common.metrics import get_metrics
+
+# Defaults for the "resilience" section of settings.json
+DEFAULT_RESILIENCE_SETTINGS = {
+    "failure_threshold": 5,
+    "reset_timeout": 30,
+    "max_attempts": 3,
+    "backoff_base": 0.5,
+    "backoff_max": 10,
+    "hedge_after": 0,
+    "item_deadline": 900
+}
+
+# Status codes meaning the server is overloaded or unreachable
+RETRYABLE_STATUS_CODES = {429, 502, 503, 504}
+
+# Status codes meaning the server did not act on the request
+NOT_PROCESSED_STATUS_CODES = {429, 503}
+
+logger = logging.getLogger(__name__)
+
+# Circuit states, exported as the letta_circuit_state gauge
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+def get_status_code(error: BaseException) -> Optional[int]:
+    """Get the HTTP status code carried by an SDK or httpx error, if any."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        response = getattr(error, "response", None)
+        status_code = getattr(response, "status_code", None)
+    return status_code if isinstance(status_code, int) else None
+
+def is_endpoint_failure(error: BaseException) -> bool:
+    """Whether an error means the endpoint is down, overloaded or too slow."""
+    if isinstance(error, (asyncio.TimeoutError, httpx.TransportError)):
+        return True
+    status_code = get_status_code(error)
+    return status_code is not None and (status_code >= 500 or status_code == 429)
+
+def is_retryable(error: BaseException, idempotent: bool) -> bool:
+    """Whether a failed call may be repeated.
+
+    Args:
+        error: The error the call failed with
+        idempotent: Whether repeating the call is harmless even if the
+            server already acted on it
+    """
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+        # The request never reached the server
+        return True
+    status_code = get_status_code(error)
+    if status_code in NOT_PROCESSED_STATUS_CODES:
+        return True
+    if not idempotent:
+        return False
+    return isinstance(error, (asyncio.TimeoutError, httpx.TransportError)) or status_code in RETRYABLE_STATUS_CODES
+
+def may_have_acted(error: BaseException) -> bool:
+    """Whether the server may have acted on a request that failed with an error.
+
+    Only a failed connection, a rejection (4xx) or an overload response
+    (503) shows that the request was not processed; after a timeout, a
+    dropped connection, another 5xx or an unexpected error it may have been.
+    """
+    if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+        return False
+    status_code = get_status_code(error)
+    if status_code is not None:
+        return status_code >= 500 and status_code not in NOT_PROCESSED_STATUS_CODES
+    return True
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    Closed: calls pass; `failure_threshold` endpoint failures in a row open
+    the circuit. Open: calls are refused with CircuitOpenError until
+    `reset_timeout` seconds have passed. Half-open: one probe call is let
+    through; its success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        """Initialize the breaker.
+
+        Args:
+            name: Name used in logs and metric labels
+            failure_threshold: Consecutive failures that open the circuit
+            reset_timeout: Seconds the circuit stays open before a probe
+        """
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        get_metrics().set_gauge("letta_circuit_state", _STATE_VALUES[CLOSED], circuit=name)
+
+    def _transition(self, state: str) -> None:
+        """Move to a new state, logging and recording the transition."""
+        if state == self.state:
+            return
+        previous, self.state = self.state, state
+        metrics = get_metrics()
+        metrics.increment("letta_circuit_transitions_total", circuit=self.name, from_state=previous, to_state=state)
+        metrics.set_gauge("letta_circuit_state", _STATE_VALUES[state], circuit=self.name)
+        if state == OPEN:
+            logger.warning(f"Circuit {self.name} opened after {self.failures} failures; pausing for {self.reset_timeout}s")
+        else:
+            logger.info(f"Circuit {self.name} {previous} -> {state}")
+
+    def retry_after(self) -> float:
+        """Seconds until a call would be let through, 0 if it would be now."""
+        if self.state == CLOSED:
+            return 0.0
+        if self.state == OPEN:
+            return max(0.0, self._opened_at + self.reset_timeout - time.monotonic())
+        # Half-open: wait for the probe's outcome
+        return 1.0 if self._probe_in_flight else 0.0
+
+    def before_call(self) -> None:
+        """Check that a call may be made.
+
+        Raises:
+            CircuitOpenError: If the circuit is open or a probe is already in flight
+        """
+        if self.state == OPEN and self.retry_after() == 0:
+            self._transition(HALF_OPEN)
+        if self.state == OPEN or (self.state == HALF_OPEN and self._probe_in_flight):
+            raise CircuitOpenError(f"Letta endpoint unavailable (circuit {self.name} is {self.state})")
+        if self.state == HALF_OPEN:
+            self._probe_in_flight = True
+
+    def record_success(self) -> None:
+        """Record a call that reached a working endpoint."""
+        self.failures = 0
+        self._probe_in_flight = False
+        self._transition(CLOSED)
+
+    def record_inconclusive(self) -> None:
+        """Record a call that ended without showing whether the endpoint works."""
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        """Record an endpoint failure."""
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self._opened_at = time.monotonic()
+            self._transition(OPEN)
+
+class RetryPolicy:
+    """Exponential backoff with full jitter, bounded by attempts and deadline."""
+
+    def __init__(self, max_attempts: int = 3, backoff_base: float = 0.5, backoff_max: float = 10, hedge_after: float = 0):
+        """Initialize the policy.
+
+        Args:
+            max_attempts: Attempts per call, including the first
+            backoff_base: Backoff ceiling for the first retry, in seconds
+            backoff_max: Largest backoff ceiling, in seconds
+            hedge_after: Seconds after which a slow idempotent call gets a
+                second, parallel attempt; 0 disables hedging
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_after = hedge_after
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number `attempt` (1 for the first retry)."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+# Absolute deadline (time.time()) of the work the current task is doing
+_deadline: ContextVar[Optional[float]] = ContextVar("letta_deadline", default=None)
+
+@contextmanager
+def deadline(at: Optional[float]) -> Iterator[None]:
+    """Bound every Letta call made in this context by an absolute deadline.
+
+    Nested deadlines can only tighten the enclosing one.
+
+    Args:
+        at: Deadline as a time.time() timestamp, or None for no deadline
+    """
+    current = _deadline.get()
+    if at is not None and current is not None:
+        at = min(at, current)
+    token = _deadline.set(at if at is not None else current)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def remaining_time() -> Optional[float]:
+    """Seconds left until the current deadline, or None if there is none."""
+    at = _deadline.get()
+    return None if at is None else at - time.time()
+
+async def hedged(attempt: Callable[[], Awaitable[Any]], hedge_after: float, on_hedge: Callable[[], None]) -> Any:
+    """Run an idempotent attempt, starting a second one if the first is slow.
+
+    Returns the result of whichever attempt succeeds first; fails only if
+    both fail.
+    """
+    first = asyncio.ensure_future(attempt())
+    done, _ = await asyncio.wait({first}, timeout=hedge_after)
+    if done:
+        return first.result()
+
+    on_hedge()
+    pending = {first, asyncio.ensure_future(attempt())}
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+# One breaker per endpoint, shared by every client of it
+_breakers: Dict[str, CircuitBreaker] = {}
+
+def get_circuit_breaker(name: str = "letta") -> CircuitBreaker:
+    """Get the shared circuit breaker for an endpoint."""
+    if name not in _breakers:
+        settings = get_settings_section("resilience", DEFAULT_RESILIENCE_SETTINGS)
+        _breakers[name] = CircuitBreaker(
+            name,
+            failure_threshold=int(settings["failure_threshold"]),
+            reset_timeout=float(settings["reset_timeout"])
+        )
+    return _breakers[name]
+
+def get_retry_policy() -> RetryPolicy:
+    """Get the retry policy configured in settings.json."""
+    settings = get_settings_section("resilience", DEFAULT_RESILIENCE_SETTINGS)
+    return RetryPolicy(
+        max_attempts=int(settings["max_attempts"]),
+        backoff_base=float(settings["backoff_base"]),
+        backoff_max=float(settings["backoff_max"]),
+        hedge_after=float(settings["hedge_after"])
+    )
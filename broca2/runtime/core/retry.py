@@ -0,0 +1,123 @@
+"""Retry scheduling for queue items whose processing failed.
+
+Failures are sorted into error classes, each with its own policy:
+
+- transient: the Letta endpoint failed before it could act on the message
+  (connection failed, 503 or 429, circuit open), or an unexpected error
+  occurred before the message was sent. Retried with exponential backoff
+  and full jitter until the item has been retried `max_retries` times.
+- uncertain: the message may already have reached the agent, or part of
+  the response may already have been delivered. Sending it again could
+  give the user a duplicate reply and the agent a duplicate turn, so it is
+  dead-lettered right away.
+- permanent: the item cannot succeed as it is, e.g. its message is gone or
+  the agent rejected it. Dead-lettered right away.
+- expired: the item's deadline passed before it could be processed.
+  Dead-lettered right away.
+
+Dead-lettered items leave the queue; `qtool dead replay` queues them again.
+"""
+import logging
+from typing import Dict, Optional
+
+from common.config import get_settings_section
+from common.exceptions import DeadlineExceededError, DeliveryUncertainError, LettaUnavailableError
+from common.metrics import get_metrics
+from database.models import WorkItem
+from database.operations.queue import dead_letter_queue_item, schedule_queue_retry
+from .resilience import RetryPolicy, get_status_code, is_endpoint_failure
+
+# Error classes
+TRANSIENT, PERMANENT, EXPIRED, UNCERTAIN = "transient", "permanent", "expired", "uncertain"
+
+# Policies an error class can have
+RETRY, DEAD_LETTER = "retry", "dead_letter"
+
+# Defaults for the "retry" section of settings.json
+DEFAULT_RETRY_SETTINGS = {
+    "backoff_base": 5,
+    "backoff_max": 600,
+    "policies": {
+        TRANSIENT: RETRY,
+        PERMANENT: DEAD_LETTER,
+        EXPIRED: DEAD_LETTER,
+        UNCERTAIN: DEAD_LETTER
+    }
+}
+
+logger = logging.getLogger(__name__)
+
+def classify_error(error: BaseException) -> str:
+    """Get the error class of an error a queue item failed with."""
+    if isinstance(error, DeliveryUncertainError):
+        return UNCERTAIN
+    if isinstance(error, DeadlineExceededError):
+        return EXPIRED
+    if isinstance(error, LettaUnavailableError) or is_endpoint_failure(error):
+        return TRANSIENT
+    status_code = get_status_code(error)
+    if status_code is not None and 400 <= status_code < 500 and status_code not in (408, 429):
+        # The endpoint rejected the request itself
+        return PERMANENT
+    if isinstance(error, (ValueError, TypeError, KeyError)):
+        return PERMANENT
+    return TRANSIENT
+
+class RetryScheduler:
+    """Decides what happens to a queue item whose processing failed."""
+
+    def __init__(
+        self,
+        max_retries: int = 3,
+        backoff_base: float = 5,
+        backoff_max: float = 600,
+        policies: Optional[Dict[str, str]] = None
+    ):
+        """Initialize the scheduler.
+
+        Args:
+            max_retries: Retries of an item after its first attempt
+            backoff_base: Backoff ceiling for the first retry, in seconds
+            backoff_max: Largest backoff ceiling, in seconds
+            policies: Policy ('retry' or 'dead_letter') per error class
+        """
+        self.max_retries = max_retries
+        self.backoff = RetryPolicy(backoff_base=backoff_base, backoff_max=backoff_max).backoff
+        self.policies = {**DEFAULT_RETRY_SETTINGS["policies"], **(policies or {})}
+
+    async def fail(self, work_item: WorkItem, error_class: str, error: Optional[str] = None) -> None:
+        """Schedule a retry of a failed item, or dead-letter it.
+
+        Items coalesced into the work item share its fate and are retried
+        after the same delay, so they can be coalesced again.
+
+        Args:
+            work_item: The item whose attempt failed
+            error_class: Class of the error it failed with
+            error: Description of the error
+        """
+        metrics = get_metrics()
+        retry = self.policies.get(error_class, RETRY) == RETRY
+        delay = self.backoff(work_item.attempts)
+        for item in work_item.batch:
+            if retry and item.attempts <= self.max_retries:
+                await schedule_queue_retry(item.id, delay, error)
+                metrics.increment("queue_items_requeued_total", reason=error_class)
+                logger.info(
+                    f"Queue item {item.id} will be retried in {delay:.1f}s "
+                    f"(retry {item.attempts} of {self.max_retries}): {error}"
+                )
+            else:
+                await dead_letter_queue_item(item.id, error_class, error)
+                metrics.increment("queue_items_dead_lettered_total", error_class=error_class)
+                logger.warning(f"Queue item {item.id} dead-lettered after {item.attempts} attempt(s) ({error_class}): {error}")
+
+def get_retry_scheduler(max_retries: int) -> RetryScheduler:
+    """Get a retry scheduler configured from settings.json."""
+    settings = get_settings_section("retry", DEFAULT_RETRY_SETTINGS)
+    return RetryScheduler(
+        max_retries=max_retries,
+        backoff_base=float(settings["backoff_base"]),
+        backoff_max=float(settings["backoff_max"]),
+        policies=settings["policies"]
+    )
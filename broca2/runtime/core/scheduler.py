@@ -0,0 +1,121 @@
+"""Fair scheduling of queue work across users."""
+import math
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from database.models import QueueHead
+
+class FairScheduler:
+    """Deficit round robin over the users with queued work.
+
+    Every user with unfinished items has a place in a round-robin ring and
+    a deficit counter. Each time the scheduler looks for work it walks the
+    ring, adding the user's quantum (the weight of their platform) to their
+    deficit; a user is served once their deficit covers at least one
+    message, and is charged for the messages actually sent. Served users
+    move to the back of the ring, so a user who floods the queue gets one
+    turn per round like everyone else instead of holding every worker until
+    their backlog drains.
+    """
+
+    def __init__(self, platform_weights: Optional[Dict[str, float]] = None):
+        """Initialize the scheduler.
+
+        Args:
+            platform_weights: Quantum per platform, 1 for platforms not listed.
+                A platform with weight 0.5 gets a turn every other round.
+        """
+        self.platform_weights = {
+            platform: float(weight)
+            for platform, weight in (platform_weights or {}).items()
+            if float(weight) > 0
+        }
+        self._ring: "OrderedDict[int, float]" = OrderedDict()  # letta_user_id -> deficit
+
+    def _quantum(self, head: QueueHead) -> float:
+        """Deficit a user gains per round."""
+        return self.platform_weights.get(head.platform, 1.0)
+
+    def select(self, heads: List[QueueHead], limit: int) -> List[QueueHead]:
+        """Choose which users' head items to claim.
+
+        Args:
+            heads: Head item of every user with unfinished items
+            limit: Maximum number of items to choose
+
+        Returns:
+            List[QueueHead]: Claimable heads in the order they were chosen
+        """
+        by_user = {head.letta_user_id: head for head in heads}
+
+        # Users whose backlog drained lose their place and deficit; new users join at the back
+        for letta_user_id in [user for user in self._ring if user not in by_user]:
+            del self._ring[letta_user_id]
+        for head in heads:
+            self._ring.setdefault(head.letta_user_id, 0.0)
+
+        waiting = [user for user in self._ring if by_user[user].claimable]
+        if not waiting or limit <= 0:
+            return []
+
+        chosen: List[QueueHead] = []
+        while waiting and len(chosen) < limit:
+            # Skip the rounds in which nobody would be served
+            idle_rounds = min(
+                math.ceil((1 - self._ring[user]) / self._quantum(by_user[user])) for user in waiting
+            ) - 1
+            for letta_user_id in waiting:
+                if idle_rounds > 0:
+                    self._ring[letta_user_id] += idle_rounds * self._quantum(by_user[letta_user_id])
+
+            for letta_user_id in list(waiting):
+                if self._ring[letta_user_id] < 1:
+                    self._ring[letta_user_id] += self._quantum(by_user[letta_user_id])
+                if self._ring[letta_user_id] >= 1:
+                    chosen.append(by_user[letta_user_id])
+                    waiting.remove(letta_user_id)
+                    if len(chosen) >= limit:
+                        break
+
+        for head in chosen:
+            self._ring.move_to_end(head.letta_user_id)
+        return chosen
+
+    def charge(self, letta_user_id: int, messages: int = 1) -> None:
+        """Charge a user for the messages sent on their turn."""
+        if letta_user_id in self._ring:
+            self._ring[letta_user_id] -= messages
+
+class DeadlineScheduler:
+    """Earliest deadline first over the users with queued work.
+
+    A message's deadline is the time it was queued plus the response
+    deadline of its platform, so platforms whose users expect quick replies
+    go ahead of slower ones, and messages that have waited longest go first
+    among equals.
+    """
+
+    def __init__(self, response_seconds: float = 60, platform_response_seconds: Optional[Dict[str, float]] = None):
+        """Initialize the scheduler.
+
+        Args:
+            response_seconds: Response deadline for platforms not listed
+            platform_response_seconds: Response deadline per platform
+        """
+        self.response_seconds = float(response_seconds)
+        self.platform_response_seconds = {
+            platform: float(seconds) for platform, seconds in (platform_response_seconds or {}).items()
+        }
+
+    def deadline(self, head: QueueHead) -> float:
+        """A head item's deadline in epoch milliseconds."""
+        seconds = self.platform_response_seconds.get(head.platform, self.response_seconds)
+        return (head.timestamp_ms or 0) + seconds * 1000
+
+    def select(self, heads: List[QueueHead], limit: int) -> List[QueueHead]:
+        """Choose the claimable heads with the earliest deadlines."""
+        claimable = [head for head in heads if head.claimable]
+        return sorted(claimable, key=lambda head: (self.deadline(head), head.id))[:max(0, limit)]
+
+    def charge(self, letta_user_id: int, messages: int = 1) -> None:
+        """Nothing to account for; deadlines alone decide the order."""
@@ -0,0 +1,220 @@
+"""Test configuration and fixtures for the core runtime and database."""
+import asyncio
+import importlib.util
+import sqlite3
+import time
+from types import ModuleType, SimpleNamespace
+from typing import Dict, List, Optional
+
+import pytest
+import pytest_asyncio
+
+import database.connection as connection
+import database.depth as depth
+import database.notify as notify
+from database.connection import DatabaseManager
+from database.notify import QueueNotifier
+from database.operations.messages import insert_message
+from database.operations.queue import add_to_queue
+from database.operations.shared import check_and_migrate_db, initialize_database
+
+def load_module_copy(name: str) -> ModuleType:
+    """Load a private copy of a module, untouched by patches on the shared one.
+
+    The telegram_bot plugin tests patch some names (e.g. LettaClient) for
+    the rest of the session when they are imported.
+    """
+    spec = importlib.util.find_spec(name)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+@pytest_asyncio.fixture
+async def database(tmp_path, monkeypatch):
+    """A fresh, fully migrated database used by every database operation."""
+    manager = DatabaseManager(str(tmp_path / "sanctum.db"), readers=2)
+    monkeypatch.setattr(connection, "_database", manager)
+    monkeypatch.setattr(notify, "_queue_notifier", QueueNotifier(str(tmp_path / "sanctum.db.notify")))
+    monkeypatch.setattr(depth, "_queue_depth", None)
+    await manager.open()
+    await initialize_database()
+    await check_and_migrate_db()
+    yield manager
+    await manager.close()
+
+@pytest_asyncio.fixture
+async def users(database):
+    """Three users, each with a Telegram profile; returns their Letta user IDs."""
+    for user_id in (1, 2, 3):
+        await database.execute(
+            "INSERT INTO letta_users (id, created_at, last_active, letta_block_id) VALUES (?, 'x', 'x', ?)",
+            (user_id, f"block-{user_id}")
+        )
+        await database.execute(
+            "INSERT INTO platform_profiles (id, letta_user_id, platform, platform_user_id, username, display_name) "
+            "VALUES (?, ?, 'telegram', ?, ?, ?)",
+            (user_id, user_id, str(1000 + user_id), f"user{user_id}", f"User {user_id}")
+        )
+    return [1, 2, 3]
+
+@pytest.fixture
+def queue_message(users):
+    """Store a message from a user and queue it; returns the message ID."""
+    async def _queue_message(letta_user_id: int, text: str = "hello", platform_profile_id: Optional[int] = None) -> int:
+        message_id = await insert_message(letta_user_id, platform_profile_id or letta_user_id, "user", text)
+        await add_to_queue(letta_user_id, message_id)
+        return message_id
+    return _queue_message
+
+@pytest.fixture
+def get_item(database):
+    """Read a queue row as a dict of its columns, or None if it is gone."""
+    async def _get_item(queue_id: int) -> Optional[dict]:
+        columns = [row[1] for row in await database.fetchall("PRAGMA table_info(queue)")]
+        row = await database.fetchone("SELECT * FROM queue WHERE id = ?", (queue_id,))
+        return dict(zip(columns, row)) if row else None
+    return _get_item
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock the test moves forward by hand; for synchronous tests only."""
+    now = [1000.0]
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+class FakeLettaClient:
+    """Tracks the core blocks attached to each agent and records block calls."""
+
+    def __init__(self):
+        self.calls: List[tuple] = []
+        self.attached: Dict[str, List[str]] = {}
+
+    async def list_agent_blocks(self, agent_id: str) -> List[SimpleNamespace]:
+        return [SimpleNamespace(id=block_id) for block_id in self.attached.get(agent_id, [])]
+
+    async def attach_block(self, agent_id: str, block_id: str) -> None:
+        self.calls.append(("attach", agent_id, block_id))
+        self.attached.setdefault(agent_id, []).append(block_id)
+
+    async def detach_block(self, agent_id: str, block_id: str) -> None:
+        self.calls.append(("detach", agent_id, block_id))
+        self.attached[agent_id].remove(block_id)
+
+    async def create_identity(self, **identity_data) -> SimpleNamespace:
+        self.calls.append(("create_identity", identity_data["name"]))
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(id=f"identity-{len(self.calls)}")
+
+    async def create_block(self, **block_data) -> SimpleNamespace:
+        self.calls.append(("create_block", block_data["label"]))
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(id=f"block-new-{len(self.calls)}")
+
+    async def update_identity(self, identity_id: str, **identity_data) -> None:
+        self.calls.append(("update_identity", identity_id, identity_data["name"]))
+
+    async def update_block(self, block_id: str, **block_data) -> None:
+        self.calls.append(("update_block", block_id))
+
+@pytest.fixture
+def letta_client(monkeypatch):
+    """A fake Letta client handed to queue processors, with AGENT_ID set."""
+    import runtime.core.queue as runtime_queue
+    client = FakeLettaClient()
+    monkeypatch.setenv("AGENT_ID", "agent-a")
+    monkeypatch.setattr(runtime_queue, "get_letta_client", lambda: client)
+    return client
+
+# The tables as they were created before the schema was versioned
+OLD_SCHEMA = (
+    """
+    CREATE TABLE letta_users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        last_active TEXT,
+        letta_identity_id TEXT,
+        letta_block_id TEXT,
+        agent_preferences TEXT,
+        custom_instructions TEXT,
+        is_active INTEGER DEFAULT 1
+    )
+    """,
+    """
+    CREATE TABLE platform_profiles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        letta_user_id INTEGER,
+        platform TEXT,
+        platform_user_id TEXT,
+        username TEXT,
+        display_name TEXT,
+        metadata TEXT,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        last_active TEXT,
+        FOREIGN KEY (letta_user_id) REFERENCES letta_users(id),
+        UNIQUE(platform, platform_user_id)
+    )
+    """,
+    """
+    CREATE TABLE messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        letta_user_id INTEGER,
+        platform_profile_id INTEGER,
+        role TEXT,
+        message TEXT,
+        timestamp TEXT,
+        processed INTEGER DEFAULT 0,
+        agent_response TEXT,
+        FOREIGN KEY (letta_user_id) REFERENCES letta_users(id),
+        FOREIGN KEY (platform_profile_id) REFERENCES platform_profiles(id)
+    )
+    """,
+    """
+    CREATE TABLE queue (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        letta_user_id INTEGER,
+        message_id INTEGER,
+        status TEXT,
+        attempts INTEGER DEFAULT 0,
+        timestamp TEXT DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (letta_user_id) REFERENCES letta_users(id),
+        FOREIGN KEY (message_id) REFERENCES messages(id)
+    )
+    """,
+)
+
+# Text timestamps in the formats old rows were written with
+OLD_MESSAGE_TIMESTAMPS = (
+    "2024-03-01T12:30:00.250000",
+    "2024-03-01 12:31 UTC",
+    "2024-03-01 12:32:00",
+    "not a timestamp",
+)
+
+@pytest_asyncio.fixture
+async def old_database(tmp_path, monkeypatch):
+    """A database with the unversioned schema and a few rows in it."""
+    path = str(tmp_path / "sanctum.db")
+    with sqlite3.connect(path) as db:
+        for statement in OLD_SCHEMA:
+            db.execute(statement)
+        db.execute("INSERT INTO letta_users (id, last_active) VALUES (1, 'x')")
+        db.execute(
+            "INSERT INTO platform_profiles (id, letta_user_id, platform, platform_user_id, username, display_name) "
+            "VALUES (1, 1, 'telegram', '1001', 'user1', 'User 1')"
+        )
+        for message_id, timestamp in enumerate(OLD_MESSAGE_TIMESTAMPS, start=1):
+            db.execute(
+                "INSERT INTO messages (id, letta_user_id, platform_profile_id, role, message, timestamp) "
+                "VALUES (?, 1, 1, 'user', ?, ?)",
+                (message_id, f"message {message_id}", timestamp)
+            )
+        db.execute(
+            "INSERT INTO queue (letta_user_id, message_id, status, timestamp) "
+            "VALUES (1, 1, 'pending', '2024-03-01 12:30:01')"
+        )
+
+    manager = DatabaseManager(path, readers=1)
+    monkeypatch.setattr(connection, "_database", manager)
+    await manager.open()
+    yield manager
+    await manager.close()
@@ -0,0 +1,149 @@
+"""Tests for write-behind recording of last_active times."""
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+
+import database.activity as activity
+import database.profile_cache as profile_cache
+import runtime.core.provisioner as provisioner
+from database.activity import ActivityTracker
+from database.profile_cache import ProfileCache
+
+from .conftest import load_module_copy
+
+# The telegram_bot plugin tests patch these functions on the shared module
+users_module = load_module_copy("database.operations.users")
+
+EARLIER = "2024-03-01T12:00:00"
+LATER = "2024-03-01T12:05:00"
+
+@pytest_asyncio.fixture
+async def active_users(database, users):
+    await database.execute("UPDATE letta_users SET last_active = ?", (EARLIER,))
+    await database.execute("UPDATE platform_profiles SET last_active = ?", (EARLIER,))
+    return users
+
+@pytest.fixture
+def tracker(monkeypatch):
+    """A tracker not flushing in the background, used by the user operations."""
+    tracker = ActivityTracker()
+    monkeypatch.setattr(activity, "_activity_tracker", tracker)
+    monkeypatch.setattr(profile_cache, "_profile_cache", ProfileCache(max_size=10))
+    monkeypatch.setattr(provisioner, "_provisioner", SimpleNamespace(request=lambda *args: None))
+    return tracker
+
+async def last_active(database, table: str, row_id: int) -> str:
+    return (await database.fetchone(f"SELECT last_active FROM {table} WHERE id = ?", (row_id,)))[0]
+
+def test_latest_time_is_kept():
+    tracker = ActivityTracker()
+    tracker.touch_profile(1, LATER)
+    tracker.touch_profile(1, EARLIER)
+    tracker.touch_letta_user(1, LATER)
+    tracker.touch_letta_user(2, LATER)
+    assert tracker.pending == 3
+
+@pytest.mark.asyncio
+async def test_flush_writes_every_time_at_once(database, active_users):
+    tracker = ActivityTracker()
+    tracker.touch_profile(1, LATER)
+    tracker.touch_profile(2, LATER)
+    tracker.touch_letta_user(3, LATER)
+
+    assert await tracker.flush() == 3
+    assert tracker.pending == 0
+    assert await last_active(database, "platform_profiles", 1) == LATER
+    assert await last_active(database, "platform_profiles", 2) == LATER
+    assert await last_active(database, "platform_profiles", 3) == EARLIER
+    assert await last_active(database, "letta_users", 3) == LATER
+    assert await tracker.flush() == 0
+
+@pytest.mark.asyncio
+async def test_times_only_move_forward(database, active_users):
+    await database.execute("UPDATE platform_profiles SET last_active = ? WHERE id = 1", (LATER,))
+    tracker = ActivityTracker()
+    tracker.touch_profile(1, EARLIER)
+    await tracker.flush()
+    assert await last_active(database, "platform_profiles", 1) == LATER
+
+@pytest.mark.asyncio
+async def test_stop_writes_buffered_times(database, active_users):
+    tracker = ActivityTracker(flush_interval=3600)
+    tracker.start()
+    assert tracker.running
+    tracker.touch_letta_user(1, LATER)
+
+    await tracker.stop()
+    assert not tracker.running
+    assert tracker.pending == 0
+    assert await last_active(database, "letta_users", 1) == LATER
+
+@pytest.mark.asyncio
+async def test_stop_can_discard_buffered_times(database, active_users):
+    tracker = ActivityTracker(flush_interval=3600, flush_on_shutdown=False)
+    tracker.start()
+    tracker.touch_letta_user(1, LATER)
+
+    await tracker.stop()
+    assert await last_active(database, "letta_users", 1) == EARLIER
+
+@pytest.mark.asyncio
+async def test_background_flush(database, active_users):
+    tracker = ActivityTracker(flush_interval=0.01)
+    tracker.start()
+    tracker.touch_profile(2, LATER)
+    for _ in range(100):
+        if tracker.pending == 0:
+            break
+        await asyncio.sleep(0.01)
+    await tracker.stop()
+    assert await last_active(database, "platform_profiles", 2) == LATER
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_times(database, active_users, monkeypatch):
+    tracker = ActivityTracker()
+    tracker.touch_profile(1, LATER)
+
+    async def fail(job):
+        raise RuntimeError("database is locked")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(database, "write", fail)
+        with pytest.raises(RuntimeError):
+            await tracker.flush()
+    assert tracker.pending == 1
+
+    assert await tracker.flush() == 1
+
+@pytest.mark.asyncio
+async def test_uncached_senders_are_recorded_by_the_tracker(database, active_users, tracker):
+    profile, _ = await users_module.get_or_create_platform_profile("telegram", "1001", "renamed", "User 1")
+    assert profile.username == "renamed"
+    assert await last_active(database, "platform_profiles", 1) == EARLIER
+    assert tracker.pending == 1
+
+    await tracker.flush()
+    assert await last_active(database, "platform_profiles", 1) == profile.last_active
+    assert await last_active(database, "letta_users", 1) == EARLIER
+
+@pytest.mark.asyncio
+async def test_new_users_are_recorded_by_the_tracker(database, tracker):
+    profile, letta_user = await users_module.get_or_create_platform_profile("telegram", "2001", "new", "New")
+    assert letta_user.last_active == profile.last_active
+    assert await last_active(database, "platform_profiles", profile.id) is None
+    assert await last_active(database, "letta_users", letta_user.id) is None
+
+    assert await tracker.flush() == 2
+    assert await last_active(database, "platform_profiles", profile.id) == profile.last_active
+    assert await last_active(database, "letta_users", letta_user.id) == profile.last_active
+
+@pytest.mark.asyncio
+async def test_user_updates_leave_activity_to_the_tracker(database, active_users, tracker):
+    letta_user = await users_module.update_letta_user(2, custom_instructions="be brief")
+    assert letta_user.custom_instructions == "be brief"
+    assert await last_active(database, "letta_users", 2) == EARLIER
+
+    await tracker.flush()
+    assert await last_active(database, "letta_users", 2) == letta_user.last_active
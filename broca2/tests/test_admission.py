@@ -0,0 +1,144 @@
+"""Tests for admission control and queue depth tracking on ingest."""
+import pytest
+
+import database.depth as depth
+from common.metrics import get_metrics
+from database.depth import QueueDepth, get_queue_depth
+from database.operations.queue import dead_letter_queue_item, delete_queue_item, update_queue_status
+from runtime.core import admission
+from runtime.core.admission import AdmissionController, TokenBucket
+
+@pytest.fixture
+def queue_depth(monkeypatch):
+    """A queue depth that counts as already synced with the database."""
+    queue_depth = QueueDepth()
+    queue_depth.synced = True
+    monkeypatch.setattr(depth, "_queue_depth", queue_depth)
+    monkeypatch.setattr(admission, "DEFER_POLL_SECONDS", 0.01)
+    return queue_depth
+
+def shed_count(reason: str) -> float:
+    return get_metrics().get("ingest_shed_total", platform="telegram", reason=reason)
+
+def test_bucket_allows_a_burst_then_refills(clock):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+    assert bucket.wait_time() == 0.5
+
+    clock[0] += 0.5
+    assert bucket.take()
+    assert not bucket.take()
+
+    clock[0] += 60
+    assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+
+def test_empty_bucket_without_refill_waits_forever(clock):
+    bucket = TokenBucket(rate=0, capacity=1)
+    assert bucket.take()
+    assert bucket.wait_time() == float("inf")
+
+def test_invalid_rate_limit_policy_is_rejected():
+    with pytest.raises(ValueError):
+        AdmissionController(rate_limit_policy="drop")
+
+@pytest.mark.asyncio
+async def test_full_queue_sheds(queue_depth):
+    controller = AdmissionController(max_depth=10, defer_depth=0, rate_per_minute=0)
+    queue_depth.value = 9
+    assert await controller.admit("telegram", "1001")
+
+    queue_depth.value = 10
+    shed = shed_count("queue_full")
+    assert not await controller.admit("telegram", "1001")
+    assert shed_count("queue_full") == shed + 1
+
+@pytest.mark.asyncio
+async def test_sender_over_rate_is_shed(queue_depth):
+    controller = AdmissionController(defer_depth=0, rate_per_minute=60, burst=2, rate_limit_policy="shed")
+    assert await controller.admit("telegram", "1001")
+    assert await controller.admit("telegram", "1001")
+    assert not await controller.admit("telegram", "1001")
+    # Other senders have their own buckets
+    assert await controller.admit("telegram", "1002")
+
+@pytest.mark.asyncio
+async def test_sender_over_rate_is_deferred(queue_depth):
+    controller = AdmissionController(defer_depth=0, rate_per_minute=6000, burst=1, defer_timeout=5)
+    assert await controller.admit("telegram", "1001")
+    assert await controller.admit("telegram", "1001")
+
+@pytest.mark.asyncio
+async def test_busy_queue_defers_until_timeout(queue_depth):
+    controller = AdmissionController(max_depth=0, defer_depth=5, rate_per_minute=0, defer_timeout=0.05)
+    queue_depth.value = 5
+    shed = shed_count("queue_busy_timeout")
+    assert not await controller.admit("telegram", "1001")
+    assert shed_count("queue_busy_timeout") == shed + 1
+
+@pytest.mark.asyncio
+async def test_too_many_deferred_are_shed(queue_depth):
+    controller = AdmissionController(max_depth=0, defer_depth=5, rate_per_minute=0, max_deferred=0)
+    queue_depth.value = 5
+    shed = shed_count("too_many_deferred")
+    assert not await controller.admit("telegram", "1001")
+    assert shed_count("too_many_deferred") == shed + 1
+
+@pytest.mark.asyncio
+async def test_depth_follows_enqueue_and_completion(queue_message):
+    for letta_user_id in (1, 2):
+        await queue_message(letta_user_id)
+    queue_depth = get_queue_depth()
+    assert queue_depth.value == 2
+
+    await update_queue_status(1, "completed")
+    assert queue_depth.value == 1
+    assert await queue_depth.sync() == 1
+
+@pytest.mark.asyncio
+async def test_admission_counts_the_existing_backlog(queue_message):
+    for letta_user_id in (1, 2, 3):
+        await queue_message(letta_user_id)
+    queue_depth = get_queue_depth()
+    queue_depth.value, queue_depth.synced = 0, False
+
+    controller = AdmissionController(max_depth=3, defer_depth=0, rate_per_minute=0)
+    assert not await controller.admit("telegram", "1001")
+    assert (queue_depth.value, queue_depth.synced) == (3, True)
+
+@pytest.mark.asyncio
+async def test_depth_only_changes_when_items_finish_or_reopen(queue_message):
+    for letta_user_id in (1, 2):
+        await queue_message(letta_user_id)
+    queue_depth = get_queue_depth()
+    assert await queue_depth.sync() == 2
+
+    await update_queue_status(1, "processing")
+    assert queue_depth.value == 2
+    await update_queue_status(1, "completed")
+    assert queue_depth.value == 1
+    await update_queue_status(1, "failed")
+    assert queue_depth.value == 1
+    await update_queue_status(1, "pending")
+    assert queue_depth.value == 2
+
+    await update_queue_status(2, "completed")
+    await dead_letter_queue_item(2, "permanent", "gone")
+    assert queue_depth.value == 1
+    await dead_letter_queue_item(1, "permanent", "gone")
+    assert queue_depth.value == 0
+    assert await queue_depth.sync() == 0
+
+@pytest.mark.asyncio
+async def test_deleting_unfinished_items_lowers_the_depth(queue_message):
+    for letta_user_id in (1, 2, 3):
+        await queue_message(letta_user_id)
+    queue_depth = get_queue_depth()
+    await update_queue_status(3, "completed")
+    assert queue_depth.value == 2
+
+    assert await delete_queue_item(1)
+    assert queue_depth.value == 1
+    assert await delete_queue_item(3)
+    assert await delete_queue_item(404)
+    assert queue_depth.value == 1
+    assert await queue_depth.sync() == 1
@@ -0,0 +1,43 @@
+"""Tests for spreading users across a pool of Letta agents."""
+import pytest
+
+from runtime.core.agent_pool import AgentPool, get_agent_ids
+
+AGENTS = ["agent-a", "agent-b", "agent-c", "agent-d"]
+USERS = range(1, 2001)
+
+def test_user_always_gets_the_same_agent():
+    first = AgentPool(AGENTS)
+    second = AgentPool(list(AGENTS))
+    assert [first.agent_for(user) for user in USERS] == [second.agent_for(user) for user in USERS]
+
+def test_users_are_spread_across_every_agent():
+    pool = AgentPool(AGENTS)
+    counts = {agent_id: 0 for agent_id in AGENTS}
+    for user in USERS:
+        counts[pool.agent_for(user)] += 1
+    assert all(count > len(USERS) / len(AGENTS) / 2 for count in counts.values())
+
+def test_single_agent_serves_everyone():
+    pool = AgentPool(["agent-a", "agent-a"])
+    assert len(pool) == 1
+    assert {pool.agent_for(user) for user in USERS} == {"agent-a"}
+    assert AgentPool(AGENTS).agent_for(None) == "agent-a"
+
+def test_removing_an_agent_only_moves_its_users():
+    before = AgentPool(AGENTS)
+    after = AgentPool([agent_id for agent_id in AGENTS if agent_id != "agent-c"])
+    for user in USERS:
+        if before.agent_for(user) != "agent-c":
+            assert after.agent_for(user) == before.agent_for(user)
+
+def test_empty_pool_is_rejected():
+    with pytest.raises(ValueError):
+        AgentPool([])
+
+def test_agent_ids_from_environment(monkeypatch):
+    monkeypatch.setenv("AGENT_ID", "agent-x")
+    monkeypatch.setenv("AGENT_IDS", " agent-a, agent-b,,agent-a ")
+    assert get_agent_ids() == ["agent-a", "agent-b"]
+    monkeypatch.setenv("AGENT_IDS", "")
+    assert get_agent_ids() == ["agent-x"]
@@ -0,0 +1,65 @@
+"""Tests for archiving finished queue items."""
+import pytest
+
+from database.operations.queue import archive_queue_items, get_all_queue_items, update_queue_status
+from database.timestamps import now_ms
+from runtime.core.compactor import QueueCompactor
+
+@pytest.fixture
+def finished_items(database, queue_message):
+    """Queue messages, finish them and backdate them by an hour."""
+    async def _finished_items(count: int) -> None:
+        for n in range(count):
+            await queue_message(1 + n % 3, f"message {n}")
+        for queue_id in range(1, count + 1):
+            await update_queue_status(queue_id, "completed")
+        await database.execute("UPDATE queue SET timestamp_ms = ?", (now_ms() - 3_600_000,))
+    return _finished_items
+
+@pytest.mark.asyncio
+async def test_only_old_finished_items_are_archived(database, finished_items, queue_message):
+    await finished_items(2)
+    await queue_message(1, "still pending")
+    await database.execute("UPDATE queue SET timestamp_ms = 0 WHERE id = 3")
+    await queue_message(2, "recent")
+    await update_queue_status(4, "completed")
+
+    assert await archive_queue_items(retention_seconds=60) == 2
+    assert await database.fetchall("SELECT id FROM queue ORDER BY id") == [(3,), (4,)]
+    assert await database.fetchall("SELECT id, status FROM queue_archive ORDER BY id") == [
+        (1, "completed"), (2, "completed")
+    ]
+
+@pytest.mark.asyncio
+async def test_backlog_is_archived_batch_by_batch(database, finished_items):
+    await finished_items(5)
+    assert await archive_queue_items(retention_seconds=60, batch_size=2) == 2
+
+    assert await QueueCompactor(retention_seconds=60, batch_size=2).compact() == 3
+    assert await database.fetchone("SELECT COUNT(*) FROM queue") == (0,)
+    assert await database.fetchone("SELECT COUNT(*) FROM queue_archive") == (5,)
+
+@pytest.mark.asyncio
+async def test_archived_items_are_listed_on_request(finished_items, queue_message):
+    await finished_items(2)
+    await archive_queue_items(retention_seconds=60)
+    await queue_message(3, "pending")
+
+    assert [item["id"] for item in await get_all_queue_items()] == [3]
+    items = await get_all_queue_items(include_archived=True)
+    assert [(item["id"], item["archived"]) for item in items] == [(3, False), (2, True), (1, True)]
+    assert items[1]["message"] == "message 1"
+    assert len(await get_all_queue_items(include_archived=True, limit=2)) == 2
+
+@pytest.mark.asyncio
+async def test_finished_live_items_are_listed_with_the_archive(finished_items, queue_message):
+    await finished_items(1)
+    await queue_message(2, "pending")
+    await update_queue_status(2, "completed")
+
+    # Finished items still inside the retention window
+    assert await get_all_queue_items() == []
+    items = await get_all_queue_items(include_archived=True)
+    assert [(item["id"], item["status"], item["archived"]) for item in items] == [
+        (2, "completed", False), (1, "completed", False)
+    ]
@@ -0,0 +1,54 @@
+"""Tests for keeping user core blocks attached to shared agents."""
+import pytest
+
+from runtime.core.blocks import BlockAttachmentManager
+
+from .conftest import FakeLettaClient
+
+@pytest.fixture
+def letta():
+    return FakeLettaClient()
+
+@pytest.mark.asyncio
+async def test_reconcile_adopts_a_single_user_block(database, users, letta):
+    letta.attached["agent-a"] = ["persona", "block-2"]
+    manager = BlockAttachmentManager(letta)
+    await manager.reconcile("agent-a")
+    assert manager.attached_block("agent-a") == "block-2"
+    assert letta.calls == []
+
+@pytest.mark.asyncio
+async def test_reconcile_detaches_leftover_user_blocks(database, users, letta):
+    letta.attached["agent-a"] = ["persona", "block-1", "block-3"]
+    manager = BlockAttachmentManager(letta)
+    await manager.reconcile("agent-a")
+    assert manager.attached_block("agent-a") is None
+    # Blocks that are not users' core blocks are left alone
+    assert letta.attached["agent-a"] == ["persona"]
+
+@pytest.mark.asyncio
+async def test_ensure_attached_swaps_only_on_a_different_user(database, users, letta):
+    manager = BlockAttachmentManager(letta)
+    await manager.reconcile("agent-a")
+    await manager.ensure_attached("agent-a", "block-1")
+    await manager.ensure_attached("agent-a", "block-1")
+    await manager.ensure_attached("agent-a", "block-2")
+    assert letta.calls == [
+        ("attach", "agent-a", "block-1"),
+        ("detach", "agent-a", "block-1"),
+        ("attach", "agent-a", "block-2"),
+    ]
+    assert letta.attached["agent-a"] == ["block-2"]
+
+@pytest.mark.asyncio
+async def test_release_all_detaches_every_tracked_block(database, users, letta):
+    manager = BlockAttachmentManager(letta)
+    await manager.ensure_attached("agent-a", "block-1")
+    await manager.ensure_attached("agent-b", "block-2")
+    await manager.release_all()
+    assert letta.attached == {"agent-a": [], "agent-b": []}
+    assert manager.attached_block("agent-a") is None
+    # Releasing again makes no calls
+    calls = len(letta.calls)
+    await manager.release_all()
+    assert len(letta.calls) == calls
@@ -0,0 +1,77 @@
+"""Tests for coalescing a burst of a user's messages into one work item."""
+import pytest
+
+from database.operations.queue import claim_work_items
+from runtime.core.queue import QueueProcessor
+
+from .test_queue_processor import RecordingPlatform, echo, run_until_delivered
+
+async def claim(limit: int = 10, window: float = 10, max_messages: int = 5):
+    return await claim_work_items(
+        "worker-a", lease_seconds=30, limit=limit,
+        coalesce_window_seconds=window, coalesce_max_messages=max_messages
+    )
+
+@pytest.mark.asyncio
+async def test_burst_is_claimed_as_one_item(database, queue_message):
+    for text in ("one", "two", "three"):
+        await queue_message(1, text)
+    await queue_message(2, "other user")
+
+    items = await claim()
+    assert [item.letta_user_id for item in items] == [1, 2]
+    assert [item.message for item in items[0].batch] == ["one", "two", "three"]
+    assert items[1].coalesced == []
+
+    rows = await database.fetchall("SELECT status, lease_owner FROM queue WHERE letta_user_id = 1")
+    assert rows == [("processing", "worker-a")] * 3
+
+@pytest.mark.asyncio
+async def test_coalescing_is_off_by_default(queue_message):
+    for text in ("one", "two"):
+        await queue_message(1, text)
+    items = await claim_work_items("worker-a", lease_seconds=30, limit=10)
+    assert [item.batch for item in items] == [[items[0]]]
+
+@pytest.mark.asyncio
+async def test_batch_is_capped_at_max_messages(queue_message):
+    for n in range(5):
+        await queue_message(1, f"message {n}")
+    items = await claim(max_messages=3)
+    assert [item.message for item in items[0].batch] == ["message 0", "message 1", "message 2"]
+
+    # The rest wait for the batch to finish, then form the next one
+    assert await claim() == []
+
+@pytest.mark.asyncio
+async def test_messages_outside_the_window_are_not_coalesced(database, queue_message):
+    for text in ("one", "two", "three"):
+        await queue_message(1, text)
+    await database.execute("UPDATE queue SET timestamp_ms = timestamp_ms + 60000 WHERE id = 3")
+
+    items = await claim(window=10)
+    assert [item.message for item in items[0].batch] == ["one", "two"]
+
+@pytest.mark.asyncio
+async def test_run_stops_at_another_platform_profile(database, queue_message):
+    await database.execute(
+        "INSERT INTO platform_profiles (id, letta_user_id, platform, platform_user_id, username, display_name) "
+        "VALUES (4, 1, 'discord', '2001', 'user1', 'User 1')"
+    )
+    await queue_message(1, "one")
+    await queue_message(1, "elsewhere", platform_profile_id=4)
+    await queue_message(1, "three")
+
+    items = await claim()
+    assert [item.message for item in items[0].batch] == ["one"]
+
+@pytest.mark.asyncio
+async def test_burst_gets_one_response(database, queue_message, letta_client):
+    for text in ("one", "two", "three"):
+        await queue_message(1, text)
+    platform = RecordingPlatform(delay=0)
+    processor = QueueProcessor(echo, message_mode="echo", plugin_manager=platform)
+
+    await run_until_delivered(processor, platform, 1)
+    rows = await database.fetchall("SELECT status FROM queue")
+    assert rows == [("completed",)] * 3
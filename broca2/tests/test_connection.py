@@ -0,0 +1,104 @@
+"""Tests for the shared writer connection and reader pool."""
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+from database.connection import STORAGE_PROFILES, DatabaseManager, get_storage_pragmas
+
+@pytest_asyncio.fixture
+async def manager(tmp_path):
+    manager = DatabaseManager(str(tmp_path / "test.db"), readers=2)
+    await manager.execute("CREATE TABLE counter (value INTEGER)")
+    yield manager
+    await manager.close()
+
+@pytest.mark.asyncio
+async def test_writes_run_one_transaction_at_a_time(manager):
+    async def increment(db):
+        async with db.execute("SELECT IFNULL(MAX(value), 0) FROM counter") as cursor:
+            value = (await cursor.fetchone())[0]
+        # Another write interleaving here would read the same value
+        await asyncio.sleep(0)
+        await db.execute("INSERT INTO counter (value) VALUES (?)", (value + 1,))
+        return value + 1
+
+    results = await asyncio.gather(*(manager.write(increment) for _ in range(20)))
+    assert results == list(range(1, 21))
+    assert await manager.fetchall("SELECT value FROM counter ORDER BY value") == [(n,) for n in range(1, 21)]
+
+@pytest.mark.asyncio
+async def test_failed_write_is_rolled_back(manager):
+    async def insert_then_fail(db):
+        await db.execute("INSERT INTO counter (value) VALUES (1)")
+        raise ValueError("bad write")
+
+    with pytest.raises(ValueError):
+        await manager.write(insert_then_fail)
+    assert await manager.fetchone("SELECT COUNT(*) FROM counter") == (0,)
+
+    # The writer keeps serving later writes
+    await manager.execute("INSERT INTO counter (value) VALUES (2)")
+    assert await manager.fetchall("SELECT value FROM counter") == [(2,)]
+
+@pytest.mark.asyncio
+async def test_executemany_counts_changed_rows(manager):
+    assert await manager.executemany("INSERT INTO counter (value) VALUES (?)", [(1,), (2,), (3,)]) == 3
+    assert (await manager.execute("UPDATE counter SET value = value + 1 WHERE value > 1")).rowcount == 2
+
+@pytest.mark.asyncio
+async def test_reader_pool_is_bounded(manager):
+    async with manager.reader() as first, manager.reader() as second:
+        assert first is not second
+        waiting = asyncio.create_task(manager.fetchone("SELECT 1"))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+    assert await asyncio.wait_for(waiting, timeout=1) == (1,)
+
+@pytest.mark.asyncio
+async def test_close_finishes_queued_writes(manager, tmp_path):
+    writes = [asyncio.ensure_future(manager.execute("INSERT INTO counter (value) VALUES (?)", (n,))) for n in range(5)]
+    await asyncio.sleep(0)
+    await manager.close()
+    await asyncio.gather(*writes)
+
+    reopened = DatabaseManager(str(tmp_path / "test.db"), readers=1)
+    assert await reopened.fetchone("SELECT COUNT(*) FROM counter") == (5,)
+    await reopened.close()
+
+def test_storage_profile_with_overrides():
+    pragmas = get_storage_pragmas("durable", {"cache_size": -2000, "temp_store": "MEMORY"})
+    assert pragmas == {**STORAGE_PROFILES["durable"], "cache_size": -2000, "temp_store": "MEMORY"}
+    assert list(pragmas)[:2] == ["busy_timeout", "journal_mode"]
+
+@pytest.mark.parametrize("profile, overrides", [
+    ("fast", {}),
+    ("throughput", {"foreign_keys": 0}),
+    ("throughput", {"synchronous": "OFF; DROP TABLE queue"}),
+    ("throughput", {"cache_size": "-2000"}),
+    ("throughput", {"mmap_size": 1.5}),
+    ("throughput", {"temp_store": True}),
+])
+def test_invalid_storage_settings_are_rejected(profile, overrides):
+    with pytest.raises(ValueError):
+        get_storage_pragmas(profile, overrides)
+
+@pytest.mark.asyncio
+async def test_pragmas_apply_to_every_connection(tmp_path):
+    manager = DatabaseManager(
+        str(tmp_path / "test.db"), readers=1,
+        pragmas=get_storage_pragmas("durable", {"cache_size": -1234})
+    )
+    try:
+        async with manager.reader() as db:
+            async with db.execute("PRAGMA journal_mode") as cursor:
+                assert (await cursor.fetchone())[0] == "wal"
+            async with db.execute("PRAGMA cache_size") as cursor:
+                assert (await cursor.fetchone())[0] == -1234
+
+        async def read_synchronous(db):
+            async with db.execute("PRAGMA synchronous") as cursor:
+                return (await cursor.fetchone())[0]
+        assert await manager.write(read_synchronous) == 2
+    finally:
+        await manager.close()
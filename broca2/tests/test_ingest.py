@@ -0,0 +1,52 @@
+"""Tests for group-committing inbound messages."""
+import asyncio
+
+import pytest
+
+from database.depth import get_queue_depth
+from database.ingest import IngestWriter
+
+@pytest.mark.asyncio
+async def test_each_submitter_gets_its_own_message_id(database, users):
+    writer = IngestWriter(batch_size=4, flush_ms=5)
+    texts = [f"message {n}" for n in range(10)]
+    message_ids = await asyncio.gather(*(
+        writer.submit(1 + n % 3, 1 + n % 3, text) for n, text in enumerate(texts)
+    ))
+
+    assert len(set(message_ids)) == len(texts)
+    for n, (text, message_id) in enumerate(zip(texts, message_ids)):
+        row = await database.fetchone(
+            "SELECT letta_user_id, message FROM messages WHERE id = ?", (message_id,)
+        )
+        assert row == (1 + n % 3, text)
+
+@pytest.mark.asyncio
+async def test_every_message_is_queued_once(database, users):
+    writer = IngestWriter(batch_size=3, flush_ms=5)
+    message_ids = await asyncio.gather(*(writer.submit(1, 1, f"message {n}") for n in range(7)))
+
+    rows = await database.fetchall("SELECT message_id, status FROM queue ORDER BY id")
+    assert rows == [(message_id, "pending") for message_id in message_ids]
+    assert get_queue_depth().value == 7
+
+@pytest.mark.asyncio
+async def test_flush_writes_buffered_messages(database, users):
+    writer = IngestWriter(batch_size=64, flush_ms=60000)
+    submitted = asyncio.ensure_future(writer.submit(2, 2, "waiting"))
+    await asyncio.sleep(0)
+    assert not submitted.done()
+
+    await writer.flush()
+    message_id = await submitted
+    row = await database.fetchone("SELECT message FROM messages WHERE id = ?", (message_id,))
+    assert row == ("waiting",)
+
+@pytest.mark.asyncio
+async def test_failed_batch_fails_every_submitter(database, users):
+    writer = IngestWriter(batch_size=2, flush_ms=5)
+    results = await asyncio.gather(
+        writer.submit(1, 1, "fine"), writer.submit(99, 99, "unknown user"), return_exceptions=True
+    )
+    assert all(isinstance(result, Exception) for result in results)
+    assert await database.fetchone("SELECT COUNT(*) FROM messages") == (0,)
@@ -0,0 +1,113 @@
+"""Tests for running Letta SDK calls off the event loop."""
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import MethodType, SimpleNamespace
+
+import httpx
+import pytest
+
+from common.exceptions import LettaUnavailableError
+from common.metrics import get_metrics
+from runtime.core.resilience import CircuitBreaker, RetryPolicy
+
+from .conftest import load_module_copy
+
+letta_client = load_module_copy("runtime.core.letta_client")
+LettaClient = letta_client.LettaClient
+
+@pytest.fixture
+def client():
+    executor = ThreadPoolExecutor(max_workers=2)
+    client = SimpleNamespace(
+        settings=dict(letta_client.DEFAULT_LETTA_SETTINGS),
+        breaker=CircuitBreaker("test"),
+        retry_policy=RetryPolicy(max_attempts=2, backoff_base=0.01),
+        _executor=executor,
+        _abandoned=0,
+        _abandoned_lock=threading.Lock()
+    )
+    client._run_in_thread = MethodType(LettaClient._run_in_thread, client)
+    yield client
+    executor.shutdown(wait=True)
+
+def slow(seconds: float, request_options: dict) -> None:
+    time.sleep(seconds)
+
+@pytest.mark.asyncio
+async def test_calls_run_on_the_thread_pool(client):
+    loop_thread = threading.get_ident()
+    result = await LettaClient.call(client, lambda a, b, request_options: (threading.get_ident(), a + b), 1, b=2)
+    assert result[0] != loop_thread
+    assert result[1] == 3
+
+@pytest.mark.asyncio
+async def test_slow_calls_time_out_without_blocking_the_loop(client):
+    client.retry_policy.max_attempts = 1
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(1)
+            await asyncio.sleep(0.01)
+
+    ticker = asyncio.create_task(tick())
+    with pytest.raises(LettaUnavailableError):
+        await LettaClient.call(client, slow, 0.3, timeout=0.1)
+    ticker.cancel()
+    assert len(ticks) >= 5
+    assert client.breaker.failures == 1
+
+@pytest.mark.asyncio
+async def test_the_sdk_request_times_out_with_the_call(client):
+    seen = []
+
+    def retrieve(agent_id: str, request_options: dict) -> str:
+        seen.append(request_options)
+        return agent_id
+
+    assert await LettaClient.call(client, retrieve, "agent-a", timeout=5, request_options={"additional_headers": {"x": "1"}}) == "agent-a"
+    assert seen == [{"additional_headers": {"x": "1"}, "timeout_in_seconds": 5, "max_retries": 0}]
+
+@pytest.mark.asyncio
+async def test_abandoned_calls_are_counted_until_they_finish(client):
+    client.retry_policy.max_attempts = 1
+    metrics = get_metrics()
+    abandoned_before = metrics.get("letta_abandoned_calls_total", operation="slow")
+
+    with pytest.raises(LettaUnavailableError):
+        await LettaClient.call(client, slow, 0.2, timeout=0.05)
+    assert metrics.get("letta_abandoned_calls_total", operation="slow") == abandoned_before + 1
+    assert metrics.get("letta_abandoned_calls") == 1
+
+    await asyncio.sleep(0.3)
+    assert metrics.get("letta_abandoned_calls") == 0
+
+@pytest.mark.asyncio
+async def test_calls_given_up_before_starting_are_never_made(client):
+    client.retry_policy.max_attempts = 1
+    client._executor.shutdown(wait=True)
+    client._executor = ThreadPoolExecutor(max_workers=1)
+    made = []
+    blocker = asyncio.get_running_loop().run_in_executor(client._executor, time.sleep, 0.2)
+
+    with pytest.raises(LettaUnavailableError):
+        await LettaClient.call(client, lambda request_options: made.append(1), timeout=0.05)
+    await blocker
+    await asyncio.sleep(0.05)
+    assert made == []
+    assert client._abandoned == 0
+
+@pytest.mark.asyncio
+async def test_unsent_requests_are_retried(client):
+    attempts = []
+
+    def connect(request_options: dict):
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise httpx.ConnectError("refused")
+        return "ok"
+
+    assert await LettaClient.call(client, connect) == "ok"
+    assert len(attempts) == 2
@@ -0,0 +1,177 @@
+"""Tests for online database maintenance."""
+import asyncio
+import os
+import sqlite3
+import time
+
+import aiosqlite
+import pytest
+
+from database.maintenance import (
+    backup_database,
+    backup_path,
+    get_maintenance_runs,
+    list_backups,
+    prune_messages,
+    remove_old_backups,
+)
+from database.operations.messages import insert_message
+from database.timestamps import now_ms
+from runtime.core.maintenance import MaintenanceJob, MaintenanceScheduler, _vacuum_job
+
+DAY_MS = 86_400_000
+
+@pytest.fixture
+def old_messages(database, users):
+    """Insert unqueued messages of a user, the first one the oldest."""
+    async def _old_messages(letta_user_id: int, count: int, age_days: float = 30) -> list:
+        message_ids = []
+        for n in range(count):
+            message_id = await insert_message(letta_user_id, letta_user_id, "user", f"message {n}")
+            await database.execute(
+                "UPDATE messages SET timestamp_ms = ? WHERE id = ?",
+                (now_ms() - int(age_days * DAY_MS) + n, message_id)
+            )
+            message_ids.append(message_id)
+        return message_ids
+    return _old_messages
+
+async def remaining_messages(database) -> list:
+    return [row[0] for row in await database.fetchall("SELECT id FROM messages ORDER BY id")]
+
+@pytest.mark.asyncio
+async def test_prune_by_age_keeps_queued_messages(database, old_messages, queue_message):
+    old = await old_messages(1, 3)
+    queued = await queue_message(2)
+    await database.execute("UPDATE messages SET timestamp_ms = 0 WHERE id = ?", (queued,))
+    recent = await old_messages(3, 1, age_days=1)
+
+    assert await prune_messages(max_age_seconds=7 * 86400, batch_size=2) == len(old)
+    assert await remaining_messages(database) == [queued, *recent]
+
+@pytest.mark.asyncio
+async def test_prune_applies_the_per_user_cap(database, old_messages):
+    first = await old_messages(1, 5)
+    second = await old_messages(2, 2)
+    # A queued message is kept even though it is beyond the cap
+    await database.execute(
+        "INSERT INTO queue (letta_user_id, message_id, status) VALUES (1, ?, 'pending')", (first[0],)
+    )
+
+    assert await prune_messages(max_per_user=2, batch_size=1) == 2
+    assert await remaining_messages(database) == [first[0], *first[3:], *second]
+
+@pytest.mark.asyncio
+async def test_prune_without_limits_keeps_everything(database, old_messages):
+    await old_messages(1, 3)
+    assert await prune_messages() == 0
+    assert len(await remaining_messages(database)) == 3
+
+def test_old_backups_are_removed(tmp_path):
+    paths = [tmp_path / f"sanctum-2026010{day}-000000.db" for day in (1, 2, 3)]
+    for path in paths:
+        path.write_bytes(b"")
+    (tmp_path / "other.db").write_bytes(b"")
+
+    assert remove_old_backups(str(tmp_path), keep=2) == [str(paths[0])]
+    assert list_backups(str(tmp_path)) == [str(path) for path in paths[1:]]
+    assert os.path.basename(backup_path(str(tmp_path))).startswith("sanctum-")
+
+@pytest.mark.asyncio
+async def test_backup_is_consistent_while_a_writer_is_active(database, old_messages, tmp_path, monkeypatch):
+    await old_messages(1, 300)
+    await database.execute("UPDATE messages SET message = printf('%.500c', 'x')")
+    destination = str(tmp_path / "backup.db")
+    backup_done = asyncio.Event()
+    checkpoints = []
+
+    # Count the pauses between backup steps
+    pauses = []
+    sleep = time.sleep
+    monkeypatch.setattr(time, "sleep", lambda seconds: (pauses.append(seconds), sleep(seconds)))
+
+    async def write() -> None:
+        while not backup_done.is_set():
+            await insert_message(2, 2, "user", "written during the backup")
+            paused = len(pauses)
+            checkpoint = await database.fetchone("PRAGMA wal_checkpoint(PASSIVE)")
+            await asyncio.sleep(0.002)
+            if 0 < paused < len(pauses):
+                # The backup was between two of its steps
+                checkpoints.append(checkpoint)
+
+    writer = asyncio.create_task(write())
+    try:
+        await backup_database(destination, pages_per_step=4, step_sleep=0.005, max_restarts=2)
+    finally:
+        backup_done.set()
+        await writer
+
+    assert checkpoints
+    # Between steps no snapshot is held, so the WAL can be checkpointed in full
+    assert any(busy == 0 and written == checkpointed for busy, written, checkpointed in checkpoints)
+    backup = sqlite3.connect(destination)
+    try:
+        assert backup.execute("PRAGMA integrity_check").fetchone() == ("ok",)
+        assert backup.execute("SELECT COUNT(*) FROM messages WHERE letta_user_id = 1").fetchone() == (300,)
+    finally:
+        backup.close()
+    assert not os.path.exists(f"{destination}.tmp")
+
+async def free_some_pages(database, old_messages) -> None:
+    await old_messages(1, 50)
+    await database.execute("UPDATE messages SET message = printf('%.2000c', 'x')")
+    await database.execute("DELETE FROM messages")
+
+@pytest.mark.asyncio
+async def test_vacuum_job_frees_pages(database, old_messages):
+    await free_some_pages(database, old_messages)
+    scheduler = MaintenanceScheduler([MaintenanceJob("vacuum", 3600, _vacuum_job(10))])
+
+    assert (await scheduler.run_job("vacuum")).startswith("freed ")
+    assert (await database.fetchone("PRAGMA freelist_count")) == (0,)
+    assert [(run["job"], run["status"]) for run in await get_maintenance_runs()] == [("vacuum", "ok")]
+
+@pytest.mark.asyncio
+async def test_vacuum_job_is_skipped_without_incremental_auto_vacuum(database, old_messages):
+    connection = await aiosqlite.connect(database.db_path, isolation_level=None)
+    try:
+        await connection.execute("PRAGMA auto_vacuum = NONE")
+        await connection.execute("VACUUM")
+    finally:
+        await connection.close()
+    await free_some_pages(database, old_messages)
+    scheduler = MaintenanceScheduler([MaintenanceJob("vacuum", 3600, _vacuum_job(10))])
+
+    await scheduler.run_due()
+    [run] = await get_maintenance_runs()
+    assert (run["job"], run["status"]) == ("vacuum", "skipped")
+    assert "--enable-incremental" in run["detail"]
+    assert (await database.fetchone("PRAGMA freelist_count"))[0] > 0
+
+@pytest.mark.asyncio
+async def test_scheduler_runs_due_jobs_and_records_them(database):
+    ran = []
+
+    def job(name: str, interval: float, fail: bool = False) -> MaintenanceJob:
+        async def _run() -> str:
+            ran.append(name)
+            if fail:
+                raise RuntimeError(f"{name} broke")
+            return f"{name} done"
+        return MaintenanceJob(name, interval, _run)
+
+    scheduler = MaintenanceScheduler([
+        job("broken", 60, fail=True), job("daily", 86400), job("hourly", 3600), job("disabled", 0)
+    ])
+    await scheduler.run_due()
+    # A failing job does not stop the others
+    assert ran == ["broken", "daily", "hourly"]
+    runs = {run["job"]: (run["status"], run["detail"]) for run in await get_maintenance_runs()}
+    assert runs == {"broken": ("error", "broken broke"), "daily": ("ok", "daily done"), "hourly": ("ok", "hourly done")}
+
+    # Two hours later only the hourly job is due again
+    await database.execute("UPDATE maintenance_runs SET last_run_ms = last_run_ms - 7200 * 1000")
+    ran.clear()
+    await scheduler.run_due()
+    assert ran == ["broken", "hourly"]
@@ -0,0 +1,25 @@
+"""Tests for migrating databases created before schema versioning."""
+import pytest
+
+from database.migrations import LATEST_VERSION, run_migrations
+
+from .conftest import OLD_MESSAGE_TIMESTAMPS
+
+async def get_columns(database, table: str) -> set:
+    return {row[1] for row in await database.fetchall(f"PRAGMA table_info({table})")}
+
+@pytest.mark.asyncio
+async def test_old_database_is_migrated_to_latest_version(old_database):
+    assert await run_migrations() == LATEST_VERSION
+    assert (await old_database.fetchone("PRAGMA user_version"))[0] == LATEST_VERSION
+
+    assert {"lease_owner", "lease_expires_at", "timestamp_ms"} <= await get_columns(old_database, "queue")
+    assert "timestamp_ms" in await get_columns(old_database, "messages")
+    indexes = {row[0] for row in await old_database.fetchall("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"idx_queue_user_status", "idx_platform_profiles_letta_user"} <= indexes
+
+@pytest.mark.asyncio
+async def test_migrating_twice_changes_nothing(old_database):
+    await run_migrations()
+    assert await run_migrations() == LATEST_VERSION
+    assert (await old_database.fetchone("SELECT COUNT(*) FROM messages"))[0] == len(OLD_MESSAGE_TIMESTAMPS)
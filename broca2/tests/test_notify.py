@@ -0,0 +1,65 @@
+"""Tests for waking queue consumers in this and other processes."""
+import asyncio
+import os
+import socket
+
+import pytest
+
+from database.notify import QueueNotifier, get_queue_notifier
+
+@pytest.mark.asyncio
+async def test_wait_times_out_without_work(tmp_path):
+    notifier = QueueNotifier(str(tmp_path / "notify"))
+    assert not await notifier.wait(timeout=0.01)
+
+@pytest.mark.asyncio
+async def test_local_consumers_are_woken(tmp_path):
+    notifier = QueueNotifier(str(tmp_path / "notify"))
+    waiters = [asyncio.create_task(notifier.wait(timeout=5)) for _ in range(2)]
+    await asyncio.sleep(0)
+    notifier.notify()
+    assert await asyncio.wait_for(asyncio.gather(*waiters), timeout=1) == [True, True]
+
+@pytest.mark.asyncio
+async def test_wakeup_before_waiting_is_not_lost(tmp_path):
+    notifier = QueueNotifier(str(tmp_path / "notify"))
+    sequence = notifier.sequence
+    notifier.notify_local()
+    assert await notifier.wait(timeout=5, since=sequence)
+
+@pytest.mark.asyncio
+async def test_other_processes_are_woken(tmp_path):
+    # Two notifiers on one channel directory behave like two processes
+    consumer = QueueNotifier(str(tmp_path / "notify"))
+    producer = QueueNotifier(str(tmp_path / "notify"))
+    consumer.listen()
+    try:
+        waiter = asyncio.create_task(consumer.wait(timeout=5))
+        await asyncio.sleep(0)
+        producer.notify()
+        assert await asyncio.wait_for(waiter, timeout=1)
+    finally:
+        consumer.close()
+        producer.close()
+    assert os.listdir(tmp_path / "notify") == []
+
+@pytest.mark.asyncio
+async def test_stale_sockets_are_removed(tmp_path):
+    channel_dir = tmp_path / "notify"
+    channel_dir.mkdir()
+    stale = str(channel_dir / "999-dead.sock")
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+    sock.bind(stale)
+    sock.close()
+
+    producer = QueueNotifier(str(channel_dir))
+    producer.notify()
+    producer.close()
+    assert not os.path.exists(stale)
+
+@pytest.mark.asyncio
+async def test_enqueue_wakes_consumers(queue_message):
+    waiter = asyncio.create_task(get_queue_notifier().wait(timeout=5))
+    await asyncio.sleep(0)
+    await queue_message(1)
+    assert await asyncio.wait_for(waiter, timeout=1)
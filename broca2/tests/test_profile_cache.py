@@ -0,0 +1,93 @@
+"""Tests for the in-process cache of platform profiles and Letta users."""
+from database.models import LettaUser, PlatformProfile
+from database.profile_cache import ProfileCache
+
+def sender(profile_id: int, letta_user_id: int = None, platform: str = "telegram"):
+    letta_user_id = letta_user_id or profile_id
+    profile = PlatformProfile(
+        id=profile_id, letta_user_id=letta_user_id, platform=platform,
+        platform_user_id=str(1000 + profile_id), username=f"user{profile_id}", display_name=f"User {profile_id}"
+    )
+    letta_user = LettaUser(id=letta_user_id, created_at="x", last_active="x", letta_block_id=f"block-{letta_user_id}")
+    return profile, letta_user
+
+def test_hit_and_miss_are_counted():
+    cache = ProfileCache(max_size=10)
+    assert cache.get("telegram", "1001") is None
+    cache.put(*sender(1))
+    assert cache.get("telegram", "1001") == sender(1)
+    assert (cache.hits, cache.misses) == (1, 1)
+
+def test_least_recently_used_is_evicted():
+    cache = ProfileCache(max_size=2)
+    cache.put(*sender(1))
+    cache.put(*sender(2))
+    cache.get("telegram", "1001")
+    cache.put(*sender(3))
+
+    assert len(cache) == 2
+    assert cache.get("telegram", "1002") is None
+    assert cache.get("telegram", "1001") is not None
+    assert cache.get("telegram", "1003") is not None
+
+def test_zero_size_disables_cache():
+    cache = ProfileCache(max_size=0)
+    cache.put(*sender(1))
+    assert len(cache) == 0
+    assert cache.get("telegram", "1001") is None
+
+def test_invalidate_and_clear():
+    cache = ProfileCache(max_size=10)
+    cache.put(*sender(1))
+    cache.put(*sender(2))
+    cache.invalidate("telegram", "1001")
+    cache.invalidate("telegram", "9999")
+    assert cache.get("telegram", "1001") is None
+    assert cache.get("telegram", "1002") is not None
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.get("telegram", "1002") is None
+
+def test_letta_user_changes_reach_every_profile():
+    cache = ProfileCache(max_size=10)
+    cache.put(*sender(1, letta_user_id=7))
+    cache.put(*sender(2, letta_user_id=7, platform="discord"))
+    cache.put(*sender(3))
+    cache.update_letta_user(7, letta_block_id="block-new")
+
+    assert cache.get("telegram", "1001")[1].letta_block_id == "block-new"
+    assert cache.get("discord", "1002")[1].letta_block_id == "block-new"
+    assert cache.get("telegram", "1003")[1].letta_block_id == "block-3"
+
+def test_evicted_profile_is_not_updated():
+    cache = ProfileCache(max_size=1)
+    cache.put(*sender(1))
+    cache.put(*sender(2))
+    cache.update_letta_user(1, letta_block_id="block-new")
+    assert len(cache) == 1
+
+def test_entries_expire_after_ttl(clock):
+    cache = ProfileCache(max_size=10, ttl=300)
+    cache.put(*sender(1))
+    clock[0] += 299
+    assert cache.get("telegram", "1001") is not None
+    clock[0] += 1
+    assert cache.get("telegram", "1001") is None
+    assert len(cache) == 0
+
+def test_local_changes_keep_the_load_time(clock):
+    cache = ProfileCache(max_size=10, ttl=300)
+    cache.put(*sender(1))
+    clock[0] += 200
+    profile, letta_user = sender(1)
+    profile.username = "renamed"
+    cache.put(profile, letta_user, loaded=False)
+    clock[0] += 100
+    assert cache.get("telegram", "1001") is None
+
+def test_zero_ttl_never_expires(clock):
+    cache = ProfileCache(max_size=10, ttl=0)
+    cache.put(*sender(1))
+    clock[0] += 10 ** 6
+    assert cache.get("telegram", "1001") is not None
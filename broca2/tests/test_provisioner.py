@@ -0,0 +1,67 @@
+"""Tests for provisioning Letta resources for new users in the background."""
+import asyncio
+
+import pytest
+import pytest_asyncio
+
+import database.operations.users as users_operations
+from database.operations.users import add_spare_letta_resources, count_spare_letta_resources
+from runtime.core.provisioner import SPARE_NAME, LettaProvisioner
+
+from .conftest import FakeLettaClient
+
+@pytest.fixture
+def letta(monkeypatch):
+    client = FakeLettaClient()
+    monkeypatch.setattr(users_operations, "get_letta_client", lambda: client)
+    return client
+
+@pytest_asyncio.fixture
+async def new_user(database, users):
+    """A user whose Letta identity and core block don't exist yet."""
+    await database.execute("UPDATE letta_users SET letta_block_id = NULL WHERE id = 1")
+    return 1
+
+@pytest.mark.asyncio
+async def test_provisioning_is_single_flight(database, new_user, letta):
+    provisioner = LettaProvisioner(letta_client=letta)
+    tasks = [provisioner.request(new_user, "user1", "User 1", "1001") for _ in range(5)]
+    block_ids = await asyncio.gather(provisioner.wait_ready(new_user), *tasks)
+
+    assert [call[0] for call in letta.calls] == ["create_identity", "create_block"]
+    assert len(set(block_ids)) == 1
+    row = await database.fetchone("SELECT letta_block_id FROM letta_users WHERE id = ?", (new_user,))
+    assert row == (block_ids[0],)
+
+@pytest.mark.asyncio
+async def test_provisioned_user_is_ready_at_once(database, users, letta):
+    provisioner = LettaProvisioner(letta_client=letta)
+    assert await provisioner.wait_ready(2) == "block-2"
+    assert letta.calls == []
+
+@pytest.mark.asyncio
+async def test_spare_resources_are_handed_to_new_users(database, new_user, letta):
+    await add_spare_letta_resources("identity-spare", "block-spare")
+    provisioner = LettaProvisioner(letta_client=letta)
+
+    assert await provisioner.wait_ready(new_user) == "block-spare"
+    # The spare is renamed for the user rather than a new pair being created
+    assert sorted(letta.calls) == [("update_block", "block-spare"), ("update_identity", "identity-spare", "User 1")]
+    assert await count_spare_letta_resources() == 0
+
+@pytest.mark.asyncio
+async def test_spare_pool_is_refilled(database, users, letta):
+    provisioner = LettaProvisioner(spare_pool_size=2, letta_client=letta)
+    await provisioner.start()
+    await provisioner._refill_task
+
+    assert await count_spare_letta_resources() == 2
+    assert letta.calls.count(("create_identity", SPARE_NAME)) == 2
+
+@pytest.mark.asyncio
+async def test_start_resumes_interrupted_provisioning(database, new_user, letta):
+    provisioner = LettaProvisioner(letta_client=letta)
+    await provisioner.start()
+    block_id = await provisioner.wait_ready(new_user)
+    assert block_id.startswith("block-new-")
+    assert len(letta.calls) == 2
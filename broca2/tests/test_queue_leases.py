@@ -0,0 +1,72 @@
+"""Tests for claiming queue items with renewable leases."""
+import pytest
+
+from database.operations.queue import (
+    claim_queue_items,
+    release_queue_item,
+    renew_queue_leases,
+    update_queue_status
+)
+
+@pytest.mark.asyncio
+async def test_claim_sets_lease(queue_message, get_item):
+    await queue_message(1)
+    items = await claim_queue_items("worker-a", lease_seconds=30, limit=10)
+    assert [item.id for item in items] == [1]
+    item = await get_item(1)
+    assert (item["status"], item["lease_owner"], item["attempts"]) == ("processing", "worker-a", 1)
+    assert item["lease_expires_at"] > 0
+
+@pytest.mark.asyncio
+async def test_leased_item_is_not_claimed_twice(queue_message):
+    await queue_message(1)
+    assert len(await claim_queue_items("worker-a", lease_seconds=30, limit=10)) == 1
+    assert await claim_queue_items("worker-b", lease_seconds=30, limit=10) == []
+
+@pytest.mark.asyncio
+async def test_expired_lease_is_reclaimed(database, queue_message, get_item):
+    await queue_message(1)
+    await claim_queue_items("worker-a", lease_seconds=30, limit=10)
+    await database.execute("UPDATE queue SET lease_expires_at = 0 WHERE id = 1")
+
+    items = await claim_queue_items("worker-b", lease_seconds=30, limit=10)
+    assert [item.id for item in items] == [1]
+    item = await get_item(1)
+    assert (item["status"], item["lease_owner"], item["attempts"]) == ("processing", "worker-b", 2)
+
+@pytest.mark.asyncio
+async def test_renewal_extends_only_own_leases(database, queue_message, get_item):
+    await queue_message(1)
+    await queue_message(2)
+    await claim_queue_items("worker-a", lease_seconds=30, limit=1)
+    await claim_queue_items("worker-b", lease_seconds=30, limit=1)
+    await database.execute("UPDATE queue SET lease_expires_at = 1")
+
+    assert await renew_queue_leases("worker-a", [1, 2], lease_seconds=30) == 1
+    assert (await get_item(1))["lease_expires_at"] > 1
+    assert (await get_item(2))["lease_expires_at"] == 1
+
+@pytest.mark.asyncio
+async def test_only_the_head_of_each_user_is_claimed(queue_message):
+    for text in ("first", "second"):
+        await queue_message(1, text)
+    await queue_message(2, "other user")
+
+    items = await claim_queue_items("worker-a", lease_seconds=30, limit=10)
+    assert sorted(item.id for item in items) == [1, 3]
+
+    # The user's next item waits until the head is finished
+    assert await claim_queue_items("worker-a", lease_seconds=30, limit=10) == []
+    await update_queue_status(1, "completed")
+    assert [item.id for item in await claim_queue_items("worker-a", lease_seconds=30, limit=10)] == [2]
+
+@pytest.mark.asyncio
+async def test_released_item_keeps_its_place(queue_message, get_item):
+    for text in ("first", "second"):
+        await queue_message(1, text)
+    await claim_queue_items("worker-a", lease_seconds=30, limit=10)
+    await release_queue_item(1, refund_attempt=True)
+
+    items = await claim_queue_items("worker-a", lease_seconds=30, limit=10)
+    assert [item.id for item in items] == [1]
+    assert (await get_item(1))["attempts"] == 1
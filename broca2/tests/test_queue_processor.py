@@ -0,0 +1,122 @@
+"""Tests for processing queue items with a pool of workers."""
+import asyncio
+from collections import defaultdict
+from typing import Dict
+
+import pytest
+
+from runtime.core.queue import QueueProcessor
+
+class RecordingPlatform:
+    """A platform handler that takes a while to deliver and records what it saw."""
+
+    def __init__(self, delay: float = 0.02):
+        self.delay = delay
+        self.delivered = []
+        self.active_users = set()
+        self.active = 0
+        self.most_active = 0
+        self.overlapping_users = []
+
+    def get_platform_handler(self, platform: str):
+        return self.handle
+
+    async def handle(self, response: str, profile, message_id: int) -> None:
+        if profile.letta_user_id in self.active_users:
+            self.overlapping_users.append(profile.letta_user_id)
+        self.active_users.add(profile.letta_user_id)
+        self.active += 1
+        self.most_active = max(self.most_active, self.active)
+        await asyncio.sleep(self.delay)
+        self.active -= 1
+        self.active_users.discard(profile.letta_user_id)
+        self.delivered.append((profile.letta_user_id, message_id))
+
+async def run_until_delivered(processor: QueueProcessor, platform: RecordingPlatform, count: int) -> None:
+    """Run the processor until `count` responses are delivered, then stop it."""
+    task = asyncio.create_task(processor.start())
+    try:
+        for _ in range(500):
+            if len(platform.delivered) >= count:
+                break
+            await asyncio.sleep(0.01)
+    finally:
+        await processor.stop()
+        await asyncio.wait_for(task, timeout=5)
+    assert len(platform.delivered) == count
+
+async def echo(message: str, agent_id: str) -> str:
+    return message
+
+@pytest.mark.asyncio
+async def test_workers_are_capped(database, queue_message, letta_client):
+    for letta_user_id in (1, 2, 3, 1, 2, 3):
+        await queue_message(letta_user_id)
+    platform = RecordingPlatform()
+    processor = QueueProcessor(echo, message_mode="echo", plugin_manager=platform, max_workers=2)
+    processor.coalesce_max_messages = 1
+
+    await run_until_delivered(processor, platform, 6)
+    assert platform.most_active == 2
+
+@pytest.mark.asyncio
+async def test_each_users_messages_are_handled_in_order(database, queue_message, letta_client):
+    message_ids = defaultdict(list)
+    for n in range(9):
+        letta_user_id = 1 + n % 3 if n < 6 else 1
+        message_ids[letta_user_id].append(await queue_message(letta_user_id, f"message {n}"))
+    platform = RecordingPlatform(delay=0.01)
+    processor = QueueProcessor(echo, message_mode="echo", plugin_manager=platform, max_workers=4)
+    processor.coalesce_max_messages = 1
+
+    await run_until_delivered(processor, platform, 9)
+    assert platform.overlapping_users == []
+    for letta_user_id, expected in message_ids.items():
+        assert [message_id for user, message_id in platform.delivered if user == letta_user_id] == expected
+    rows = await database.fetchall("SELECT DISTINCT status FROM queue")
+    assert rows == [("completed",)]
+
+@pytest.mark.asyncio
+async def test_agent_calls_hold_the_agent_lock(database, queue_message, letta_client, monkeypatch):
+    monkeypatch.setenv("AGENT_IDS", "agent-a,agent-b")
+    for letta_user_id in (1, 2, 3):
+        await queue_message(letta_user_id)
+    active: Dict[str, int] = {}
+    seen_blocks = {}
+
+    async def process(message: str, agent_id: str) -> str:
+        active[agent_id] = active.get(agent_id, 0) + 1
+        assert active[agent_id] == 1
+        # Only the sender's core block is attached while the agent answers
+        assert len(letta_client.attached[agent_id]) == 1
+        seen_blocks[letta_client.attached[agent_id][0]] = agent_id
+        await asyncio.sleep(0.01)
+        active[agent_id] -= 1
+        return "reply"
+
+    platform = RecordingPlatform(delay=0)
+    processor = QueueProcessor(process, message_mode="live", plugin_manager=platform, max_workers=3)
+    await run_until_delivered(processor, platform, 3)
+
+    assert seen_blocks == {
+        f"block-{letta_user_id}": processor.agent_pool.agent_for(letta_user_id) for letta_user_id in (1, 2, 3)
+    }
+    assert all(blocks == [] for blocks in letta_client.attached.values())
+
+@pytest.mark.asyncio
+async def test_idle_processor_wakes_on_new_work(database, queue_message, letta_client):
+    platform = RecordingPlatform(delay=0)
+    processor = QueueProcessor(echo, message_mode="echo", plugin_manager=platform)
+    # Polling alone would not find the message within the test
+    processor.poll_min_seconds = processor.refresh_interval = 30
+    task = asyncio.create_task(processor.start())
+    await asyncio.sleep(0.05)
+
+    await queue_message(1)
+    for _ in range(50):
+        if platform.delivered:
+            break
+        await asyncio.sleep(0.01)
+    await processor.stop()
+    await asyncio.wait_for(task, timeout=5)
+    assert len(platform.delivered) == 1
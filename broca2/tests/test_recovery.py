@@ -0,0 +1,125 @@
+"""Tests for recovering queue items left in flight by stopped processors."""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from database.operations.queue import claim_queue_items, recover_orphaned_queue_items, release_queue_leases
+from runtime.core.queue import QueueProcessor
+
+HOST = socket.gethostname()
+
+@pytest.fixture
+def claimed(queue_message):
+    """Queue one message per user, each claimed by its own lease owner."""
+    async def _claimed(*owners: str) -> None:
+        for letta_user_id, owner in enumerate(owners, start=1):
+            await queue_message(letta_user_id)
+            await claim_queue_items(owner, lease_seconds=30, limit=1)
+    return _claimed
+
+@pytest.mark.asyncio
+async def test_orphaned_and_expired_items_are_recovered(database, claimed, get_item):
+    await claimed("gone", "alive", "expired")
+    await database.execute("UPDATE queue SET lease_expires_at = 0 WHERE id = 3")
+
+    assert await recover_orphaned_queue_items(lambda owner: owner == "gone") == 2
+    statuses = [(await get_item(queue_id))["status"] for queue_id in (1, 2, 3)]
+    assert statuses == ["pending", "processing", "pending"]
+    # The interrupted attempt still counts
+    assert (await get_item(1))["attempts"] == 1
+
+@pytest.mark.asyncio
+async def test_released_leases_refund_the_attempt(claimed, get_item):
+    await claimed("worker-a", "worker-b")
+
+    assert await release_queue_leases("worker-a", "Interrupted by shutdown") == 1
+    item = await get_item(1)
+    assert (item["status"], item["lease_owner"], item["attempts"]) == ("pending", None, 0)
+    assert item["last_error"] == "Interrupted by shutdown"
+    assert (await get_item(2))["status"] == "processing"
+
+class SlowPlatform:
+    """A platform handler that takes longer to deliver than the drain allows."""
+
+    def __init__(self):
+        self.started = asyncio.Event()
+        self.delivered = []
+
+    def get_platform_handler(self, platform: str):
+        return self.handle
+
+    async def handle(self, response: str, profile, message_id: int) -> None:
+        self.started.set()
+        await asyncio.sleep(0.2)
+        self.delivered.append(message_id)
+
+async def drain(processor: QueueProcessor, ready: asyncio.Event) -> None:
+    """Run the processor until `ready` is set, then stop it with a short drain."""
+    processor.drain_timeout = 0.05
+    processor.coalesce_max_messages = 1
+    task = asyncio.create_task(processor.start())
+    await asyncio.wait_for(ready.wait(), timeout=5)
+    await processor.stop()
+    await asyncio.wait_for(task, timeout=5)
+
+@pytest.mark.asyncio
+async def test_drain_releases_only_unsent_items(database, queue_message, letta_client, get_item):
+    for letta_user_id in (1, 2):
+        await queue_message(letta_user_id)
+    sending = asyncio.Event()
+
+    async def hang(message: str, agent_id: str) -> str:
+        sending.set()
+        await asyncio.Event().wait()
+
+    # Both users share one agent, so one item is sent while the other waits for the agent
+    processor = QueueProcessor(hang, message_mode="live", plugin_manager=SlowPlatform(), max_workers=2)
+    await drain(processor, sending)
+
+    dead_letters = await database.fetchall("SELECT queue_id, error_class, last_error FROM dead_letters")
+    assert len(dead_letters) == 1
+    sent_id, error_class, last_error = dead_letters[0]
+    assert (error_class, last_error) == ("uncertain", "Interrupted by shutdown")
+    assert await get_item(sent_id) is None
+    unsent = await get_item(3 - sent_id)
+    assert (unsent["status"], unsent["attempts"], unsent["lease_owner"]) == ("pending", 0, None)
+
+@pytest.mark.asyncio
+async def test_drain_delivers_responses_already_received(database, queue_message, letta_client, get_item):
+    await queue_message(1)
+
+    async def reply(message: str, agent_id: str) -> str:
+        return "reply"
+
+    platform = SlowPlatform()
+    processor = QueueProcessor(reply, message_mode="live", plugin_manager=platform, max_workers=1)
+    await drain(processor, platform.started)
+
+    assert platform.delivered == [1]
+    assert (await get_item(1))["status"] == "completed"
+    assert await database.fetchall("SELECT * FROM dead_letters") == []
+
+def exited_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def test_orphaned_owners_on_this_host():
+    processor = SimpleNamespace(lease_owner=f"{HOST}:{os.getpid()}:current")
+
+    def is_orphaned(owner: str) -> bool:
+        return QueueProcessor._is_orphaned_owner(processor, owner)
+
+    # An earlier run with our process ID, e.g. in a container
+    assert is_orphaned(f"{HOST}:{os.getpid()}:earlier")
+    assert is_orphaned(f"{HOST}:{exited_pid()}:gone")
+    assert not is_orphaned(processor.lease_owner)
+    assert not is_orphaned(f"{HOST}:{os.getppid()}:running")
+    # Leases from other hosts are left to expire
+    assert not is_orphaned(f"elsewhere:{exited_pid()}:gone")
+    assert not is_orphaned("worker-a")
@@ -0,0 +1,143 @@
+"""Tests for the Letta circuit breaker, retry decisions and deadlines."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+
+from common.exceptions import CircuitOpenError
+from database.models import WorkItem
+from runtime.core.queue import QueueProcessor
+from runtime.core.resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    deadline,
+    hedged,
+    is_retryable,
+    remaining_time,
+)
+
+class StatusError(Exception):
+    """An error carrying an HTTP status code, like the Letta SDK's."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+def open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure()
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_timeout=30)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.retry_after() == 30
+
+def test_breaker_lets_one_probe_through_after_reset_timeout(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=30)
+    open_breaker(breaker)
+    clock[0] += 30
+
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_probe_success_closes_breaker(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=30)
+    open_breaker(breaker)
+    clock[0] += 30
+    breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    assert breaker.failures == 0
+    breaker.before_call()
+
+def test_probe_failure_reopens_breaker(clock):
+    breaker = CircuitBreaker("test", failure_threshold=5, reset_timeout=30)
+    open_breaker(breaker)
+    clock[0] += 30
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.retry_after() == 30
+
+def test_inconclusive_probe_allows_another(clock):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=30)
+    open_breaker(breaker)
+    clock[0] += 30
+    breaker.before_call()
+    breaker.record_inconclusive()
+    assert breaker.state == HALF_OPEN
+    breaker.before_call()
+
+def test_only_idempotent_calls_retry_after_the_server_may_have_acted():
+    connect_error = httpx.ConnectError("refused")
+    read_timeout = httpx.ReadTimeout("slow")
+    assert is_retryable(connect_error, idempotent=False)
+    assert is_retryable(StatusError(429), idempotent=False)
+    assert is_retryable(StatusError(503), idempotent=False)
+    assert not is_retryable(read_timeout, idempotent=False)
+    assert not is_retryable(StatusError(502), idempotent=False)
+    assert is_retryable(read_timeout, idempotent=True)
+    assert is_retryable(StatusError(502), idempotent=True)
+    assert not is_retryable(StatusError(400), idempotent=True)
+
+def test_nested_deadlines_only_tighten():
+    assert remaining_time() is None
+    soon = time.time() + 10
+    with deadline(soon):
+        with deadline(soon + 100):
+            assert remaining_time() <= 10
+        with deadline(None):
+            assert remaining_time() <= 10
+        with deadline(soon - 5):
+            assert remaining_time() <= 5
+    assert remaining_time() is None
+
+@pytest.mark.asyncio
+async def test_slow_attempt_is_hedged():
+    calls = []
+
+    async def attempt():
+        calls.append(len(calls))
+        if len(calls) == 1:
+            await asyncio.sleep(10)
+            return "slow"
+        return "fast"
+
+    hedges = []
+    assert await hedged(attempt, 0.01, lambda: hedges.append(True)) == "fast"
+    assert hedges == [True]
+    assert len(calls) == 2
+
+def test_item_deadline_counts_from_claim():
+    # Only the configured deadline is needed, not a whole processor
+    processor = SimpleNamespace(item_deadline=60)
+    item = WorkItem(
+        id=1, letta_user_id=1, message_id=1, attempts=2, timestamp=None, role="user", message="hi",
+        platform_profile_id=1, platform="telegram", platform_user_id="1001", username="user1",
+        display_name="User 1", letta_block_id="block-1", timestamp_ms=1_000_000, claimed_at_ms=5_000_000
+    )
+    assert QueueProcessor._item_deadline(processor, item) == 5_000 + 60
+
+    item.claimed_at_ms = None
+    assert QueueProcessor._item_deadline(processor, item) is None
+
+    item.claimed_at_ms = 5_000_000
+    processor.item_deadline = 0
+    assert QueueProcessor._item_deadline(processor, item) is None
@@ -0,0 +1,102 @@
+"""Tests for classifying failed queue items and scheduling their retries."""
+import httpx
+import pytest
+
+from common.exceptions import (
+    CircuitOpenError,
+    DeadlineExceededError,
+    DeliveryUncertainError,
+    LettaUnavailableError,
+)
+from database.operations.queue import claim_work_items
+from runtime.core.resilience import may_have_acted
+from runtime.core.retry import (
+    DEAD_LETTER,
+    EXPIRED,
+    PERMANENT,
+    RETRY,
+    TRANSIENT,
+    UNCERTAIN,
+    RetryScheduler,
+    classify_error,
+)
+
+class StatusError(Exception):
+    """An error carrying an HTTP status code, like the Letta SDK's."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+@pytest.fixture
+def claim_one(queue_message):
+    async def _claim_one(letta_user_id: int = 1):
+        await queue_message(letta_user_id)
+        items = await claim_work_items("worker-a", lease_seconds=30, limit=1)
+        assert len(items) == 1
+        return items[0]
+    return _claim_one
+
+def test_error_classes():
+    assert classify_error(DeliveryUncertainError("sent")) == UNCERTAIN
+    assert classify_error(DeadlineExceededError("late")) == EXPIRED
+    assert classify_error(StatusError(400)) == PERMANENT
+    assert classify_error(StatusError(404)) == PERMANENT
+    assert classify_error(ValueError("bad")) == PERMANENT
+    assert classify_error(StatusError(429)) == TRANSIENT
+    assert classify_error(StatusError(503)) == TRANSIENT
+    assert classify_error(httpx.ConnectError("refused")) == TRANSIENT
+    assert classify_error(CircuitOpenError("open")) == TRANSIENT
+    assert classify_error(LettaUnavailableError("down")) == TRANSIENT
+
+def test_only_unprocessed_failures_are_safe_to_repeat():
+    assert not may_have_acted(httpx.ConnectError("refused"))
+    assert not may_have_acted(httpx.ConnectTimeout("refused"))
+    assert not may_have_acted(StatusError(429))
+    assert not may_have_acted(StatusError(503))
+    assert not may_have_acted(StatusError(400))
+    assert may_have_acted(StatusError(500))
+    assert may_have_acted(StatusError(504))
+    assert may_have_acted(httpx.ReadTimeout("slow"))
+    assert may_have_acted(RuntimeError("unexpected"))
+
+@pytest.mark.asyncio
+async def test_transient_failure_is_retried_later(claim_one, get_item):
+    item = await claim_one()
+    await RetryScheduler(max_retries=3, backoff_base=5, backoff_max=5).fail(item, TRANSIENT, "down")
+
+    row = await get_item(item.id)
+    assert (row["status"], row["lease_owner"], row["last_error"]) == ("pending", None, "down")
+    assert row["next_attempt_at"] is not None
+    assert await claim_work_items("worker-a", lease_seconds=30, limit=1) == []
+
+@pytest.mark.asyncio
+async def test_item_is_dead_lettered_after_max_retries(database, claim_one, get_item):
+    item = await claim_one()
+    item.attempts = 4
+    await RetryScheduler(max_retries=3).fail(item, TRANSIENT, "still down")
+
+    assert await get_item(item.id) is None
+    dead = await database.fetchone("SELECT queue_id, error_class, last_error FROM dead_letters")
+    assert dead == (item.id, TRANSIENT, "still down")
+
+@pytest.mark.parametrize("error_class", [UNCERTAIN, PERMANENT, EXPIRED])
+@pytest.mark.asyncio
+async def test_dead_letter_classes_are_never_retried(database, claim_one, get_item, error_class):
+    item = await claim_one()
+    await RetryScheduler(max_retries=3).fail(item, error_class, "failed")
+
+    assert await get_item(item.id) is None
+    dead = await database.fetchone("SELECT error_class FROM dead_letters")
+    assert dead == (error_class,)
+
+@pytest.mark.asyncio
+async def test_policies_can_be_overridden(claim_one, get_item):
+    item = await claim_one()
+    scheduler = RetryScheduler(max_retries=3, policies={TRANSIENT: DEAD_LETTER, PERMANENT: RETRY})
+    await scheduler.fail(item, TRANSIENT, "down")
+    assert await get_item(item.id) is None
+
+    item = await claim_one(2)
+    await scheduler.fail(item, PERMANENT, "rejected")
+    assert (await get_item(item.id))["status"] == "pending"
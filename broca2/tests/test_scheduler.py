@@ -0,0 +1,103 @@
+"""Tests for choosing which users' queue items to claim next."""
+from collections import Counter
+
+import pytest
+
+from database.models import QueueHead
+from database.operations.queue import claim_work_items, expire_queue_items
+from database.timestamps import now_ms
+from runtime.core.scheduler import DeadlineScheduler, FairScheduler
+
+def head(letta_user_id: int, platform: str = "telegram", claimable: bool = True, timestamp_ms: int = 0) -> QueueHead:
+    return QueueHead(
+        id=letta_user_id, letta_user_id=letta_user_id, platform=platform,
+        timestamp_ms=timestamp_ms, claimable=claimable
+    )
+
+def serve(scheduler: FairScheduler, heads, turns: int) -> list:
+    """Claim one item at a time, as a single worker would, for a number of turns."""
+    served = []
+    for _ in range(turns):
+        chosen = scheduler.select(heads, 1)
+        for item in chosen:
+            scheduler.charge(item.letta_user_id)
+            served.append(item.letta_user_id)
+    return served
+
+def test_users_take_turns():
+    scheduler = FairScheduler()
+    # User 1 has flooded the queue, but each user only ever shows their head item
+    heads = [head(1, timestamp_ms=0), head(2, timestamp_ms=5), head(3, timestamp_ms=9)]
+    served = serve(scheduler, heads, 9)
+    assert served[:3] == [1, 2, 3]
+    assert Counter(served) == {1: 3, 2: 3, 3: 3}
+
+def test_limit_is_respected():
+    scheduler = FairScheduler()
+    heads = [head(user) for user in range(1, 6)]
+    assert [item.letta_user_id for item in scheduler.select(heads, 3)] == [1, 2, 3]
+    assert scheduler.select(heads, 0) == []
+
+def test_items_in_flight_are_skipped():
+    scheduler = FairScheduler()
+    heads = [head(1, claimable=False), head(2)]
+    assert [item.letta_user_id for item in scheduler.select(heads, 2)] == [2]
+
+def test_platform_weights_share_turns():
+    scheduler = FairScheduler({"discord": 0.5})
+    heads = [head(1, "telegram"), head(2, "discord")]
+    served = Counter(serve(scheduler, heads, 30))
+    assert served[1] == 2 * served[2]
+
+def test_drained_user_loses_their_place():
+    scheduler = FairScheduler()
+    serve(scheduler, [head(1), head(2)], 1)
+    assert [item.letta_user_id for item in scheduler.select([head(2), head(3)], 2)] == [2, 3]
+
+@pytest.mark.asyncio
+async def test_flooding_user_does_not_hold_every_worker(queue_message):
+    for letta_user_id in (1, 1, 1, 1, 2, 3):
+        await queue_message(letta_user_id)
+
+    scheduler = FairScheduler()
+    items = await claim_work_items("worker-a", lease_seconds=30, limit=3, select_heads=scheduler.select)
+    assert [item.letta_user_id for item in items] == [1, 2, 3]
+
+def test_earliest_deadline_goes_first():
+    scheduler = DeadlineScheduler(response_seconds=60)
+    heads = [head(1, timestamp_ms=3000), head(2, timestamp_ms=1000), head(3, timestamp_ms=2000)]
+    assert [item.letta_user_id for item in scheduler.select(heads, 3)] == [2, 3, 1]
+    assert [item.letta_user_id for item in scheduler.select(heads, 1)] == [2]
+
+def test_platform_response_deadlines_apply():
+    scheduler = DeadlineScheduler(response_seconds=60, platform_response_seconds={"telegram": 5})
+    heads = [head(1, "discord", timestamp_ms=0), head(2, "telegram", timestamp_ms=30_000)]
+    assert scheduler.deadline(heads[0]) == 60_000
+    assert scheduler.deadline(heads[1]) == 35_000
+    assert [item.letta_user_id for item in scheduler.select(heads, 2)] == [2, 1]
+
+def test_deadline_scheduler_skips_items_in_flight():
+    scheduler = DeadlineScheduler()
+    heads = [head(1, claimable=False, timestamp_ms=0), head(2, timestamp_ms=1000)]
+    assert [item.letta_user_id for item in scheduler.select(heads, 2)] == [2]
+
+@pytest.mark.asyncio
+async def test_stale_items_expire(database, queue_message):
+    await database.execute(
+        "INSERT INTO platform_profiles (id, letta_user_id, platform, platform_user_id, username, display_name) "
+        "VALUES (4, 3, 'discord', '2003', 'user3', 'User 3')"
+    )
+    for letta_user_id, platform_profile_id in ((1, 1), (2, 2), (3, 4)):
+        await queue_message(letta_user_id, platform_profile_id=platform_profile_id)
+    # User 1's message is two minutes old, the others ten minutes
+    now = now_ms()
+    await database.execute("UPDATE queue SET timestamp_ms = ? WHERE letta_user_id = 1", (now - 120_000,))
+    await database.execute("UPDATE queue SET timestamp_ms = ? WHERE letta_user_id != 1", (now - 600_000,))
+
+    assert await expire_queue_items(0) == 0
+    assert await expire_queue_items(300, {"discord": 0}) == 1
+    rows = await database.fetchall("SELECT letta_user_id, status FROM queue ORDER BY letta_user_id")
+    assert rows == [(1, "pending"), (2, "expired"), (3, "pending")]
+
+    assert await expire_queue_items(0, {"telegram": 60}) == 1
+    assert (await database.fetchone("SELECT status FROM queue WHERE letta_user_id = 1")) == ("expired",)
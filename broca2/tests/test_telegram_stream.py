@@ -0,0 +1,105 @@
+"""Tests for streaming agent responses to Telegram."""
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import List
+
+import pytest
+
+from common.exceptions import DeliveryUncertainError
+from plugins.telegram.message_handler import MessageFormatter
+from plugins.telegram.telegram_plugin import TelegramPlugin
+
+class FakeTelethonClient:
+    """Records the messages sent and edited."""
+
+    def __init__(self):
+        self.calls: List[tuple] = []
+
+    @asynccontextmanager
+    async def action(self, entity, action):
+        yield
+
+    async def send_message(self, entity, text, parse_mode=None):
+        self.calls.append(("send", text, parse_mode))
+        return SimpleNamespace(id=len(self.calls))
+
+    async def edit_message(self, entity, message, text, parse_mode=None):
+        self.calls.append(("edit", text, parse_mode))
+
+async def stream(*deltas: str, error: Exception = None):
+    for delta in deltas:
+        yield delta
+    if error is not None:
+        raise error
+
+def make_plugin(edit_interval: float) -> TelegramPlugin:
+    plugin = TelegramPlugin()
+    plugin.client = FakeTelethonClient()
+    plugin.settings = SimpleNamespace(stream_edit_interval=edit_interval)
+    return plugin
+
+@pytest.fixture
+def profile():
+    return SimpleNamespace(platform_user_id="1001", username="user1")
+
+@pytest.mark.asyncio
+async def test_partial_text_is_edited_in_as_it_arrives(database, queue_message, profile):
+    message_id = await queue_message(1)
+    plugin = make_plugin(edit_interval=0)
+    text = await plugin._handle_stream(stream("Hello", " **big**", " world"), profile, message_id)
+
+    final = MessageFormatter().format_response("Hello **big** world")
+    assert text == "Hello **big** world"
+    assert plugin.client.calls == [
+        ("send", "Hello", None),
+        ("edit", "Hello **big**", None),
+        ("edit", "Hello **big** world", None),
+        ("edit", final, "markdown"),
+    ]
+    row = await database.fetchone("SELECT processed, agent_response FROM messages WHERE id = ?", (message_id,))
+    assert row == (1, final)
+
+@pytest.mark.asyncio
+async def test_edits_are_rate_limited(database, queue_message, profile):
+    message_id = await queue_message(1)
+    plugin = make_plugin(edit_interval=60)
+    await plugin._handle_stream(stream("one", " two", " three"), profile, message_id)
+
+    # The first text is sent at once, the rest only arrives with the final edit
+    assert plugin.client.calls == [
+        ("send", "one", None),
+        ("edit", MessageFormatter().format_response("one two three"), "markdown"),
+    ]
+
+@pytest.mark.asyncio
+async def test_empty_stream_sends_nothing(database, queue_message, profile):
+    message_id = await queue_message(1)
+    plugin = make_plugin(edit_interval=0)
+    assert await plugin._handle_stream(stream("", "  "), profile, message_id) is None
+    assert plugin.client.calls == []
+
+@pytest.mark.asyncio
+async def test_interrupted_stream_finishes_with_the_text_received(database, queue_message, profile):
+    message_id = await queue_message(1)
+    plugin = make_plugin(edit_interval=60)
+    text = await plugin._handle_stream(stream("Hello", " there", error=RuntimeError("dropped")), profile, message_id)
+
+    # The user keeps the partial reply instead of getting a second one
+    assert text == "Hello there"
+    assert plugin.client.calls == [("send", "Hello", None), ("edit", "Hello there", None)]
+    row = await database.fetchone("SELECT processed, agent_response FROM messages WHERE id = ?", (message_id,))
+    assert row == (1, "Hello there")
+
+@pytest.mark.asyncio
+async def test_undelivered_answer_is_uncertain(database, queue_message, profile):
+    message_id = await queue_message(1)
+    plugin = make_plugin(edit_interval=0)
+
+    async def unreachable(*args, **kwargs):
+        raise ConnectionError("telegram unreachable")
+
+    plugin.client.send_message = unreachable
+    with pytest.raises(DeliveryUncertainError):
+        await plugin._handle_stream(stream("Hello"), profile, message_id)
+    row = await database.fetchone("SELECT processed FROM messages WHERE id = ?", (message_id,))
+    assert row == (0,)
@@ -0,0 +1,51 @@
+"""Tests for converting stored text timestamps to epoch milliseconds."""
+from datetime import datetime, timezone
+
+import pytest
+
+from database.migrations import run_migrations
+from database.operations.queue import update_queue_status
+from database.timestamps import to_epoch_ms
+
+from .conftest import OLD_MESSAGE_TIMESTAMPS
+
+def test_epoch_ms_formats():
+    expected = int(datetime(2024, 3, 1, 12, 30, tzinfo=timezone.utc).timestamp() * 1000)
+    assert to_epoch_ms("2024-03-01T12:30:00") == expected
+    assert to_epoch_ms("2024-03-01T12:30:00+00:00") == expected
+    assert to_epoch_ms("2024-03-01T14:30:00+02:00") == expected
+    assert to_epoch_ms("2024-03-01T12:30:00Z") == expected
+    assert to_epoch_ms("2024-03-01T12:30:00.000Z") == expected
+    assert to_epoch_ms("2024-03-01 12:30:00") == expected
+    assert to_epoch_ms("2024-03-01 12:30 UTC") == expected
+    assert to_epoch_ms("2024-03-01 12:30:00 UTC") == expected
+    assert to_epoch_ms(datetime(2024, 3, 1, 12, 30)) == expected
+    assert to_epoch_ms(datetime(2024, 3, 1, 12, 30, tzinfo=timezone.utc)) == expected
+    assert to_epoch_ms("2024-03-01T12:30:00.250000") == expected + 250
+
+def test_unparseable_timestamps_are_none():
+    assert to_epoch_ms(None) is None
+    assert to_epoch_ms("") is None
+    assert to_epoch_ms("   ") is None
+    assert to_epoch_ms("yesterday") is None
+
+@pytest.mark.asyncio
+async def test_timestamp_ms_is_backfilled(old_database):
+    await run_migrations()
+    rows = await old_database.fetchall("SELECT timestamp, timestamp_ms FROM messages ORDER BY id")
+    assert rows == [(timestamp, to_epoch_ms(timestamp)) for timestamp in OLD_MESSAGE_TIMESTAMPS]
+    assert rows[-1][1] is None
+    queued = await old_database.fetchone("SELECT timestamp_ms FROM queue")
+    assert queued == (to_epoch_ms("2024-03-01T12:30:01+00:00"),)
+
+@pytest.mark.asyncio
+async def test_status_changes_keep_the_enqueue_time(database, queue_message, get_item):
+    await queue_message(1)
+    await database.execute("UPDATE queue SET timestamp_ms = 1000, timestamp = '2024-03-01T12:30:00' WHERE id = 1")
+
+    await update_queue_status(1, "processing", increment_attempt=True)
+    item = await update_queue_status(1, "completed")
+    assert item.timestamp_ms == 1000
+    assert (await get_item(1))["timestamp_ms"] == 1000
+    # The text timestamp records when the status last changed
+    assert item.timestamp > "2024-03-01T12:30:00"
@@ -0,0 +1,25 @@
+"""Tests for claiming queue items hydrated with everything needed to process them."""
+import pytest
+
+from database.operations.queue import claim_work_items
+
+@pytest.mark.asyncio
+async def test_claimed_items_are_hydrated(queue_message):
+    await queue_message(2, "hello")
+    items = await claim_work_items("worker-a", lease_seconds=30, limit=10)
+
+    assert len(items) == 1
+    item = items[0]
+    assert (item.message, item.role) == ("hello", "user")
+    assert (item.platform, item.platform_user_id, item.username) == ("telegram", "1002", "user2")
+    assert item.letta_block_id == "block-2"
+    assert item.lease_owner == "worker-a"
+    assert item.claimed_at_ms >= item.timestamp_ms
+
+@pytest.mark.asyncio
+async def test_claimed_items_are_ordered_by_age(queue_message):
+    for letta_user_id in (3, 1, 2):
+        await queue_message(letta_user_id, f"from {letta_user_id}")
+    items = await claim_work_items("worker-a", lease_seconds=30, limit=10)
+    assert [item.letta_user_id for item in items] == [3, 1, 2]
+    assert [item.message for item in items] == ["from 3", "from 1", "from 2"]